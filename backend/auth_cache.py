@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ExpiringCache:
+    def __init__(self, name: str, max_entries: int = 10000, ttl: float | None = None):
+        """
+        A thread-safe LRU cache whose entries expire at a wall-clock time.
+
+        Args:
+            name: Used to label the metrics.
+            max_entries: The most entries kept at once. 0 disables the cache.
+            ttl: An upper bound, in seconds, on how long any entry is kept,
+                on top of the expiry passed to `put`.
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        # key -> (expires_at, value), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached value, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, expires_at: float | None = None):
+        """
+        Caches `value` until `expires_at` (a `time.time()` timestamp) or the
+        cache's ttl, whichever comes first.
+        """
+        if self.max_entries <= 0:
+            return
+        now = time.time()
+        if self.ttl is not None:
+            expires_at = min(expires_at or float("inf"), now + self.ttl)
+        if expires_at is None or expires_at <= now:
+            return
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
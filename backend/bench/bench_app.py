@@ -0,0 +1,22 @@
+"""
+The backend app as booted by bench/loadtest.py: `main.app`, with the emotion
+model replaced by `StubEmotionDetector` unless BENCH_STUB_EMOTION=0.
+
+    uvicorn bench_app:app --app-dir bench
+"""
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import main  # noqa: E402
+from stub_emotion import StubEmotionDetector  # noqa: E402
+
+if os.getenv("BENCH_STUB_EMOTION", "1") == "1":
+    batch_ms = float(os.getenv("BENCH_STUB_EMOTION_BATCH_MS", "5"))
+    item_ms = float(os.getenv("BENCH_STUB_EMOTION_ITEM_MS", "1"))
+    main.EmotionDetector = lambda **kwargs: StubEmotionDetector(batch_ms=batch_ms, item_ms=item_ms, **kwargs)
+
+app = main.app
@@ -0,0 +1,186 @@
+"""
+Measures cold-start time and memory: how long it takes a fresh interpreter to
+import the package or the app, or to get them ready to answer, and how much
+memory that costs.
+
+    python bench/coldstart.py --repeats 5
+    python bench/coldstart.py --scenarios cli_lexicon app_ready_light --repeats 10
+
+Each scenario runs in a new process, --repeats times, from a temporary
+directory. For each, the median and best time spent in the scenario itself,
+the median wall time of the whole process (interpreter start-up and exit
+included) and the median RSS at the end are reported, along with which heavy
+dependencies (torch, transformers, huggingface_hub, ...) ended up imported,
+so a stray top-level import shows up as a regression. The app scenarios take
+their settings from the environment, except the `_light` ones, which force
+the torch-free configuration. Results are written to bench/results/; compare
+two runs with:
+
+    python bench/coldstart.py --compare bench/results/before.json bench/results/after.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from loadtest import BACKEND_DIR, RESULTS_DIR, git_commit
+
+HEAVY_MODULES = ("torch", "transformers", "huggingface_hub", "sentence_transformers", "optimum", "numpy", "httpx")
+
+LIGHT_ENV = {
+    "EMOTION_BACKEND": "lexicon",
+    "LLM_CLIENT": "none",
+    "LLM_TOKENIZER": "",
+    "SEMANTIC_CACHE": "0",
+}
+
+SCENARIOS = {
+    "emotion_detector": ("import empathy_ai.emotion_detector", {}),
+    "response_generator": ("import empathy_ai.response_generator", {}),
+    "cli_lexicon": (
+        "from empathy_ai.emotion_detector import EmotionDetector\n"
+        "from empathy_ai.response_generator import ResponseGenerator\n"
+        "detector = EmotionDetector(backend='lexicon')\n"
+        "generator = ResponseGenerator(sync_client=False)\n"
+        "generator.generate_response(detector.detect_emotion('I finally got the job!')['emotion'], '')\n",
+        {},
+    ),
+    "cli_model": (
+        "from empathy_ai.emotion_detector import EmotionDetector\n"
+        "from empathy_ai.response_generator import ResponseGenerator\n"
+        "detector = EmotionDetector()\n"
+        "generator = ResponseGenerator(sync_client=False)\n"
+        "generator.generate_response(detector.detect_emotion('I finally got the job!')['emotion'], '')\n",
+        {},
+    ),
+    "app_import": ("import main", {}),
+    "app_import_light": ("import main", LIGHT_ENV),
+    "app_ready": ("import main\nmain.startup.run_blocking()\nassert main.startup.ready, main.startup.error\n", {}),
+    "app_ready_light": (
+        "import main\nmain.startup.run_blocking()\nassert main.startup.ready, main.startup.error\n",
+        LIGHT_ENV,
+    ),
+}
+DEFAULT_SCENARIOS = ["emotion_detector", "response_generator", "cli_lexicon", "app_import_light", "app_ready_light"]
+
+# Runs in the child: times the scenario and reports on the process afterwards.
+CHILD = """
+import json, os, sys, time
+start = time.perf_counter()
+exec(compile({code!r}, "<scenario>", "exec"), {{"__name__": "scenario"}})
+seconds = time.perf_counter() - start
+rss = None
+try:
+    with open("/proc/self/status") as status:
+        rss = next(int(line.split()[1]) / 1024 for line in status if line.startswith("VmRSS:"))
+except (OSError, StopIteration):
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({{
+    "seconds": seconds,
+    "rss_mb": rss,
+    "modules": len(sys.modules),
+    "heavy": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def run_once(name: str, timeout: float) -> dict:
+    code, overrides = SCENARIOS[name]
+    env = dict(os.environ)
+    env.update(overrides)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [BACKEND_DIR, env.get("PYTHONPATH")]))
+    env.setdefault("LOG_LEVEL", "WARNING")
+    with tempfile.TemporaryDirectory(prefix="empathy-coldstart-") as workdir:
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-c", CHILD.format(code=code, heavy=HEAVY_MODULES)],
+            cwd=workdir, env=env, capture_output=True, text=True, timeout=timeout,
+        )
+        wall = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"Scenario {name} failed:\n{completed.stderr[-2000:]}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["process_seconds"] = wall
+    return result
+
+
+def measure(name: str, repeats: int, timeout: float) -> dict:
+    runs = [run_once(name, timeout) for _ in range(repeats)]
+    seconds = [run["seconds"] * 1000 for run in runs]
+    return {
+        "median_ms": round(statistics.median(seconds), 1),
+        "best_ms": round(min(seconds), 1),
+        "process_median_ms": round(statistics.median(run["process_seconds"] * 1000 for run in runs), 1),
+        "rss_mb": round(statistics.median(run["rss_mb"] for run in runs), 1),
+        "modules": runs[-1]["modules"],
+        "heavy": runs[-1]["heavy"],
+    }
+
+
+def compare(before_path: str, after_path: str):
+    with open(before_path) as before_file, open(after_path) as after_file:
+        before, after = json.load(before_file), json.load(after_file)
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    for name, new in after["scenarios"].items():
+        old = before["scenarios"].get(name)
+        if old is None:
+            continue
+        cells = []
+        for key in ("median_ms", "process_median_ms", "rss_mb"):
+            old_value, new_value = old.get(key), new.get(key)
+            if old_value and new_value:
+                cells.append(f"{key} {old_value} -> {new_value} ({(new_value / old_value - 1) * 100:+.1f}%)")
+        added = sorted(set(new["heavy"]) - set(old["heavy"]))
+        if added:
+            cells.append(f"now imports {', '.join(added)}")
+        print(f"  {name:<20}" + "  ".join(cells))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=DEFAULT_SCENARIOS)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=600.0, help="Seconds allowed per run")
+    parser.add_argument("--output", help="Where to write the JSON results")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two result files")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    scenarios = {}
+    for name in args.scenarios:
+        scenarios[name] = measure(name, args.repeats, args.timeout)
+        stats = scenarios[name]
+        print(
+            f"{name:<20} {stats['median_ms']:>8} ms (best {stats['best_ms']}, process {stats['process_median_ms']})"
+            f"  {stats['rss_mb']:>6} MB  heavy: {', '.join(stats['heavy']) or '-'}",
+            file=sys.stderr,
+        )
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "config": {"repeats": args.repeats},
+        "scenarios": scenarios,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"coldstart-{results['commit'] or 'unknown'}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
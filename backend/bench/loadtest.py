@@ -0,0 +1,353 @@
+"""
+Load tests the backend with mixed traffic and saves the results as JSON.
+
+Boots the stub LLM (bench/stub_llm.py) and the app (bench/bench_app.py, with a
+stub emotion detector unless --real-emotion) as subprocesses on free ports,
+against a fresh database in a temporary directory. Then, at each concurrency
+level, that many virtual users log in, list their history, fetch their
+conversation and chat, each continuing one growing conversation, for
+--duration seconds:
+
+    python bench/loadtest.py --concurrency 1 8 32 --duration 20 --llm-latency-ms 300
+
+Reports p50/p95/p99 per action, requests per second and the server's RSS,
+and writes them to bench/results/. Compare two runs with:
+
+    python bench/loadtest.py --compare bench/results/before.json bench/results/after.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+ACTIONS = ("chat", "history", "conversation", "login")
+
+MESSAGES = [
+    "hi",
+    "thanks",
+    "I had a really rough day at work and my manager yelled at me in front of everyone.",
+    "My exam results came back and I passed everything!",
+    "I can't stop worrying about my mom's surgery next week.",
+    "Honestly I don't know how I feel about moving to a new city.",
+    "My best friend forgot my birthday again.",
+    "I finally finished the marathon I've been training for all year.",
+    "Everything feels kind of grey lately, nothing seems to matter.",
+    "Someone keyed my car in the parking lot and I'm furious.",
+    "I got the job!!",
+    "I keep having the same nightmare every night.",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pid: int) -> float | None:
+    """The resident set size of a process, from /proc (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentile(values: list, fraction: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 2)
+
+
+def summarize(latencies: list, errors: int, seconds: float) -> dict:
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / seconds, 2) if seconds else None,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+
+# --- Servers ---
+def start_servers(args, workdir: str) -> tuple:
+    llm_port = free_port()
+    llm = subprocess.Popen(
+        [
+            sys.executable, os.path.join(BENCH_DIR, "stub_llm.py"), "--port", str(llm_port),
+            "--latency-ms", str(args.llm_latency_ms), "--jitter-ms", str(args.llm_jitter_ms),
+            "--slow-rate", str(args.llm_slow_rate), "--slow-ms", str(args.llm_slow_ms),
+            "--error-rate", str(args.llm_error_rate),
+        ],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+    env = dict(os.environ)
+    env.update({
+        "LLM_CLIENT": "async",
+        "LLM_BASE_URL": f"http://127.0.0.1:{llm_port}/v1",
+        "HF_TOKEN": env.get("HF_TOKEN") or "bench",
+        "LLM_TOKENIZER": "",
+        "STORAGE_BACKEND": args.storage,
+        "DATABASE_PATH": os.path.join(workdir, "bench.db" if args.storage == "sqlite" else "bench.json"),
+        "JOURNAL_DIR": os.path.join(workdir, "journal"),
+        "CONVERSATION_LOG": os.path.join(workdir, "logs", "conversations.jsonl"),
+        "PASSWORD_HASH_ROUNDS": str(args.bcrypt_rounds),
+        "BENCH_STUB_EMOTION": "0" if args.real_emotion else "1",
+        "LOG_LEVEL": "WARNING",
+    })
+    for setting in args.app_env:
+        name, _, value = setting.partition("=")
+        env[name] = value
+
+    app_port = free_port()
+    app = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "bench_app:app", "--app-dir", BENCH_DIR,
+            "--port", str(app_port), "--log-level", "warning", "--no-access-log",
+        ],
+        cwd=workdir, env=env,
+    )
+    return llm, app, f"http://127.0.0.1:{app_port}"
+
+
+async def wait_ready(url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/readyz")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"The app at {url} was not ready after {timeout:.0f}s")
+
+
+# --- Traffic ---
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, username: str, password: str, max_turns: int):
+        self.client = client
+        self.username = username
+        self.password = password
+        self.max_turns = max_turns
+        self.headers = {}
+        self.conversation_id = None
+        self.turns = 0
+
+    async def login(self) -> httpx.Response:
+        response = await self.client.post(
+            "/token", data={"username": self.username, "password": self.password}
+        )
+        if response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return response
+
+    async def act(self, action: str) -> httpx.Response:
+        if action == "login":
+            return await self.login()
+        if action == "history":
+            return await self.client.get("/history", headers=self.headers)
+        if action == "conversation":
+            return await self.client.get(f"/history/{self.conversation_id}", headers=self.headers)
+
+        if self.turns >= self.max_turns:
+            self.conversation_id, self.turns = None, 0
+        body = {"user_message": random.choice(MESSAGES)}
+        if self.conversation_id:
+            body["conversation_id"] = self.conversation_id
+        response = await self.client.post("/chat", json=body, headers=self.headers)
+        if response.status_code == 200:
+            self.conversation_id = response.json()["conversation_id"]
+            self.turns += 1
+        return response
+
+
+async def run_level(url: str, users: list, weights: list, duration: float, pid: int) -> dict:
+    latencies = {action: [] for action in ACTIONS}
+    errors = {action: 0 for action in ACTIONS}
+    statuses = {}
+    rss_samples = []
+    deadline = time.monotonic() + duration
+
+    async def drive(user: VirtualUser):
+        while time.monotonic() < deadline:
+            action = random.choices(ACTIONS, weights)[0]
+            if action == "conversation" and not user.conversation_id:
+                action = "chat"
+            start = time.perf_counter()
+            try:
+                status = (await user.act(action)).status_code
+            except httpx.HTTPError:
+                status = "error"
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if status == 200:
+                latencies[action].append((time.perf_counter() - start) * 1000)
+            else:
+                errors[action] += 1
+
+    async def sample_rss():
+        while time.monotonic() < deadline:
+            rss = rss_mb(pid)
+            if rss is not None:
+                rss_samples.append(rss)
+            await asyncio.sleep(0.5)
+
+    start = time.perf_counter()
+    await asyncio.gather(sample_rss(), *(drive(user) for user in users))
+    seconds = time.perf_counter() - start
+
+    everything = [latency for values in latencies.values() for latency in values]
+    return {
+        "concurrency": len(users),
+        "seconds": round(seconds, 2),
+        "overall": summarize(everything, sum(errors.values()), seconds),
+        "actions": {
+            action: summarize(latencies[action], errors[action], seconds) for action in ACTIONS
+        },
+        "statuses": statuses,
+        "rss_mb": {
+            "peak": round(max(rss_samples), 1) if rss_samples else None,
+            "end": round(rss_samples[-1], 1) if rss_samples else None,
+        },
+    }
+
+
+async def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="empathy-bench-")
+    llm, app, url = start_servers(args, workdir)
+    try:
+        await wait_ready(url, args.ready_timeout)
+        weights = [args.chat_weight, args.history_weight, args.conversation_weight, args.login_weight]
+        limits = httpx.Limits(max_connections=max(args.concurrency) + 16)
+        levels = []
+        async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+            users = []
+            for i in range(max(args.concurrency)):
+                user = VirtualUser(client, f"bench-{i}", "bench-password", args.max_turns)
+                (await client.post(
+                    "/users/signup",
+                    json={"username": user.username, "name": user.username, "password": user.password},
+                )).raise_for_status()
+                (await user.login()).raise_for_status()
+                users.append(user)
+
+            for concurrency in args.concurrency:
+                level = await run_level(url, users[:concurrency], weights, args.duration, app.pid)
+                levels.append(level)
+                overall = level["overall"]
+                print(
+                    f"concurrency {concurrency:>4}: {overall['rps']} req/s, "
+                    f"p50 {overall['p50_ms']} ms, p99 {overall['p99_ms']} ms, "
+                    f"{overall['errors']} errors, peak RSS {level['rss_mb']['peak']} MB",
+                    file=sys.stderr,
+                )
+    finally:
+        for process in (app, llm):
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {name: value for name, value in vars(args).items() if name not in ("output", "compare")},
+        "levels": levels,
+    }
+
+
+# --- Comparison ---
+def compare(before_path: str, after_path: str):
+    with open(before_path) as before_file, open(after_path) as after_file:
+        before, after = json.load(before_file), json.load(after_file)
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    before_levels = {level["concurrency"]: level for level in before["levels"]}
+    for level in after["levels"]:
+        old = before_levels.get(level["concurrency"])
+        if old is None:
+            continue
+        print(f"concurrency {level['concurrency']}:")
+        for action in ("overall",) + ACTIONS:
+            new_stats = level["overall"] if action == "overall" else level["actions"][action]
+            old_stats = old["overall"] if action == "overall" else old["actions"][action]
+            cells = []
+            for key in ("rps", "p50_ms", "p99_ms"):
+                old_value, new_value = old_stats.get(key), new_stats.get(key)
+                if old_value and new_value:
+                    cells.append(f"{key} {old_value} -> {new_value} ({(new_value / old_value - 1) * 100:+.1f}%)")
+            print(f"  {action:<13}" + "  ".join(cells))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Virtual users per level")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per level")
+    parser.add_argument("--max-turns", type=int, default=200, help="Turns before a user starts a new conversation")
+    parser.add_argument("--chat-weight", type=float, default=6.0)
+    parser.add_argument("--history-weight", type=float, default=1.5)
+    parser.add_argument("--conversation-weight", type=float, default=1.5)
+    parser.add_argument("--login-weight", type=float, default=1.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--llm-slow-rate", type=float, default=0.0)
+    parser.add_argument("--llm-slow-ms", type=float, default=3000.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--real-emotion", action="store_true", help="Load the real emotion model")
+    parser.add_argument("--storage", choices=("sqlite", "tinydb"), default="sqlite")
+    parser.add_argument("--bcrypt-rounds", type=int, default=10)
+    parser.add_argument("--app-env", action="append", default=[], metavar="NAME=VALUE",
+                        help="Extra environment for the app, e.g. SEMANTIC_CACHE=1")
+    parser.add_argument("--ready-timeout", type=float, default=300.0)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="Where to write the JSON results")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two result files")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = asyncio.run(run(args))
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"loadtest-{results['commit'] or 'unknown'}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Measures login throughput, and what a burst of logins does to chat latency.
+
+Start the backend (ideally against bench/stub_llm.py), then:
+
+    python bench/login_storm.py --url http://127.0.0.1:8000 --logins 200 --concurrency 50
+
+A steady stream of /chat requests is timed twice: alone, and again while
+`--logins` logins run `--concurrency` at a time. With bcrypt on the event loop
+the second p99 is dominated by hashing; with the password process pool it
+should stay close to the first. Results are printed as JSON.
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import httpx
+
+
+def percentile(values: list, fraction: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(latencies: list) -> dict:
+    return {
+        "count": len(latencies),
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+
+async def signup(client: httpx.AsyncClient, username: str, password: str):
+    response = await client.post(
+        "/users/signup", json={"username": username, "name": username, "password": password}
+    )
+    response.raise_for_status()
+
+
+async def login(client: httpx.AsyncClient, username: str, password: str) -> httpx.Response:
+    return await client.post("/token", data={"username": username, "password": password})
+
+
+async def probe_chat(client: httpx.AsyncClient, headers: dict, rate: float, stop: asyncio.Event) -> dict:
+    """Sends /chat requests at `rate` per second until `stop` is set, timing each."""
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        start = time.perf_counter()
+        response = await client.post("/chat", json={"user_message": "hi"}, headers=headers)
+        if response.status_code == 200:
+            latencies.append((time.perf_counter() - start) * 1000)
+        else:
+            errors += 1
+
+    tasks = []
+    while not stop.is_set():
+        tasks.append(asyncio.create_task(one()))
+        await asyncio.sleep(1 / rate)
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return {**summarize(latencies), "errors": errors}
+
+
+async def storm(client: httpx.AsyncClient, users: list, password: str, logins: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = {}
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await login(client, users[i % len(users)], password)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 200:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(logins)))
+    elapsed = time.perf_counter() - start
+    return {
+        **summarize(latencies),
+        "seconds": elapsed,
+        "logins_per_second": len(latencies) / elapsed if elapsed else None,
+        "statuses": statuses,
+    }
+
+
+async def run(args) -> dict:
+    prefix = f"storm-{uuid.uuid4().hex[:8]}"
+    users = [f"{prefix}-{i}" for i in range(args.users)]
+    limits = httpx.Limits(max_connections=args.concurrency + 64)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        for username in users:
+            await signup(client, username, args.password)
+        token = (await login(client, users[0], args.password)).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_chat(client, headers, args.chat_rps, stop))
+        await asyncio.sleep(args.baseline_seconds)
+        stop.set()
+        baseline = await probe
+
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_chat(client, headers, args.chat_rps, stop))
+        logins = await storm(client, users, args.password, args.logins, args.concurrency)
+        stop.set()
+        during = await probe
+
+    return {"logins": logins, "chat_baseline": baseline, "chat_during_storm": during}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=10, help="Accounts created and logged into in turn")
+    parser.add_argument("--password", default="storm-password")
+    parser.add_argument("--logins", type=int, default=200, help="Logins in the storm")
+    parser.add_argument("--concurrency", type=int, default=50, help="Logins in flight at once")
+    parser.add_argument("--chat-rps", type=float, default=5.0, help="Rate of timed /chat requests")
+    parser.add_argument("--baseline-seconds", type=float, default=5.0, help="How long to time /chat alone")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Microbenchmarks for the two hot spots under the request path.
+
+    python bench/micro.py emotion --backend pytorch --iterations 200 --batch-sizes 1 8 32
+    python bench/micro.py storage --storage sqlite --turns 2000 --every 250
+
+`emotion` times `detect_emotion` on uncached messages, then batched
+`detect_emotions` at each batch size. `storage` grows one conversation turn by
+turn and, every `--every` turns, reports the mean append time over the last
+window and how long loading the recent context and the whole conversation takes.
+Results are printed as JSON, and written to --output if given.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from loadtest import MESSAGES, percentile  # noqa: E402
+
+
+def bench_emotion(args) -> dict:
+    if args.backend == "stub":
+        from stub_emotion import StubEmotionDetector
+        detector = StubEmotionDetector(use_cache=False)
+    else:
+        from empathy_ai.emotion_detector import EmotionDetector
+        detector = EmotionDetector(use_cache=False, backend=args.backend)
+    detector.warm_up()
+
+    latencies = []
+    for i in range(args.iterations):
+        start = time.perf_counter()
+        detector.detect_emotion(f"{MESSAGES[i % len(MESSAGES)]} ({i})")
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    batches = {}
+    for batch_size in args.batch_sizes:
+        texts = [f"{MESSAGES[i % len(MESSAGES)]} [{batch_size}/{i}]" for i in range(batch_size)]
+        rounds = max(1, args.iterations // batch_size)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            detector.detect_emotions(texts)
+        seconds = time.perf_counter() - start
+        batches[batch_size] = {
+            "ms_per_batch": round(seconds / rounds * 1000, 2),
+            "messages_per_second": round(rounds * batch_size / seconds, 1),
+        }
+
+    return {
+        "backend": args.backend,
+        "detect_emotion": {
+            "iterations": args.iterations,
+            "p50_ms": percentile(latencies, 0.50),
+            "p99_ms": percentile(latencies, 0.99),
+            "mean_ms": round(sum(latencies) / len(latencies), 2),
+        },
+        "batches": batches,
+    }
+
+
+def bench_storage(args) -> dict:
+    from storage import open_storage
+
+    workdir = tempfile.mkdtemp(prefix="empathy-micro-")
+    storage = open_storage(args.storage, os.path.join(workdir, "micro.db" if args.storage == "sqlite" else "micro.json"))
+    storage.create_user({"username": "micro", "name": "Micro", "hashed_password": "x"})
+    conversation_id = str(uuid.uuid4())
+    storage.create_conversation({
+        "id": conversation_id, "username": "micro", "title": "micro", "timestamp": "2024-01-01T00:00:00",
+    })
+
+    checkpoints = []
+    window = []
+    for position in range(0, args.turns, 2):
+        turns = [
+            {"role": "user", "content": MESSAGES[position % len(MESSAGES)], "emotion": "joy",
+             "scores": {"joy": 0.9, "neutral": 0.1}},
+            {"role": "ai", "content": "That sounds like a lot. I'm here for you."},
+        ]
+        start = time.perf_counter()
+        storage.append_messages(conversation_id, position, turns)
+        window.append((time.perf_counter() - start) * 1000)
+
+        if (position + 2) % args.every == 0:
+            start = time.perf_counter()
+            storage.get_conversation(conversation_id, tail=args.tail)
+            tail_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            storage.get_conversation(conversation_id)
+            full_ms = (time.perf_counter() - start) * 1000
+            checkpoints.append({
+                "messages": position + 2,
+                "append_mean_ms": round(sum(window) / len(window), 3),
+                "append_p99_ms": percentile(window, 0.99),
+                "get_tail_ms": round(tail_ms, 3),
+                "get_full_ms": round(full_ms, 3),
+            })
+            window = []
+
+    storage.close()
+    return {"storage": args.storage, "tail": args.tail, "checkpoints": checkpoints}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Where to write the JSON results")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    emotion = commands.add_parser("emotion", help="Time emotion detection")
+    emotion.add_argument("--backend", choices=("pytorch", "int8", "onnx", "lexicon", "stub"), default="pytorch")
+    emotion.add_argument("--iterations", type=int, default=200)
+    emotion.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+
+    storage = commands.add_parser("storage", help="Time storage appends as a conversation grows")
+    storage.add_argument("--storage", choices=("sqlite", "tinydb"), default="sqlite")
+    storage.add_argument("--turns", type=int, default=2000)
+    storage.add_argument("--every", type=int, default=250)
+    storage.add_argument("--tail", type=int, default=40, help="Messages loaded as recent context")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    results = bench_emotion(args) if args.command == "emotion" else bench_storage(args)
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text)
+
+
+if __name__ == "__main__":
+    main()
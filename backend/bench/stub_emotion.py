@@ -0,0 +1,66 @@
+"""
+A stand-in for `EmotionDetector` that skips the model, for load testing the
+rest of the request path. Results are deterministic per text, and each batch
+sleeps for a configurable time to mimic the forward pass.
+"""
+import hashlib
+import time
+
+LABELS = ["anger", "disgust", "fear", "joy", "neutral", "sadness", "surprise"]
+
+
+class StubEmotionDetector:
+    def __init__(self, cache=None, use_cache: bool = True, batch_ms: float = 5.0,
+                 item_ms: float = 1.0, **kwargs):
+        """
+        Args:
+            cache: An `EmotionCache`, used like the real detector uses it.
+            use_cache: Set to False to "run" every message.
+            batch_ms: Simulated time per batch.
+            item_ms: Simulated extra time per message in a batch.
+            **kwargs: The real detector's model options, ignored.
+        """
+        self.backend = "stub"
+        self.cache = cache if use_cache else None
+        self.batch_ms = batch_ms
+        self.item_ms = item_ms
+
+    def warm_up(self):
+        pass
+
+    def detect_emotion(self, text: str) -> dict:
+        return self.detect_emotions([text])[0]
+
+    def lookup_cached(self, text: str) -> dict | None:
+        if not text:
+            return {"emotion": "neutral", "confidence": 1.0, "scores": {"neutral": 1.0}}
+        if self.cache is None:
+            return None
+        return self.cache.get(text)
+
+    def detect_emotions(self, texts: list, check_cache: bool = True) -> list:
+        results = []
+        misses = []
+        for text in texts:
+            cached = self.lookup_cached(text) if check_cache else None
+            results.append(cached)
+            if cached is None:
+                misses.append(text)
+        if misses:
+            time.sleep((self.batch_ms + self.item_ms * len(misses)) / 1000)
+
+        for i, text in enumerate(texts):
+            if results[i] is None:
+                results[i] = self._classify(text)
+                if self.cache is not None and text:
+                    self.cache.put(text, results[i])
+        return results
+
+    @staticmethod
+    def _classify(text: str) -> dict:
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+        top = LABELS[digest[0] % len(LABELS)]
+        confidence = 0.5 + digest[1] / 510
+        rest = (1 - confidence) / (len(LABELS) - 1)
+        scores = {label: (confidence if label == top else rest) for label in LABELS}
+        return {"emotion": top, "confidence": confidence, "scores": scores}
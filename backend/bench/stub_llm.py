@@ -0,0 +1,157 @@
+"""
+A stand-in for an OpenAI-compatible chat completions endpoint, for exercising
+the LLM client and load testing without a real provider.
+
+    python bench/stub_llm.py --port 8081 --latency-ms 300 --slow-rate 0.05 --error-rate 0.02
+
+Then point the backend at it with LLM_BASE_URL=http://127.0.0.1:8081/v1.
+--fail-first and --slow-first script the first few requests instead, for
+tests that need a failure or outlier at a known point.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = "That sounds like a lot to carry, no cap. I'm here for you. What's been weighing on you the most?"
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so the client's connection pooling is exercised.
+    protocol_version = "HTTP/1.1"
+    config = None
+    stats = {"requests": 0, "errors": 0, "slow": 0}
+    stats_lock = threading.Lock()
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up, e.g. the losing half of a hedged request.
+            pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": "not found"})
+            return
+
+        config = self.config
+        with self.stats_lock:
+            self.stats["requests"] += 1
+            number = self.stats["requests"]
+        if number <= config.fail_first or random.random() < config.error_rate:
+            with self.stats_lock:
+                self.stats["errors"] += 1
+            self._send_json(503, {"error": "simulated overload"}, {"Retry-After": "0"})
+            return
+
+        latency = random.gauss(config.latency_ms, config.jitter_ms) / 1000
+        if number <= config.slow_first or random.random() < config.slow_rate:
+            with self.stats_lock:
+                self.stats["slow"] += 1
+            latency += config.slow_ms / 1000
+        latency = max(0.0, latency)
+
+        if body.get("stream"):
+            self._stream(latency, config.chunk_delay_ms / 1000)
+        else:
+            time.sleep(latency)
+            self._send_json(200, {
+                "id": "stub",
+                "object": "chat.completion",
+                "model": body.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": REPLY},
+                    "finish_reason": "stop",
+                }],
+            })
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self.stats_lock:
+                self._send_json(200, dict(self.stats))
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _stream(self, first_token_latency: float, chunk_delay: float):
+        time.sleep(first_token_latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for word in REPLY.split(" "):
+            chunk = {"choices": [{"index": 0, "delta": {"content": word + " "}}]}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+            time.sleep(chunk_delay)
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text: str):
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status: int, payload: dict, headers: dict | None = None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.config.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8081, **options) -> ThreadingHTTPServer:
+    """Builds a stub server; `options` override the command-line defaults (e.g. `latency_ms=50`)."""
+    config = build_parser().parse_args([])
+    for name, value in options.items():
+        setattr(config, name, value)
+    handler = type("ConfiguredStubLLMHandler", (StubLLMHandler,), {
+        "config": config,
+        "stats": {"requests": 0, "errors": 0, "slow": 0},
+        "stats_lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Stub OpenAI-compatible LLM server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Mean response latency")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="Standard deviation of the latency")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of requests that are slow outliers")
+    parser.add_argument("--slow-ms", type=float, default=3000.0, help="Extra latency added to slow outliers")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--fail-first", type=int, default=0, help="Answer the first N requests with 503")
+    parser.add_argument("--slow-first", type=int, default=0, help="Make the first N requests slow outliers")
+    parser.add_argument("--chunk-delay-ms", type=float, default=20.0, help="Delay between streamed chunks")
+    parser.add_argument("--verbose", action="store_true")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    options = {name: value for name, value in vars(args).items() if name not in ("host", "port")}
+    server = make_server(args.host, args.port, **options)
+    print(f"Stub LLM listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Measures how throughput and memory scale with the number of serve.py workers.
+
+    python bench/workers.py --workers 1 2 4 --concurrency 32 --duration 20
+
+For each worker count, starts serve.py (with the real emotion model unless
+--stub-emotion) against the stub LLM and a fresh database, drives the same
+mixed traffic as bench/loadtest.py, and reports aggregate requests per second
+and latency plus the memory of the whole process tree. RSS counts shared
+pages once per process, so PSS (proportional set size, Linux only) is the
+number that shows copy-on-write sharing; `pss_per_added_worker_mb` is what
+each extra worker costs. Results are printed and saved as JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from loadtest import (
+    BACKEND_DIR, BENCH_DIR, RESULTS_DIR, VirtualUser, free_port, git_commit, rss_mb, run_level,
+)
+
+
+def process_tree(pid: int) -> list:
+    """The pid and all its descendants, from /proc (Linux only)."""
+    pids = [pid]
+    for current in pids:
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as children:
+                pids.extend(int(child) for child in children.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def pss_mb(pid: int) -> float | None:
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as rollup:
+            for line in rollup:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def tree_memory(pid: int) -> dict:
+    pids = process_tree(pid)
+    rss = [rss_mb(p) for p in pids]
+    pss = [pss_mb(p) for p in pids]
+    return {
+        "processes": len(pids),
+        "rss_mb": round(sum(value for value in rss if value), 1),
+        "pss_mb": round(sum(value for value in pss if value), 1) if any(pss) else None,
+    }
+
+
+async def wait_all_ready(url: str, workers: int, timeout: float):
+    """Waits until /readyz has answered 200 several times in a row, so every worker has likely warmed up."""
+    deadline = time.monotonic() + timeout
+    streak = 0
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.monotonic() < deadline:
+            try:
+                ready = (await client.get("/readyz")).status_code == 200
+            except httpx.HTTPError:
+                ready = False
+            streak = streak + 1 if ready else 0
+            if streak >= workers * 4:
+                return
+            await asyncio.sleep(0.1 if ready else 0.25)
+    raise RuntimeError(f"{url} was not ready after {timeout:.0f}s")
+
+
+async def measure(args, workers: int, llm_url: str) -> dict:
+    workdir = tempfile.mkdtemp(prefix="empathy-workers-")
+    env = dict(os.environ)
+    env.update({
+        "LLM_CLIENT": "async",
+        "LLM_BASE_URL": llm_url,
+        "HF_TOKEN": env.get("HF_TOKEN") or "bench",
+        "LLM_TOKENIZER": "",
+        "DATABASE_PATH": os.path.join(workdir, "bench.db"),
+        "CONVERSATION_LOG": os.path.join(workdir, "logs", "conversations.jsonl"),
+        "PASSWORD_HASH_ROUNDS": str(args.bcrypt_rounds),
+        "BENCH_STUB_EMOTION": "1" if args.stub_emotion else "0",
+        "LOG_LEVEL": "WARNING",
+    })
+    port = free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable, os.path.join(BACKEND_DIR, "serve.py"), "--workers", str(workers),
+            "--port", str(port), "--app", "bench_app:app", "--log-level", "warning",
+        ]
+        + (["--threads-per-worker", str(args.threads_per_worker)] if args.threads_per_worker else []),
+        cwd=workdir, env={**env, "PYTHONPATH": os.pathsep.join(filter(None, [BENCH_DIR, env.get("PYTHONPATH")]))},
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        await wait_all_ready(url, workers, args.ready_timeout)
+        idle = tree_memory(server.pid)
+        limits = httpx.Limits(max_connections=args.concurrency + 16)
+        async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+            users = []
+            for i in range(args.concurrency):
+                user = VirtualUser(client, f"bench-{i}", "bench-password", args.max_turns)
+                (await client.post(
+                    "/users/signup",
+                    json={"username": user.username, "name": user.username, "password": user.password},
+                )).raise_for_status()
+                (await user.login()).raise_for_status()
+                users.append(user)
+            level = await run_level(url, users, [6.0, 1.5, 1.5, 1.0], args.duration, server.pid)
+        loaded = tree_memory(server.pid)
+    finally:
+        server.terminate()
+        try:
+            server.wait(15)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    return {
+        "workers": workers,
+        "overall": level["overall"],
+        "actions": level["actions"],
+        "memory_idle": idle,
+        "memory_loaded": loaded,
+    }
+
+
+async def run(args) -> dict:
+    llm_port = free_port()
+    llm = subprocess.Popen(
+        [
+            sys.executable, os.path.join(BENCH_DIR, "stub_llm.py"), "--port", str(llm_port),
+            "--latency-ms", str(args.llm_latency_ms),
+        ],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    results = []
+    try:
+        for workers in args.workers:
+            result = await measure(args, workers, f"http://127.0.0.1:{llm_port}/v1")
+            results.append(result)
+            print(
+                f"{workers} workers: {result['overall']['rps']} req/s, p99 {result['overall']['p99_ms']} ms, "
+                f"RSS {result['memory_loaded']['rss_mb']} MB, PSS {result['memory_loaded']['pss_mb']} MB",
+                file=sys.stderr,
+            )
+    finally:
+        llm.terminate()
+
+    first = results[0]
+    for result in results[1:]:
+        added = result["workers"] - first["workers"]
+        for key in ("rss_mb", "pss_mb"):
+            before, after = first["memory_loaded"][key], result["memory_loaded"][key]
+            if added and before is not None and after is not None:
+                result[f"{key.split('_')[0]}_per_added_worker_mb"] = round((after - before) / added, 1)
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {name: value for name, value in vars(args).items() if name != "output"},
+        "results": results,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads-per-worker", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--max-turns", type=int, default=200)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--stub-emotion", action="store_true", help="Skip the real emotion model")
+    parser.add_argument("--bcrypt-rounds", type=int, default=10)
+    parser.add_argument("--ready-timeout", type=float, default=300.0)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="Where to write the JSON results")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    results = asyncio.run(run(args))
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"workers-{results['commit'] or 'unknown'}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Re-scores JSONL dumps with the emotion model, in parallel and resumably.
+
+    python -m empathy_ai.batch transcripts.jsonl -o scored.jsonl --workers 4
+    python -m empathy_ai.batch ../requests.jsonl -o scored.jsonl --text-field body --id-field request_id
+
+Each input line is either a record with a text field (`--text-field`, by
+default the first of text/content/user_message/message/body that is present)
+or an exported conversation with a `messages` list, whose user messages are
+scored one by one. Output lines carry the record's id (or
+`<conversation id>:<position>`), the emotion, its confidence and all scores,
+plus the per-chunk emotions of messages long enough to be split.
+
+Input is read a window at a time. Each window is sorted by length into
+batches so similar-length texts are padded together, the batches are scored
+across the worker processes, and the window's results are appended in input
+order. A checkpoint next to the output records how far the run got, so an
+interrupted run picks up where it left off when started again.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from .emotion_detector import BACKENDS, MODEL_NAME, EmotionDetector
+
+TEXT_FIELDS = ("text", "content", "user_message", "message", "body")
+ID_FIELDS = ("id", "request_id", "conversation_id")
+
+_detector = None
+
+
+def _init_worker(backend: str, model_name: str, threads: int, max_chunk_tokens: int, max_chunks: int):
+    global _detector
+    if threads:
+        try:
+            import torch
+        except ImportError:
+            pass
+        else:
+            torch.set_num_threads(threads)
+    _detector = EmotionDetector(use_cache=False, backend=backend, model_name=model_name,
+                                max_chunk_tokens=max_chunk_tokens, max_chunks=max_chunks)
+
+
+def _score(texts: list) -> list:
+    return _detector.detect_emotions(texts, check_cache=False)
+
+
+def iter_items(paths: list, text_field: str | None = None, id_field: str | None = None,
+               roles: tuple = ("user",)):
+    """
+    Yields `(id, text)` for every message to score, reading the files lazily.
+
+    Args:
+        paths: JSONL files, read in order.
+        text_field: The field holding the text. Guessed per record if omitted.
+        id_field: The field holding the record's id. Guessed per record if omitted.
+        roles: Which roles' messages to score in exported conversations.
+    """
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            for line_number, line in enumerate(file, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                fields = (id_field,) if id_field else ID_FIELDS
+                record_id = next((record[field] for field in fields if record.get(field) is not None),
+                                 f"{os.path.basename(path)}:{line_number}")
+
+                if isinstance(record.get("messages"), list):
+                    offset = record.get("offset", 0)
+                    for position, message in enumerate(record["messages"], offset):
+                        if message.get("role") in roles:
+                            yield f"{record_id}:{position}", message.get("content") or ""
+                    continue
+
+                fields = (text_field,) if text_field else TEXT_FIELDS
+                text = next((record[field] for field in fields if isinstance(record.get(field), str)), None)
+                if text is not None:
+                    yield record_id, text
+
+
+def length_batches(items: list, batch_size: int) -> list:
+    """Groups item indices into batches of similar text length, to keep padding down."""
+    order = sorted(range(len(items)), key=lambda i: len(items[i][1]))
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+class Checkpoint:
+    """How many items have been written, and how long the output was at that point."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.items = 0
+        self.output_bytes = 0
+        if os.path.exists(path):
+            with open(path) as file:
+                state = json.load(file)
+            self.items = state["items"]
+            self.output_bytes = state["output_bytes"]
+
+    def save(self, items: int, output_bytes: int):
+        self.items = items
+        self.output_bytes = output_bytes
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as file:
+            json.dump({"items": items, "output_bytes": output_bytes}, file)
+        os.replace(temporary, self.path)
+
+
+def run(args) -> dict:
+    checkpoint = Checkpoint(args.output + ".checkpoint")
+    if checkpoint.items and not args.restart:
+        print(f"Resuming after {checkpoint.items} messages", file=sys.stderr)
+    else:
+        checkpoint.save(0, 0)
+
+    # Drop anything written after the last checkpoint, e.g. by a run killed mid-window.
+    with open(args.output, "a", encoding="utf-8") as output:
+        output.truncate(checkpoint.output_bytes)
+
+    items = iter_items(args.inputs, args.text_field, args.id_field, tuple(args.roles))
+    items = islice(items, checkpoint.items, None)
+
+    if args.workers > 0:
+        pool = ProcessPoolExecutor(
+            max_workers=args.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(args.backend, args.model, args.threads_per_worker, args.chunk_tokens, args.max_chunks),
+        )
+        score_batches = lambda batches: pool.map(_score, batches)  # noqa: E731
+    else:
+        pool = None
+        # Scoring in this process, torch may use every core.
+        _init_worker(args.backend, args.model, 0, args.chunk_tokens, args.max_chunks)
+        score_batches = lambda batches: map(_score, batches)  # noqa: E731
+
+    done = checkpoint.items
+    scored = 0
+    start = time.perf_counter()
+    try:
+        with open(args.output, "a", encoding="utf-8") as output:
+            while True:
+                window = list(islice(items, args.window))
+                if not window:
+                    break
+                batches = length_batches(window, args.batch_size)
+                results = [None] * len(window)
+                for indices, outputs in zip(batches, score_batches([[window[i][1] for i in indices]
+                                                                    for indices in batches])):
+                    for i, result in zip(indices, outputs):
+                        results[i] = result
+
+                for (item_id, _), result in zip(window, results):
+                    output.write(json.dumps({"id": item_id, **result}, ensure_ascii=False) + "\n")
+                output.flush()
+                os.fsync(output.fileno())
+                done += len(window)
+                scored += len(window)
+                checkpoint.save(done, output.tell())
+
+                elapsed = time.perf_counter() - start
+                print(f"{done} messages scored, {scored / elapsed:.1f} messages/s", file=sys.stderr)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "messages": done,
+        "scored_this_run": scored,
+        "seconds": round(elapsed, 2),
+        "messages_per_second": round(scored / elapsed, 1) if elapsed else None,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Score the emotions of messages in JSONL files.",
+        epilog=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("inputs", nargs="+", help="JSONL files to score")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file to append results to")
+    parser.add_argument("--text-field", help="The field holding each record's text")
+    parser.add_argument("--id-field", help="The field holding each record's id")
+    parser.add_argument("--roles", nargs="+", default=["user"],
+                        help="Message roles to score in exported conversations")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Worker processes, each with its own model; 0 scores in this process")
+    parser.add_argument("--threads-per-worker", type=int, default=1,
+                        help="Torch threads per worker; 0 leaves torch's default")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--window", type=int, default=4096,
+                        help="Messages read, sorted and checkpointed at a time")
+    parser.add_argument("--chunk-tokens", type=int, default=256,
+                        help="Longer messages are split into chunks of at most this many tokens")
+    parser.add_argument("--max-chunks", type=int, default=8, help="The most chunks scored per message")
+    parser.add_argument("--backend", choices=BACKENDS, default="pytorch")
+    parser.add_argument("--model", default=MODEL_NAME, help="Model name or local directory")
+    parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint and start over")
+    return parser
+
+
+def main():
+    summary = run(build_parser().parse_args())
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
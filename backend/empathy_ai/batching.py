@@ -0,0 +1,144 @@
+import asyncio
+import functools
+import time
+from collections import Counter
+
+
+class EmotionBatcher:
+    def __init__(self, detector, max_batch_size: int = 16, max_wait_ms: float = 5.0, executor=None, max_queue: int = 0):
+        """
+        Collects emotion detection requests from concurrent callers and runs them
+        through the classifier as a single padded batch.
+
+        Args:
+            detector: An object exposing `detect_emotions(texts) -> list[dict]`. If
+                it also has a result cache (`lookup_cached`), cached messages are
+                answered straight away without joining a batch.
+            max_batch_size: The largest number of messages sent to the model at once.
+            max_wait_ms: How long the first message of a batch may wait for company.
+            executor: The `concurrent.futures` executor used for the forward pass.
+                Defaults to the event loop's default executor.
+            max_queue: The number of messages allowed to wait for a batch. Beyond
+                that `detect_emotion` raises `asyncio.QueueFull`. 0 means unbounded.
+        """
+        self.detector = detector
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.executor = executor
+        self.max_queue = max(0, max_queue)
+
+        self.batch_sizes = Counter()
+        self.total_batches = 0
+        self.total_items = 0
+        self.rejected = 0
+
+        self._queue = None
+        self._worker = None
+
+        self._cached_lookup = getattr(detector, "lookup_cached", None)
+        if self._cached_lookup is not None:
+            # Queued messages were already looked up once.
+            self._detect = functools.partial(detector.detect_emotions, check_cache=False)
+        else:
+            self._detect = detector.detect_emotions
+
+    def start(self):
+        """Starts the background batching task on the running event loop."""
+        if self._worker is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancels the batching task, failing any messages still waiting."""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
+
+    async def detect_emotion(self, text: str) -> dict:
+        """
+        Queues a message for the next batch and waits for its result.
+
+        Returns:
+            The same dictionary `EmotionDetector.detect_emotion` would return.
+        """
+        if not text:
+            return {"emotion": "neutral", "confidence": 1.0, "scores": {"neutral": 1.0}}
+        if self._cached_lookup is not None:
+            cached = self._cached_lookup(text)
+            if cached is not None:
+                return cached
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((text, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise
+        return await future
+
+    def stats(self) -> dict:
+        """Returns the batch-size distribution and running totals."""
+        return {
+            "total_batches": self.total_batches,
+            "total_items": self.total_items,
+            "mean_batch_size": self.total_items / self.total_batches if self.total_batches else 0.0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "rejected": self.rejected,
+        }
+
+    async def _collect(self) -> list:
+        """Waits for one message, then gathers more until the batch is full or the window closes."""
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # Drain anything that arrived while we were waiting, up to the cap.
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Callers that gave up while queued don't need a slot in the batch.
+            batch = [(text, future) for text, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            self.batch_sizes[len(batch)] += 1
+            self.total_batches += 1
+            self.total_items += len(batch)
+
+            texts = [text for text, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self._detect, texts)
+            except asyncio.CancelledError:
+                for _, future in batch:
+                    future.cancel()
+                raise
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
@@ -0,0 +1,109 @@
+import threading
+import time
+
+from .errors import LLMError
+
+STATES = ("closed", "open", "half_open")
+
+
+class CircuitOpen(LLMError):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, half_open_probes: int = 1):
+        """
+        Stops calling a provider that keeps failing, and lets a few calls
+        through now and then to find out when it has recovered.
+
+        The breaker starts closed. After `failure_threshold` consecutive
+        failures (errors or timeouts) it opens and `allow` refuses every call.
+        Once `reset_timeout` seconds have passed it is half-open: up to
+        `half_open_probes` calls are let through, and the first result decides
+        whether it closes again or reopens for another `reset_timeout`.
+
+        Thread-safe, so sync calls on worker threads can share it with async ones.
+
+        Args:
+            failure_threshold: Consecutive failures that open the breaker.
+            reset_timeout: Seconds the breaker stays open before probing. Also
+                how long a probe may go unreported before another is allowed.
+            half_open_probes: Calls let through at a time while half-open.
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = max(1, half_open_probes)
+
+        self.opened = 0
+        self.rejected = 0
+
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether to make the call. Every allowed call must be followed by `record_success`, `record_failure` or `release`."""
+        with self._lock:
+            now = time.monotonic()
+            if self._state == "closed":
+                return True
+            if self._state == "open":
+                if now - self._opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self._state = "half_open"
+                self._probes = 0
+            if self._probes >= self.half_open_probes and now - self._probe_started >= self.reset_timeout:
+                # The probes never reported back; don't stay half-open forever.
+                self._probes = 0
+            if self._probes < self.half_open_probes:
+                self._probes += 1
+                self._probe_started = now
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._state = "closed"
+
+    def release(self):
+        """
+        Reports that an allowed call ended without telling us anything about
+        the provider, e.g. because its caller went away first. A half-open
+        probe is handed back so another call can take it.
+        """
+        with self._lock:
+            if self._state == "half_open" and self._probes:
+                self._probes -= 1
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == "half_open" or (
+                self._state == "closed" and self._failures >= self.failure_threshold
+            ):
+                self._state = "open"
+                self._opened_at = time.monotonic()
+                self.opened += 1
+
+    def stats(self) -> dict:
+        state = self.state
+        with self._lock:
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,146 @@
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def approximate_tokens(text: str) -> int:
+    """Roughly four characters per token, which holds up well for English BPE vocabularies."""
+    return (len(text) + 3) // 4
+
+
+def format_turn(turn) -> str:
+    """Renders a turn the way the system prompt does."""
+    return f"{_speaker(turn.role)}: {turn.content}\n"
+
+
+def _speaker(role: str) -> str:
+    return "User" if role == "user" else "AI"
+
+
+class TokenCounter:
+    def __init__(self, model_name: str | None = None, local_files_only: bool = False):
+        """
+        Counts tokens with the target model's tokenizer.
+
+        If the tokenizer can't be loaded (e.g. a gated model with no token, or
+        no network), counts fall back to `approximate_tokens`.
+
+        Args:
+            model_name: The tokenizer to load, or a local directory holding it.
+            local_files_only: Never contact the Hugging Face Hub when loading.
+        """
+        self.tokenizer = None
+        if model_name:
+            try:
+                from transformers import AutoTokenizer
+                self.tokenizer = AutoTokenizer.from_pretrained(model_name, local_files_only=local_files_only)
+            except Exception as e:
+                logger.warning("Could not load tokenizer %s, approximating token counts: %s", model_name, e)
+
+    @property
+    def exact(self) -> bool:
+        return self.tokenizer is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.tokenizer is None:
+            return approximate_tokens(text)
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def count_messages(self, messages: list) -> int:
+        """Counts the tokens of chat messages (`{"role", "content"}` dicts), plus a few per message for the template."""
+        return sum(self.count(message["content"]) + 4 for message in messages)
+
+
+def fold_summary(summary: str, turns: list, line_chars: int = 160) -> str:
+    """
+    Extends an extractive summary with one clipped line per turn: the first
+    sentence of each message, cut to `line_chars` characters.
+    """
+    lines = [summary] if summary else []
+    for turn in turns:
+        text = " ".join(turn.content.split())
+        first = _SENTENCE_END.split(text, maxsplit=1)[0]
+        if len(first) > line_chars:
+            first = first[:line_chars - 3].rstrip() + "..."
+        if first:
+            lines.append(f"{_speaker(turn.role)}: {first}")
+    return "\n".join(lines)
+
+
+class ContextBuilder:
+    def __init__(self, counter: TokenCounter, budget: int = 1024, summary_budget: int = 256,
+                 summarize=fold_summary):
+        """
+        Chooses which turns go into the LLM prompt so it stays within a token budget.
+
+        Turns are taken newest first until the budget is spent. Turns that
+        drop out of the window are folded into a rolling summary, which is
+        extended incrementally (only with the newly dropped turns) and trimmed
+        from its oldest lines to stay within `summary_budget`.
+
+        Args:
+            counter: Counts tokens.
+            budget: Tokens for the summary and the recent turns together.
+            summary_budget: The most tokens the summary may take.
+            summarize: `summarize(summary, turns) -> str`, extending a summary
+                with newly dropped turns.
+        """
+        self.counter = counter
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.summarize = summarize
+
+    def build(self, turns: list, offset: int, summary: str = "", summarized_through: int = 0) -> dict:
+        """
+        Args:
+            turns: The most recent turns of the conversation, oldest first,
+                ending with the new user message.
+            offset: The position of `turns[0]` in the conversation.
+            summary: The conversation's stored summary.
+            summarized_through: The position up to which turns are in `summary`.
+
+        Returns:
+            A dict with the `turns` to include, the `summary` and
+            `summarized_through` to use and store, whether the summary
+            `changed`, and the `tokens` the context takes.
+        """
+        # Newest first, always keeping the new message itself.
+        kept = 0
+        used = 0
+        remaining = self.budget - min(self.counter.count(summary), self.summary_budget)
+        for turn in reversed(turns):
+            cost = self.counter.count(format_turn(turn))
+            if kept and used + cost > remaining:
+                break
+            used += cost
+            kept += 1
+        first_kept = offset + len(turns) - kept
+
+        changed = False
+        if first_kept > summarized_through:
+            # Turns older than the loaded window can't be summarized any more;
+            # they are skipped.
+            dropped = turns[max(0, summarized_through - offset):len(turns) - kept]
+            if dropped:
+                summary = self._trim(self.summarize(summary, dropped))
+            summarized_through = first_kept
+            changed = True
+
+        return {
+            "turns": turns[len(turns) - kept:],
+            "summary": summary,
+            "summarized_through": summarized_through,
+            "changed": changed,
+            "tokens": used + self.counter.count(summary),
+        }
+
+    def _trim(self, summary: str) -> str:
+        lines = summary.split("\n")
+        while len(lines) > 1 and self.counter.count("\n".join(lines)) > self.summary_budget:
+            lines.pop(0)
+        return "\n".join(lines)
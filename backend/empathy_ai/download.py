@@ -0,0 +1,31 @@
+"""
+Downloads the emotion model into a local directory, so servers can load it
+with EMPATHY_OFFLINE=1 and EMOTION_MODEL_DIR pointing at that directory.
+
+    python -m empathy_ai.download models/emotion --revision <commit sha>
+"""
+import argparse
+
+from .emotion_detector import MODEL_NAME
+
+
+def download_model(local_dir: str, model_name: str = MODEL_NAME, revision: str | None = None) -> str:
+    """Copies a pinned snapshot of the model repository into `local_dir` and returns its path."""
+    from huggingface_hub import snapshot_download
+
+    return snapshot_download(repo_id=model_name, revision=revision, local_dir=local_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download the emotion model for offline use.")
+    parser.add_argument("local_dir", help="Directory to store the model in")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--revision", help="Branch, tag or commit to pin (defaults to main)")
+    args = parser.parse_args()
+
+    path = download_model(args.local_dir, args.model, args.revision)
+    print(f"Saved {args.model} to {path}")
+
+
+if __name__ == "__main__":
+    main()
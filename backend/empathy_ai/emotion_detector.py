@@ -1,16 +1,275 @@
-from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
+import hashlib
+import logging
+import os
+import re
+import string
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# transformers (and with it torch) is imported when a model is loaded, not
+# here, so that the lexicon backend and code that only needs the cache or the
+# constants start quickly.
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "j-hartmann/emotion-english-distilroberta-base"
+BACKENDS = ("pytorch", "int8", "onnx", "lexicon")
+
+_PUNCTUATION = str.maketrans("", "", string.punctuation)
+_WHITESPACE = re.compile(r"\s+")
+# Where one sentence ends: terminal punctuation (and any closing quotes or
+# brackets) followed by whitespace, or a line break.
+_SENTENCE_END = re.compile(r"[.!?…]+[\"'”’)\]]*\s+|\s*\n\s*")
+
+class EmotionCache:
+    def __init__(self, max_entries: int = 2048, max_bytes: int | None = None,
+                 ttl: float | None = 3600.0, strip_punctuation: bool = True):
+        """
+        A thread-safe LRU cache of emotion results keyed on normalized text.
+
+        Args:
+            max_entries: The most results kept at once.
+            max_bytes: An optional cap on the approximate memory used by entries.
+            ttl: Seconds before an entry expires, or None to keep entries until evicted.
+            strip_punctuation: Whether "im sad!!" and "I'm sad" share an entry.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.strip_punctuation = strip_punctuation
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        # key -> (expires_at, size, result), least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def normalize(self, text: str) -> str:
+        """Lowercases, collapses whitespace and (optionally) drops punctuation."""
+        key = text.lower()
+        if self.strip_punctuation:
+            key = key.translate(_PUNCTUATION)
+        return _WHITESPACE.sub(" ", key).strip()
+
+    def get(self, text: str) -> dict | None:
+        key = self.normalize(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return _copy_result(entry[2])
+
+    def put(self, text: str, result: dict):
+        key = self.normalize(text)
+        size = sys.getsizeof(key) + sum(
+            sys.getsizeof(label) + 32 for label in result.get("scores", {})
+        ) + 256
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, size, _copy_result(result))
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+def _copy_result(result: dict) -> dict:
+    copied = dict(result)
+    if "scores" in copied:
+        copied["scores"] = dict(copied["scores"])
+    if "chunks" in copied:
+        copied["chunks"] = [dict(chunk) for chunk in copied["chunks"]]
+    return copied
+
+def split_sentences(text: str) -> list:
+    """Splits `text` into `(start, end)` spans, one per sentence or line, covering all of it."""
+    spans = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        if match.end() > start:
+            spans.append((start, match.end()))
+            start = match.end()
+    if start < len(text):
+        spans.append((start, len(text)))
+    return spans
+
+def _top_result(scores: dict) -> dict:
+    top_emotion = max(scores, key=scores.get)
+    return {"emotion": top_emotion, "confidence": round(scores[top_emotion], 2), "scores": scores}
+
+def _artifact_path(model_name: str, artifact_dir: str, backend: str) -> str:
+    return os.path.join(artifact_dir, model_name.replace("/", "--"), backend)
+
+def _load_pytorch(model_name: str, local_files_only: bool = False):
+    """The reference fp32 PyTorch model."""
+    from transformers import AutoModelForSequenceClassification
+
+    # We explicitly load the model to ensure safetensors is used.
+    return AutoModelForSequenceClassification.from_pretrained(
+        model_name, use_safetensors=True, local_files_only=local_files_only
+    )
+
+def _model_revision(model_name: str, config) -> str:
+    """
+    Identifies the weights `config` belongs to: the Hub commit they were
+    loaded from or, for a local directory, its files' names, sizes and mtimes.
+    """
+    revision = getattr(config, "_commit_hash", None)
+    if revision:
+        return revision
+    if os.path.isdir(model_name):
+        files = []
+        for name in sorted(os.listdir(model_name)):
+            stat = os.stat(os.path.join(model_name, name))
+            files.append(f"{name}:{stat.st_size}:{int(stat.st_mtime)}")
+        return ",".join(files)
+    return config.to_json_string()
+
+def _load_int8(model_name: str, artifact_dir: str, local_files_only: bool = False):
+    """
+    The fp32 model with its Linear layers dynamically quantized to int8.
+
+    The quantized weights are saved under `artifact_dir` the first time, after
+    which the model is rebuilt from its config without loading fp32 weights.
+    Saved weights are keyed by the model's revision and the torch version, so
+    a changed model or an upgrade quantizes afresh, and are loaded with
+    `weights_only=True`, so nothing in `artifact_dir` can run code.
+    """
+    import torch
+    from transformers import AutoConfig, AutoModelForSequenceClassification
+
+    config = AutoConfig.from_pretrained(model_name, local_files_only=local_files_only)
+    key = hashlib.sha1(f"{_model_revision(model_name, config)}|{torch.__version__}".encode()).hexdigest()[:16]
+    path = os.path.join(_artifact_path(model_name, artifact_dir, "int8"), key, "model.pt")
+    state_dict = None
+    if os.path.exists(path):
+        try:
+            state_dict = torch.load(path, weights_only=True)
+        except Exception as e:
+            logger.warning("Could not load quantized weights from %s, quantizing again: %s", path, e)
+    if state_dict is not None:
+        model = AutoModelForSequenceClassification.from_config(config)
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        model.load_state_dict(state_dict)
+    else:
+        model = torch.quantization.quantize_dynamic(
+            _load_pytorch(model_name, local_files_only), {torch.nn.Linear}, dtype=torch.qint8
+        )
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        torch.save(model.state_dict(), path)
+    model.eval()
+    return model
+
+def _load_onnx(model_name: str, artifact_dir: str, local_files_only: bool = False):
+    """The model exported to an ONNX Runtime graph, exported once and kept under `artifact_dir`."""
+    try:
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+    except ImportError as e:
+        raise ImportError(
+            "The onnx backend needs optimum with ONNX Runtime: pip install 'optimum[onnxruntime]'"
+        ) from e
+
+    path = _artifact_path(model_name, artifact_dir, "onnx")
+    if os.path.exists(os.path.join(path, "config.json")):
+        return ORTModelForSequenceClassification.from_pretrained(path)
+    model = ORTModelForSequenceClassification.from_pretrained(
+        model_name, export=True, local_files_only=local_files_only
+    )
+    model.save_pretrained(path)
+    return model
 
 class EmotionDetector:
-    def __init__(self):
+    def __init__(self, cache: EmotionCache | None = None, use_cache: bool = True,
+                 backend: str = "pytorch", model_name: str = MODEL_NAME,
+                 artifact_dir: str = "model_cache", local_files_only: bool = False,
+                 max_chunk_tokens: int = 256, max_chunks: int = 8):
         """
         Initializes the EmotionDetector with a pre-trained text classification model.
+
+        Args:
+            cache: The result cache to use. A default-sized one is created if omitted.
+            use_cache: Set to False to run every message through the model.
+            backend: How to run the model on CPU: "pytorch" (fp32), "int8"
+                (PyTorch dynamic quantization) or "onnx" (ONNX Runtime). "lexicon"
+                skips the model for a keyword lexicon that needs neither torch
+                nor transformers; see `empathy_ai.lexicon`.
+            model_name: The Hugging Face model to load, or a local directory holding it.
+            artifact_dir: Where quantized and exported models are cached.
+            local_files_only: Never contact the Hugging Face Hub; load only from
+                `model_name` on disk or the local cache.
+            max_chunk_tokens: Messages longer than this many tokens are split on
+                sentence boundaries into chunks of at most this size, which are
+                classified together and their scores averaged by length.
+            max_chunks: The most chunks classified per message. Longer messages
+                are sampled evenly, keeping the first and last chunk, which
+                bounds the cost of any one message.
         """
-        model_name = "j-hartmann/emotion-english-distilroberta-base"
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        # We explicitly load the model to ensure safetensors is used.
-        model = AutoModelForSequenceClassification.from_pretrained(
-            model_name, use_safetensors=True
-        )
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown emotion backend {backend!r}; expected one of {BACKENDS}")
+        self.backend = backend
+
+        self.max_chunks = max(1, max_chunks)
+        if backend == "lexicon":
+            from .lexicon import LexiconClassifier
+
+            # The lexicon has no length limit, so messages are never chunked.
+            self.tokenizer = None
+            self.max_chunk_tokens = max_chunk_tokens
+            self.classifier = LexiconClassifier()
+            self.cache = (cache or EmotionCache()) if use_cache else None
+            return
+
+        from transformers import AutoTokenizer, pipeline
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name, local_files_only=local_files_only)
+        self.tokenizer = tokenizer
+        # Leave room for the special tokens the pipeline adds.
+        self.max_chunk_tokens = max(16, min(max_chunk_tokens, (tokenizer.model_max_length or 512) - 2))
+        if backend == "int8":
+            model = _load_int8(model_name, artifact_dir, local_files_only)
+        elif backend == "onnx":
+            model = _load_onnx(model_name, artifact_dir, local_files_only)
+        else:
+            model = _load_pytorch(model_name, local_files_only)
 
         self.classifier = pipeline(
             "text-classification",
@@ -18,6 +277,11 @@ class EmotionDetector:
             tokenizer=tokenizer,
             top_k=None
         )
+        self.cache = (cache or EmotionCache()) if use_cache else None
+
+    def warm_up(self):
+        """Runs one throwaway inference so the first real request doesn't pay for lazy initialization."""
+        self.classifier(["Just warming up, how are you feeling today?"], batch_size=1, truncation=True)
 
     def detect_emotion(self, text: str) -> dict:
         """
@@ -27,22 +291,145 @@ class EmotionDetector:
             text: The input string from the user.
 
         Returns:
-            A dictionary containing the detected emotion and its confidence score.
-            Example: {"emotion": "sadness", "confidence": 0.92}
+            A dictionary containing the detected emotion, its confidence score and
+            the full score distribution.
+            Example: {"emotion": "sadness", "confidence": 0.92, "scores": {"sadness": 0.92, ...}}
+            Messages split into chunks also carry `chunks`, the emotion of each
+            chunk in order with its character span and token count, which traces
+            the emotional arc within the message.
         """
+        return self.detect_emotions([text])[0]
+
+    def lookup_cached(self, text: str) -> dict | None:
+        """Returns the cached result for `text` without touching the model, if there is one."""
         if not text:
-            return {"emotion": "neutral", "confidence": 1.0}
-
-        results = self.classifier(text)
-        # The model with `return_all_scores=True` returns a list inside a list
-        scores = results[0]
-        # Find the emotion with the highest score
-        top_emotion = max(scores, key=lambda x: x['score'])
-        
-        return {
-            "emotion": top_emotion["label"],
-            "confidence": round(top_emotion["score"], 2)
-        }
+            return {"emotion": "neutral", "confidence": 1.0, "scores": {"neutral": 1.0}}
+        if self.cache is None:
+            return None
+        return self.cache.get(text)
+
+    def detect_emotions(self, texts: list, check_cache: bool = True) -> list:
+        """
+        Detects the primary emotion for several texts with a single padded forward pass.
+
+        Args:
+            texts: A list of input strings.
+            check_cache: Set to False when the caller has already looked the texts
+                up with `lookup_cached`. Results are cached either way.
+
+        Returns:
+            A list of dictionaries in the same order as `texts`, each shaped like
+            the result of `detect_emotion`.
+        """
+        if check_cache:
+            results = [self.lookup_cached(text) for text in texts]
+        else:
+            results = [None if text else self.lookup_cached(text) for text in texts]
+        # Empty and cached messages never reach the model.
+        indices = [i for i, result in enumerate(results) if result is None]
+        if not indices:
+            return results
+
+        # Long messages become several chunks; every chunk of every message
+        # goes through the model in the same batch.
+        spans = {i: self.chunk_spans(texts[i]) for i in indices}
+        batch = [texts[i][start:end] for i in indices for start, end, _ in spans[i]]
+        # With `top_k=None` the pipeline returns the full score list for every input;
+        # `batch_size` makes it pad the inputs into one batch instead of looping.
+        outputs = iter(self.classifier(batch, batch_size=len(batch), truncation=True))
+        for i in indices:
+            chunk_scores = [{score["label"]: score["score"] for score in next(outputs)} for _ in spans[i]]
+            if len(chunk_scores) == 1:
+                results[i] = _top_result(chunk_scores[0])
+            else:
+                results[i] = self._aggregate(spans[i], chunk_scores)
+            if self.cache is not None:
+                self.cache.put(texts[i], results[i])
+        return results
+
+    def chunk_spans(self, text: str) -> list:
+        """
+        Splits a message that is too long for one forward pass into chunks.
+
+        Sentences are packed greedily into chunks of up to `max_chunk_tokens`
+        tokens; a single sentence longer than that is cut at token boundaries.
+        If there are more than `max_chunks` chunks, an evenly spaced selection
+        including the first and last is kept.
+
+        Returns:
+            `(start, end, tokens)` for each chunk, in order. Short messages are
+            a single chunk covering the whole text.
+        """
+        # Byte-level BPE produces at most one token per UTF-8 byte, so most
+        # messages are known to fit without tokenizing them.
+        if self.tokenizer is None or len(text.encode("utf-8")) <= self.max_chunk_tokens:
+            return [(0, len(text), None)]
+
+        sentences = [(start, end) for start, end in split_sentences(text) if text[start:end].strip()]
+        if not sentences:
+            return [(0, len(text), None)]
+        counts = [len(ids) for ids in self.tokenizer(
+            [text[start:end] for start, end in sentences], add_special_tokens=False
+        )["input_ids"]]
+        if sum(counts) <= self.max_chunk_tokens:
+            return [(0, len(text), sum(counts))]
+
+        pieces = []
+        for (start, end), count in zip(sentences, counts):
+            if count <= self.max_chunk_tokens:
+                pieces.append((start, end, count))
+            else:
+                pieces.extend(self._split_long_sentence(text, start, end, count))
+
+        chunks = []
+        for start, end, count in pieces:
+            if chunks and chunks[-1][2] + count <= self.max_chunk_tokens:
+                chunks[-1] = (chunks[-1][0], end, chunks[-1][2] + count)
+            else:
+                chunks.append((start, end, count))
+
+        if len(chunks) > self.max_chunks:
+            if self.max_chunks == 1:
+                keep = [0]
+            else:
+                keep = sorted({round(k * (len(chunks) - 1) / (self.max_chunks - 1)) for k in range(self.max_chunks)})
+            chunks = [chunks[k] for k in keep]
+        return chunks
+
+    def _split_long_sentence(self, text: str, start: int, end: int, count: int) -> list:
+        """Cuts one over-long sentence into pieces of at most `max_chunk_tokens` tokens."""
+        if not getattr(self.tokenizer, "is_fast", False):
+            # Slow tokenizers have no offsets; the pipeline truncates the piece instead.
+            return [(start, end, self.max_chunk_tokens)]
+        offsets = self.tokenizer(
+            text[start:end], add_special_tokens=False, return_offsets_mapping=True
+        )["offset_mapping"]
+        pieces = []
+        for first in range(0, len(offsets), self.max_chunk_tokens):
+            window = offsets[first:first + self.max_chunk_tokens]
+            piece_start = start if first == 0 else start + window[0][0]
+            piece_end = end if first + self.max_chunk_tokens >= len(offsets) else start + window[-1][1]
+            pieces.append((piece_start, piece_end, len(window)))
+        return pieces
+
+    def _aggregate(self, spans: list, chunk_scores: list) -> dict:
+        """Averages the chunks' score distributions, weighted by their token counts."""
+        weights = [tokens or 1 for _, _, tokens in spans]
+        total = sum(weights)
+        scores = {}
+        for weight, chunk in zip(weights, chunk_scores):
+            for label, score in chunk.items():
+                scores[label] = scores.get(label, 0.0) + score * weight / total
+
+        result = _top_result(scores)
+        result["chunks"] = []
+        for (start, end, tokens), chunk in zip(spans, chunk_scores):
+            top = _top_result(chunk)
+            result["chunks"].append({
+                "start": start, "end": end, "tokens": tokens,
+                "emotion": top["emotion"], "confidence": top["confidence"],
+            })
+        return result
 
 if __name__ == '__main__':
     # Example usage
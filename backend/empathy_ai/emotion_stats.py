@@ -0,0 +1,92 @@
+"""
+Running emotion aggregates for a conversation, updated in constant time per
+turn and stored as plain JSON alongside it:
+
+    {
+        "turns": 12,                                # user turns seen
+        "counts": {"sadness": 7, "joy": 5},         # turns per detected emotion
+        "mood": {"sadness": 0.41, "joy": 0.33, ...},  # EWMA of the score vectors
+        "recent": ["joy", "sadness", ...],          # the last few detected emotions
+    }
+"""
+
+MOOD_ALPHA = 0.3
+TREND_SIZE = 5
+
+
+def update_emotion_stats(stats: dict | None, emotion: str, scores: dict | None = None,
+                         alpha: float = MOOD_ALPHA, trend_size: int = TREND_SIZE) -> dict:
+    """
+    Returns `stats` updated with one more user turn.
+
+    Args:
+        stats: The current aggregates, or None/{} for a new conversation.
+        emotion: The turn's detected emotion.
+        scores: The turn's full score distribution. Defaults to all weight on `emotion`.
+        alpha: The weight of the new turn in the mood average.
+        trend_size: How many recent emotions to keep.
+    """
+    stats = stats or {}
+    scores = scores or {emotion: 1.0}
+    turns = stats.get("turns", 0)
+
+    counts = dict(stats.get("counts", {}))
+    counts[emotion] = counts.get(emotion, 0) + 1
+
+    previous = stats.get("mood", {})
+    if not turns:
+        mood = {label: round(score, 4) for label, score in scores.items()}
+    else:
+        mood = {
+            label: round((1 - alpha) * previous.get(label, 0.0) + alpha * scores.get(label, 0.0), 4)
+            for label in previous.keys() | scores.keys()
+        }
+
+    return {
+        "turns": turns + 1,
+        "counts": counts,
+        "mood": mood,
+        "recent": (list(stats.get("recent", [])) + [emotion])[-trend_size:],
+    }
+
+
+def dominant_mood(stats: dict | None) -> str | None:
+    """The emotion with the highest weight in the mood average."""
+    mood = (stats or {}).get("mood")
+    if not mood:
+        return None
+    return max(mood, key=mood.get)
+
+
+def describe_emotion_stats(stats: dict | None) -> str:
+    """Summarizes the aggregates in a sentence or two for the response generator."""
+    counts = (stats or {}).get("counts")
+    if not counts:
+        return ""
+    most_common = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:2]
+    if len(most_common) == 1:
+        summary = f"So far, you've mostly been feeling {most_common[0][0]}."
+    else:
+        summary = (
+            f"So far, you've mostly been feeling {most_common[0][0]}, "
+            f"but also had moments of {most_common[1][0]}."
+        )
+
+    recent = stats.get("recent", [])
+    mood = dominant_mood(stats)
+    if len(recent) >= 3 and recent[0] != recent[-1]:
+        summary += f" Lately, things have shifted from {recent[0]} toward {recent[-1]}."
+    elif mood and mood != most_common[0][0]:
+        summary += f" Your mood lately leans toward {mood}."
+    return summary
+
+
+def describe_emotional_arc(emotion_data: dict) -> str:
+    """Describes how the emotion shifts within one long message, from its per-chunk results."""
+    arc = []
+    for chunk in emotion_data.get("chunks") or []:
+        if not arc or arc[-1] != chunk["emotion"]:
+            arc.append(chunk["emotion"])
+    if len(arc) < 2:
+        return ""
+    return f"Within this message, their feelings move from {' to '.join(arc)}."
@@ -0,0 +1,6 @@
+# Kept apart from llm_client so that code which only needs to catch these
+# (the response generator, the circuit breaker) doesn't import httpx.
+
+
+class LLMError(Exception):
+    """Raised when an LLM call fails for good, after any retries."""
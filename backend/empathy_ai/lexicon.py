@@ -0,0 +1,114 @@
+"""
+A keyword lexicon that stands in for the emotion model where torch isn't
+available or startup time matters more than accuracy.
+
+It scores text by counting emotion words and emoji, with simple handling of
+negation ("not happy") and intensifiers ("so scared"), and produces the same
+seven labels as j-hartmann/emotion-english-distilroberta-base, in the shape
+the transformers pipeline returns, so `EmotionDetector` can use it in place
+of the model. Check how far it agrees with the model on your own traffic with
+`python -m empathy_ai.parity --backend lexicon`.
+"""
+import re
+
+LABELS = ("anger", "disgust", "fear", "joy", "neutral", "sadness", "surprise")
+
+_WORDS = {
+    "anger": """
+        angry anger mad furious rage raging livid pissed annoyed annoying irritated irritating
+        frustrated frustrating infuriating outraged resent resentful hate hated hating bitter
+        fed-up unfair hostile yelled yelling screamed screaming
+        😠 😡 🤬
+    """,
+    "disgust": """
+        disgust disgusted disgusting gross grossed revolting repulsive repulsed nasty vile
+        sickening sickened yuck ew eww creepy awful appalled appalling horrible nauseating
+        🤢 🤮
+    """,
+    "fear": """
+        afraid scared scary fear fearful frightened frightening terrified terrifying anxious
+        anxiety worried worry worrying nervous panic panicking panicked dread dreading uneasy
+        overwhelmed stressed stress insecure threatened unsafe helpless
+        😨 😰 😱 😟
+    """,
+    "joy": """
+        happy happiness glad joy joyful excited exciting thrilled delighted love loved loving
+        lovely great awesome amazing wonderful fantastic grateful thankful proud relieved
+        glad fun enjoy enjoyed enjoying smile smiling laugh laughing yay hooray blessed calm
+        peaceful hopeful good best nice excellent perfect beautiful
+        😀 😃 😄 😁 😊 🙂 😍 🥰 😂 🤣 ❤️ ❤ 🎉 🥳
+    """,
+    "sadness": """
+        sad sadness unhappy depressed depressing depression down miserable lonely alone cry
+        crying cried tears heartbroken hurt hurting grief grieving lost loss hopeless empty
+        exhausted tired worthless disappointed disappointing regret sorry miss missing upset
+        gloomy devastated broken numb
+        😢 😭 😞 😔 💔 ☹️ ☹ 🙁
+    """,
+    "surprise": """
+        surprised surprise surprising shocked shocking unexpected unexpectedly wow whoa omg
+        unbelievable astonished amazed suddenly
+        😮 😲 😯 🤯
+    """,
+}
+LEXICON = {word: label for label, words in _WORDS.items() for word in words.split()}
+
+NEGATIONS = {"not", "no", "never", "don't", "dont", "isn't", "isnt", "wasn't", "wasnt", "aren't",
+             "ain't", "can't", "cant", "cannot", "didn't", "didnt", "doesn't", "doesnt", "nothing"}
+INTENSIFIERS = {"so", "very", "really", "extremely", "super", "totally", "completely", "incredibly",
+                "deeply", "truly", "highkey", "lowkey"}
+# How many preceding words a negation reaches.
+NEGATION_SCOPE = 3
+# Evidence assumed before reading any words: with no emotion words, neutral wins.
+NEUTRAL_PRIOR = 1.0
+OTHER_PRIOR = 0.05
+
+_TOKEN = re.compile(r"[a-z][a-z'-]*|[\U0001F300-\U0001FAFF☀-➿]️?")
+_SUFFIXES = ("ing", "ed", "ly", "s")
+
+
+def _lookup(word: str) -> str | None:
+    label = LEXICON.get(word)
+    if label is None:
+        for suffix in _SUFFIXES:
+            if word.endswith(suffix) and len(word) > len(suffix) + 2:
+                label = LEXICON.get(word[:-len(suffix)])
+                if label is not None:
+                    break
+    return label
+
+
+def score_text(text: str) -> dict:
+    """Scores `text` against the lexicon, returning a probability for each label."""
+    words = _TOKEN.findall(text.lower().replace("’", "'"))
+    evidence = dict.fromkeys(LABELS, 0.0)
+    for i, word in enumerate(words):
+        label = _lookup(word)
+        if label is None:
+            continue
+        weight = 1.5 if i > 0 and words[i - 1] in INTENSIFIERS else 1.0
+        if any(previous in NEGATIONS for previous in words[max(0, i - NEGATION_SCOPE):i]):
+            # "not happy" reads as sad; other negated emotions just don't count.
+            if label != "joy":
+                continue
+            label = "sadness"
+        evidence[label] += weight
+
+    scores = {
+        label: evidence[label] + (NEUTRAL_PRIOR if label == "neutral" else OTHER_PRIOR)
+        for label in LABELS
+    }
+    total = sum(scores.values())
+    return {label: score / total for label, score in scores.items()}
+
+
+class LexiconClassifier:
+    """Called like the transformers text-classification pipeline with `top_k=None`."""
+
+    def __call__(self, texts, **kwargs):
+        single = isinstance(texts, str)
+        outputs = [
+            [{"label": label, "score": score} for label, score in score_text(text).items()]
+            for text in ([texts] if single else texts)
+        ]
+        return outputs[0] if single else outputs
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import random
+import time
+from collections import deque
+
+import httpx
+
+from .errors import LLMError
+
+# Connection failures and server-side overload are worth another attempt;
+# anything else (bad request, auth) will fail the same way again.
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+
+
+class _Retryable(Exception):
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AsyncLLMClient:
+    def __init__(self, base_url: str, api_key: str | None = None, model: str = "",
+                 connect_timeout: float = 3.0, read_timeout: float = 30.0,
+                 max_connections: int = 32, max_retries: int = 2,
+                 backoff_base: float = 0.25, backoff_max: float = 4.0,
+                 hedge: bool = False, hedge_min_delay: float = 0.5,
+                 hedge_min_samples: int = 20, max_hedge_ratio: float = 0.1,
+                 latency_window: int = 200):
+        """
+        An async client for OpenAI-compatible chat completion endpoints.
+
+        All calls share one keep-alive connection pool. Retryable failures are
+        retried with full-jitter exponential backoff, honouring Retry-After.
+        With `hedge`, a second identical request is sent if the first has not
+        answered within the recent p95 latency, and whichever finishes first
+        wins; the other is cancelled.
+
+        Args:
+            base_url: The API root, e.g. "https://router.huggingface.co/v1".
+            api_key: Sent as a bearer token if given.
+            model: The model name sent with every request.
+            connect_timeout: Seconds allowed to establish a connection.
+            read_timeout: Seconds allowed between bytes of the response.
+            max_connections: The size of the shared connection pool.
+            max_retries: Extra attempts after a retryable failure.
+            backoff_base: The first backoff ceiling, in seconds; doubles per attempt.
+            backoff_max: The largest backoff ceiling, in seconds.
+            hedge: Whether to send hedged requests for non-streaming calls.
+            hedge_min_delay: The shortest wait, in seconds, before hedging.
+            hedge_min_samples: Latencies needed before p95 is trusted; until
+                then hedging waits `hedge_min_delay`.
+            max_hedge_ratio: The most hedges sent per request overall, so that
+                hedging can't double the load on an already slow provider.
+            latency_window: How many recent latencies p95 is computed over.
+        """
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.max_hedge_ratio = max_hedge_ratio
+
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.client = httpx.AsyncClient(
+            headers=headers,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections, max_keepalive_connections=max_connections
+            ),
+        )
+
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._latencies = deque(maxlen=latency_window)
+
+    async def chat(self, messages: list, max_tokens: int, temperature: float = 0.7) -> str:
+        """
+        Sends a chat completion request and returns the reply text.
+
+        Raises:
+            LLMError: If the request failed and could not be retried.
+        """
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+        }
+        self.requests += 1
+        try:
+            return await self._with_retries(lambda: self._hedged(payload))
+        except LLMError:
+            self.failures += 1
+            raise
+
+    async def stream_chat(self, messages: list, max_tokens: int, temperature: float = 0.7):
+        """
+        Sends a streaming chat completion request, yielding reply text as it arrives.
+
+        Failures before the first chunk are retried like `chat`; once text has
+        been yielded, a failure raises `LLMError`. Streams are never hedged.
+        """
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": True,
+        }
+        self.requests += 1
+        attempt = 0
+        while True:
+            produced = False
+            try:
+                async with self.client.stream(
+                    "POST", f"{self.base_url}/chat/completions", json=payload
+                ) as response:
+                    await self._check_status(response)
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            return
+                        choices = json.loads(data).get("choices") or []
+                        content = choices[0].get("delta", {}).get("content") if choices else None
+                        if content:
+                            produced = True
+                            yield content
+                return
+            except (_Retryable, *RETRYABLE_ERRORS) as e:
+                if produced or attempt >= self.max_retries:
+                    self.failures += 1
+                    raise LLMError(f"Streaming LLM call failed: {e}") from e
+                await self._backoff(attempt, getattr(e, "retry_after", None))
+                attempt += 1
+            except (httpx.HTTPError, ValueError) as e:
+                self.failures += 1
+                raise LLMError(f"Streaming LLM call failed: {e}") from e
+
+    def latency_p95(self) -> float | None:
+        """The 95th percentile of recent successful call latencies, in seconds."""
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def hedge_delay(self) -> float:
+        p95 = self.latency_p95()
+        if p95 is None or len(self._latencies) < self.hedge_min_samples:
+            return self.hedge_min_delay
+        return max(self.hedge_min_delay, p95)
+
+    def stats(self) -> dict:
+        p95 = self.latency_p95()
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "latency_p95_ms": p95 * 1000 if p95 is not None else None,
+        }
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    # --- Internals ---
+    async def _with_retries(self, call):
+        attempt = 0
+        while True:
+            try:
+                return await call()
+            except (_Retryable, *RETRYABLE_ERRORS) as e:
+                if attempt >= self.max_retries:
+                    raise LLMError(f"LLM call failed after {attempt + 1} attempts: {e}") from e
+                await self._backoff(attempt, getattr(e, "retry_after", None))
+                attempt += 1
+            except (httpx.HTTPError, ValueError, KeyError, IndexError) as e:
+                raise LLMError(f"LLM call failed: {e}") from e
+
+    async def _backoff(self, attempt: int, retry_after: float | None):
+        self.retries += 1
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        await asyncio.sleep(delay)
+
+    async def _hedged(self, payload: dict) -> str:
+        if not self.hedge:
+            return await self._post(payload)
+
+        primary = asyncio.ensure_future(self._post(payload))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay())
+        if done or self.hedges >= self.requests * self.max_hedge_ratio:
+            return await primary
+
+        self.hedges += 1
+        backup = asyncio.ensure_future(self._post(payload))
+        pending = {primary, backup}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.hedge_wins += 1
+                        return task.result()
+                # Both failed: surface the primary's error so it can be retried.
+            return primary.result()
+        finally:
+            for task in (primary, backup):
+                if not task.done():
+                    task.cancel()
+
+    async def _post(self, payload: dict) -> str:
+        start = time.perf_counter()
+        response = await self.client.post(f"{self.base_url}/chat/completions", json=payload)
+        await self._check_status(response)
+        text = response.json()["choices"][0]["message"]["content"]
+        self._latencies.append(time.perf_counter() - start)
+        return (text or "").strip()
+
+    @staticmethod
+    async def _check_status(response: httpx.Response):
+        if response.status_code < 400:
+            return
+        await response.aread()
+        message = f"HTTP {response.status_code}: {response.text[:200]}"
+        if response.status_code in RETRYABLE_STATUS:
+            retry_after = response.headers.get("retry-after")
+            try:
+                retry_after = float(retry_after) if retry_after else None
+            except ValueError:
+                retry_after = None
+            raise _Retryable(message, retry_after)
+        raise httpx.HTTPStatusError(message, request=response.request, response=response)
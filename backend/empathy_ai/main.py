@@ -1,89 +1,111 @@
-from .emotion_detector import EmotionDetector
+"""
+The Empathy AI conversational loop in a terminal.
+
+    python -m empathy_ai.main
+    python -m empathy_ai.main --emotion-backend lexicon --templates-only
+
+With `--emotion-backend lexicon --templates-only` neither torch, transformers
+nor huggingface_hub is imported, and the loop starts in well under a second.
+"""
+import argparse
+import os
+
+from .emotion_detector import BACKENDS, EmotionDetector
 from .response_generator import ResponseGenerator
-from .utils import log_conversation
-from collections import Counter
+from .utils import ConversationLogger, StageTimer
+from .emotion_stats import describe_emotion_stats, update_emotion_stats
 
-def summarize_emotional_journey(history):
-    """
-    Summarizes the user's emotional journey so far based on the conversation history.
-    """
-    emotions = [turn["emotion"] for turn in history if turn["role"] == "user" and "emotion" in turn]
-    if not emotions:
-        return ""
-    emotion_counts = Counter(emotions)
-    most_common = emotion_counts.most_common(2)
-    if len(most_common) == 1:
-        return f"So far, you've mostly been feeling {most_common[0][0]}."
-    else:
-        return (
-            f"So far, you've mostly been feeling {most_common[0][0]}, "
-            f"but also had moments of {most_common[1][0]}."
-        )
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emotion-backend", choices=BACKENDS, default=os.getenv("EMOTION_BACKEND", "pytorch"))
+    parser.add_argument("--templates-only", action="store_true", help="Reply from templates, never the LLM")
+    return parser
 
 def main():
     """
     Main function to run the Empathy AI conversational loop.
     """
+    from dotenv import load_dotenv
+
+    args = build_parser().parse_args()
+    load_dotenv()
     print("✨ Hello, I am Empathy AI, your conversational companion. ✨")
     print("I'm here to listen to you without judgment.")
     print('Type your message below, or type "quit" to exit.\n')
 
     try:
-        emotion_detector = EmotionDetector()
-        response_generator = ResponseGenerator()
+        emotion_detector = EmotionDetector(backend=args.emotion_backend)
+        response_generator = ResponseGenerator(sync_client=not args.templates_only)
     except Exception as e:
         print(f"Error initializing AI components: {e}")
         print("Please ensure all models are downloaded and accessible.")
         return
 
     conversation_history = []
+    emotion_stats = {}
+    conversation_logger = ConversationLogger()
+    conversation_logger.start()
 
-    while True:
-        user_message = input("You: ")
-
-        if user_message.lower() in ["quit", "exit"]:
-            print("\nThank you for talking with me. Take care. Goodbye! 👋")
-            break
-
-        if not user_message.strip():
-            print("AI: Please say something. I'm here to listen.")
-            continue
-
-        try:
-            # 1. Detect emotion
-            emotion_data = emotion_detector.detect_emotion(user_message)
-            detected_emotion = emotion_data["emotion"]
-
-            # 2. Add user turn to history
-            conversation_history.append({
-                "role": "user",
-                "content": user_message,
-                "emotion": detected_emotion
-            })
-
-            # 3. Summarize emotional journey
-            emotion_summary = summarize_emotional_journey(conversation_history)
-
-            # 4. Build recent context (last 4 turns)
-            recent_context = conversation_history[-4:]
-
-            # 5. Generate response with context and emotion summary
-            ai_response = response_generator.generate_response(
-                detected_emotion, user_message, recent_context, emotion_summary
-            )
-
-            # 6. Add assistant turn to history
-            conversation_history.append({
-                "role": "assistant",
-                "content": ai_response
-            })
-
-            # 7. Print response and log conversation
-            print(f"AI: {ai_response}")
-            log_conversation(user_message, emotion_data, ai_response)
-
-        except Exception as e:
-            print(f"AI: I'm sorry, I encountered an error. Let's try again. ({e})")
+    try:
+        while True:
+            user_message = input("You: ")
+
+            if user_message.lower() in ["quit", "exit"]:
+                break
+
+            if not user_message.strip():
+                print("AI: Please say something. I'm here to listen.")
+                continue
+
+            try:
+                # 1. Detect emotion
+                timer = StageTimer()
+                emotion_data = emotion_detector.detect_emotion(user_message)
+                timer.mark("emotion")
+                detected_emotion = emotion_data["emotion"]
+
+                # 2. Add user turn to history
+                conversation_history.append({
+                    "role": "user",
+                    "content": user_message,
+                    "emotion": detected_emotion
+                })
+
+                # 3. Summarize emotional journey, updating the running aggregates
+                emotion_stats = update_emotion_stats(emotion_stats, detected_emotion, emotion_data.get("scores"))
+                emotion_summary = describe_emotion_stats(emotion_stats)
+
+                # 4. Build recent context (last 4 turns)
+                recent_context = conversation_history[-4:]
+
+                # 5. Generate response with context and emotion summary
+                ai_response = response_generator.generate_response(
+                    detected_emotion, user_message, recent_context, emotion_summary
+                )
+                timer.mark("llm")
+
+                # 6. Add assistant turn to history
+                conversation_history.append({
+                    "role": "assistant",
+                    "content": ai_response
+                })
+
+                # 7. Print response and log conversation
+                print(f"AI: {ai_response}")
+                conversation_logger.log_turn(
+                    None, None, emotion_data, timer.result(),
+                    user_message=user_message, ai_response=ai_response,
+                )
+
+            except Exception as e:
+                print(f"AI: I'm sorry, I encountered an error. Let's try again. ({e})")
+    except (KeyboardInterrupt, EOFError):
+        # Ctrl-C, Ctrl-D or the end of piped input end the chat like "quit".
+        print()
+    finally:
+        # Flushes the queued turns and compresses a rotated log.
+        conversation_logger.stop()
+    print("\nThank you for talking with me. Take care. Goodbye! 👋")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,105 @@
+"""
+Checks that an optimized EmotionDetector backend labels text the same way as
+the fp32 PyTorch reference.
+
+    python -m empathy_ai.parity --backend int8
+    python -m empathy_ai.parity --backend onnx --input messages.txt
+"""
+import argparse
+import json
+import time
+
+from .emotion_detector import BACKENDS, EmotionDetector
+
+REFERENCE_TEXTS = [
+    "I feel like nothing I do is good enough anymore.",
+    "I am so happy and excited about the new project!",
+    "Why does this keep happening to me, I'm so angry.",
+    "I'm really scared about my test results tomorrow.",
+    "Wait, they actually said yes? I did not see that coming!",
+    "That smell in the kitchen is absolutely revolting.",
+    "I went to the store and bought some bread.",
+    "hi",
+    "thanks",
+    "ok",
+    "im sad",
+    "I miss my grandmother every single day.",
+    "We finally got the keys to our first home!",
+    "My boss took credit for my work again and I'm furious.",
+    "I can't stop worrying that something bad will happen.",
+    "No way, you won the lottery?!",
+    "People who litter make me sick.",
+    "The meeting has been moved to 3pm.",
+    "Honestly I don't know how I feel about it.",
+    "Today was fine, nothing special.",
+]
+
+
+def compare_backends(texts: list, backend: str, reference: str = "pytorch", **detector_kwargs) -> dict:
+    """
+    Runs `texts` through both backends and compares the results.
+
+    Returns:
+        Label agreement, score drift (absolute difference per label) and
+        timings, plus every disagreement.
+    """
+    timings = {}
+    results = {}
+    for name in (reference, backend):
+        detector = EmotionDetector(backend=name, use_cache=False, **detector_kwargs)
+        detector.detect_emotions(texts[:1])  # warm-up
+        start = time.perf_counter()
+        results[name] = detector.detect_emotions(texts)
+        timings[name] = time.perf_counter() - start
+
+    drifts = []
+    disagreements = []
+    for text, expected, actual in zip(texts, results[reference], results[backend]):
+        if not text:
+            continue
+        drifts.extend(
+            abs(expected["scores"][label] - actual["scores"].get(label, 0.0))
+            for label in expected["scores"]
+        )
+        if expected["emotion"] != actual["emotion"]:
+            disagreements.append({
+                "text": text,
+                reference: expected["emotion"],
+                backend: actual["emotion"],
+            })
+
+    compared = sum(1 for text in texts if text)
+    return {
+        "reference": reference,
+        "backend": backend,
+        "texts": compared,
+        "label_agreement": 1 - len(disagreements) / compared if compared else 1.0,
+        "mean_score_drift": sum(drifts) / len(drifts) if drifts else 0.0,
+        "max_score_drift": max(drifts, default=0.0),
+        "seconds": timings,
+        "disagreements": disagreements,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare an EmotionDetector backend against fp32 PyTorch.")
+    parser.add_argument("--backend", choices=[b for b in BACKENDS if b != "pytorch"], required=True)
+    parser.add_argument("--input", help="Text file with one message per line (defaults to a built-in set)")
+    parser.add_argument("--artifact-dir", default="model_cache")
+    parser.add_argument("--min-agreement", type=float, default=1.0,
+                        help="Exit with status 1 if label agreement falls below this")
+    args = parser.parse_args()
+
+    texts = REFERENCE_TEXTS
+    if args.input:
+        with open(args.input, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+
+    report = compare_backends(texts, args.backend, artifact_dir=args.artifact_dir)
+    print(json.dumps(report, indent=2))
+    if report["label_agreement"] < args.min_agreement:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,55 @@
+import asyncio
 import random
 import os
-import re
-from huggingface_hub import InferenceClient
-from dotenv import load_dotenv
+import time
 
-load_dotenv()
+from .circuit_breaker import CircuitOpen
+from .errors import LLMError
+
+LLM_MODEL = "meta-llama/Llama-3.1-8B-Instruct"
+LLM_MAX_TOKENS = 180
 
 class ResponseGenerator:
-    def __init__(self):
+    def __init__(self, llm_client=None, semantic_cache=None, breaker=None, deadline: float | None = None,
+                 sync_client: bool = True):
         """
         Initializes the ResponseGenerator with an API client and pre-defined responses.
+
+        Args:
+            llm_client: An optional `AsyncLLMClient` used by the async methods
+                (`agenerate_response`, `astream_response`). Without one they
+                fall back to templates.
+            semantic_cache: An optional `SemanticResponseCache`. Callers look
+                replies up with `lookup_cached_response` and pass the returned
+                embedding on, so LLM replies get cached under it.
+            breaker: An optional `CircuitBreaker`. While it is open, LLM calls
+                are skipped and templates served instead.
+            deadline: The seconds callers give a non-streaming reply before
+                serving `timeout_response` instead. A reply that arrives after
+                the deadline is still returned, but isn't reported to the
+                breaker, since the timeout already was.
+            sync_client: Whether to create the huggingface_hub InferenceClient
+                used by the sync methods, authenticated with HF_TOKEN. Without
+                it (and without `llm_client`) only templates are served, and
+                huggingface_hub is never imported.
         """
-        try:
-            self.api_client = InferenceClient(
-                provider="nscale",
-                api_key=os.getenv("HF_TOKEN"),
-            )
-        except Exception as e:
-            print(f"Warning: Could not initialize API client: {e}")
-            self.api_client = None
+        self.llm_client = llm_client
+        self.semantic_cache = semantic_cache
+        self.breaker = breaker
+        self.deadline = deadline
+        # Template responses served in place of the LLM, by reason.
+        self.fallbacks = {}
+        self.api_client = None
+        if sync_client:
+            try:
+                from huggingface_hub import InferenceClient
+
+                self.api_client = InferenceClient(
+                    provider="nscale",
+                    api_key=os.getenv("HF_TOKEN"),
+                )
+            except Exception as e:
+                print(f"Warning: Could not initialize API client: {e}")
 
         self.responses = {
             "sadness": [
@@ -86,48 +117,192 @@ class ResponseGenerator:
             ]
         }
 
-    def generate_llm_response(self, emotion: str, user_message: str, recent_context=None, emotion_summary=None) -> str:
+    def _build_system_prompt(self, emotion: str, recent_context=None, emotion_summary=None,
+                             conversation_summary=None) -> str:
         """
-        Generates a dynamic, empathetic response using an LLM, with context and emotion summary.
+        Builds the persona prompt from the detected emotion, the emotion summary,
+        the summary of earlier turns and the recent conversation turns.
         """
-        if not self.api_client:
-            print("Warning: API client not available. Falling back to template response.")
-            return self.generate_template_response(emotion)
-
         # Build context string from recent conversation
         context_str = ""
         if recent_context:
             for turn in recent_context:
-                if turn.role == "user":
-                    context_str += f"User: {turn.content}\n"
-                elif turn.role == "assistant" or turn.role == "ai":
-                    context_str += f"AI: {turn.content}\n"
+                # Turns are ChatTurn models from the API, or plain dicts from the CLI.
+                if isinstance(turn, dict):
+                    role, content = turn["role"], turn["content"]
+                else:
+                    role, content = turn.role, turn.content
+                if role == "user":
+                    context_str += f"User: {content}\n"
+                elif role == "assistant" or role == "ai":
+                    context_str += f"AI: {content}\n"
 
-        system_prompt = (
+        # Turns that no longer fit in the context, condensed
+        summary_str = f"Earlier in the conversation:\n{conversation_summary}\n" if conversation_summary else ""
+
+        return (
             f"You're chatting with your best friend. Your persona is super friendly, modern, and empathetic. "
             f"Use current, natural-sounding slang where it fits—think 'vibe,' 'bet,' 'no cap,' 'slay,' 'that's wild,' 'lowkey,' 'highkey.' "
             f"Keep it real and avoid sounding like a stuffy, repetitive AI. Your main goal is to listen, validate their feelings, and make them feel supported. "
             f"Use emojis to add to the vibe. Always try to end with a gentle, open-ended question to keep the conversation flowing naturally. "
             f"The user is currently feeling {emotion}. "
             f"{emotion_summary if emotion_summary else ''} "
+            f"{summary_str}"
             f"Here is the recent conversation context:\n{context_str}"
         )
 
+    def build_messages(self, emotion: str, user_message: str, recent_context=None, emotion_summary=None,
+                       conversation_summary=None) -> list:
+        """Builds the chat messages sent to the LLM."""
+        return [
+            {"role": "system", "content": self._build_system_prompt(
+                emotion, recent_context, emotion_summary, conversation_summary)},
+            {"role": "user", "content": user_message},
+        ]
+
+    def lookup_cached_response(self, emotion: str, user_message: str, conversation_turns: int) -> tuple:
+        """
+        Looks for a cached LLM reply to a message like this one. Blocking: it
+        runs the embedding model.
+
+        Args:
+            emotion: The message's detected emotion.
+            user_message: The new message.
+            conversation_turns: The conversation's full length, counting the
+                new message.
+
+        Returns:
+            `(reply, embedding)`. `reply` is None on a miss; `embedding` is None
+            if there is no cache or the conversation is too long to use it.
+        """
+        if self.semantic_cache is None or not self.semantic_cache.eligible(conversation_turns):
+            return None, None
+        embedding = self.semantic_cache.embed(user_message)
+        return self.semantic_cache.lookup(emotion, embedding), embedding
+
+    def _cache_response(self, emotion: str, embedding, response_text: str):
+        if embedding is not None and self.semantic_cache is not None and response_text:
+            self.semantic_cache.store(emotion, embedding, response_text)
+
+    def generate_llm_response(self, emotion: str, user_message: str, recent_context=None, emotion_summary=None,
+                              embedding=None, conversation_summary=None) -> str:
+        """
+        Generates a dynamic, empathetic response using an LLM, with context and emotion summary.
+        If `embedding` (from `lookup_cached_response`) is given, the reply is cached under it.
+        """
+        if not self.api_client:
+            print("Warning: API client not available. Falling back to template response.")
+            return self._fallback(emotion, "no_client")
+
+        try:
+            return self.llm_reply(emotion, user_message, recent_context, emotion_summary, embedding,
+                                  conversation_summary)
+        except CircuitOpen:
+            return self._fallback(emotion, "circuit_open")
+        except LLMError as e:
+            print(f"Error during API call: {e}")
+            return self._fallback(emotion, "error")
+
+    def llm_reply(self, emotion: str, user_message: str, recent_context=None, emotion_summary=None,
+                  embedding=None, conversation_summary=None) -> str:
+        """
+        Gets a reply from the LLM through the sync API client, without falling back.
+
+        Raises:
+            CircuitOpen: If the circuit breaker is refusing calls.
+            LLMError: If the client is missing or the call failed.
+        """
+        if not self.api_client:
+            raise LLMError("API client not available")
+        self._admit()
+        started = time.monotonic()
         try:
             response = self.api_client.chat.completions.create(
-                model="meta-llama/Llama-3.1-8B-Instruct",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message},
-                ],
-                max_tokens=180,
+                model=LLM_MODEL,
+                messages=self.build_messages(emotion, user_message, recent_context, emotion_summary, conversation_summary),
+                max_tokens=LLM_MAX_TOKENS,
                 temperature=0.7,
             )
             response_text = response.choices[0].message.content.strip()
-            return response_text
         except Exception as e:
-            print(f"Error during API call: {e}")
-            return self.generate_template_response(emotion)
+            self._record(False, started)
+            raise LLMError(f"LLM call failed: {e}") from e
+        self._record(True, started)
+        self._cache_response(emotion, embedding, response_text)
+        return response_text
+
+    async def allm_reply(self, emotion: str, user_message: str, recent_context=None, emotion_summary=None,
+                         embedding=None, conversation_summary=None) -> str:
+        """
+        Async variant of `llm_reply` that calls the LLM through `llm_client`.
+
+        Raises:
+            CircuitOpen: If the circuit breaker is refusing calls.
+            LLMError: If the client is missing or the call failed.
+        """
+        if not self.llm_client:
+            raise LLMError("LLM client not available")
+        self._admit()
+        started = time.monotonic()
+        try:
+            response_text = await self.llm_client.chat(
+                self.build_messages(emotion, user_message, recent_context, emotion_summary, conversation_summary),
+                max_tokens=LLM_MAX_TOKENS,
+                temperature=0.7,
+            )
+        except LLMError:
+            self._record(False, started)
+            raise
+        self._record(True, started)
+        self._cache_response(emotion, embedding, response_text)
+        return response_text
+
+    def timeout_response(self, emotion: str) -> str:
+        """A template reply for a caller that stopped waiting for the LLM at the deadline."""
+        if self.breaker is not None:
+            self.breaker.record_failure()
+        return self._fallback(emotion, "timeout")
+
+    def fallback_response(self, emotion: str, reason: str) -> str:
+        """A template reply served in place of the LLM, counted under `reason`."""
+        return self._fallback(emotion, reason)
+
+    def _admit(self):
+        if self.breaker is not None and not self.breaker.allow():
+            raise CircuitOpen("LLM circuit breaker is open")
+
+    def _record(self, success: bool, started: float | None = None):
+        """Reports a call's outcome to the breaker, unless it outlasted the deadline."""
+        if self.breaker is None:
+            return
+        if started is not None and self.deadline and time.monotonic() - started > self.deadline:
+            return
+        if success:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def _abandoned(self, chunks: list):
+        """
+        Reports a stream its consumer stopped reading (e.g. the client
+        disconnected). Tokens were arriving, so the provider was healthy;
+        without any, there is nothing to report, but a half-open probe must
+        still be handed back.
+        """
+        if chunks:
+            self._record(True)
+        elif self.breaker is not None:
+            self.breaker.release()
+
+    def _fallback(self, emotion: str, reason: str) -> str:
+        self.fallbacks[reason] = self.fallbacks.get(reason, 0) + 1
+        return self.generate_template_response(emotion)
+
+    def stats(self) -> dict:
+        stats = {"fallbacks": dict(self.fallbacks)}
+        if self.breaker is not None:
+            stats["breaker"] = self.breaker.stats()
+        return stats
 
     def generate_template_response(self, emotion: str) -> str:
         """
@@ -142,24 +317,135 @@ class ResponseGenerator:
         response_list = self.responses.get(emotion, self.responses["default"])
         return random.choice(response_list)
 
-    def generate_response(self, emotion: str, user_message: str, recent_context=None, emotion_summary=None) -> str:
+    def generate_response(self, emotion: str, user_message: str, recent_context=None, emotion_summary=None,
+                          embedding=None, conversation_summary=None) -> str:
         """
         Generates an empathetic response, trying the LLM first and falling back to templates.
 
         Args:
             emotion: The emotion string (e.g., "sadness").
             user_message: The user's original message.
+            embedding: The message's embedding from `lookup_cached_response`, if any.
 
         Returns:
             An empathetic response string.
         """
         if self.api_client:
-            return self.generate_llm_response(emotion, user_message, recent_context, emotion_summary)
+            return self.generate_llm_response(
+                emotion, user_message, recent_context, emotion_summary, embedding, conversation_summary
+            )
+        else:
+            return self._fallback(emotion, "no_client")
+
+    def stream_response(self, emotion: str, user_message: str, recent_context=None, emotion_summary=None,
+                        embedding=None, conversation_summary=None):
+        """
+        Generates an empathetic response like `generate_response`, but yields it in
+        pieces as the LLM produces tokens.
+
+        If the API client is unavailable or the call fails before any token has
+        arrived, a single template response is yielded instead.
+
+        Yields:
+            Chunks of the response text.
+        """
+        if not self.api_client:
+            yield self._fallback(emotion, "no_client")
+            return
+        try:
+            self._admit()
+        except CircuitOpen:
+            yield self._fallback(emotion, "circuit_open")
+            return
+
+        chunks = []
+        try:
+            stream = self.api_client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=self.build_messages(emotion, user_message, recent_context, emotion_summary, conversation_summary),
+                max_tokens=LLM_MAX_TOKENS,
+                temperature=0.7,
+                stream=True,
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    chunks.append(content)
+                    yield content
+        except GeneratorExit:
+            self._abandoned(chunks)
+            raise
+        except Exception as e:
+            print(f"Error during streaming API call: {e}")
+            self._record(False)
+            if not chunks:
+                yield self._fallback(emotion, "error")
+        else:
+            self._record(True)
+            self._cache_response(emotion, embedding, "".join(chunks).strip())
+
+    async def agenerate_response(self, emotion: str, user_message: str, recent_context=None, emotion_summary=None,
+                                 embedding=None, conversation_summary=None) -> str:
+        """
+        Async variant of `generate_response` that calls the LLM through `llm_client`
+        without tying up a thread, falling back to templates if the call fails.
+        """
+        if not self.llm_client:
+            return self._fallback(emotion, "no_client")
+        try:
+            return await self.allm_reply(emotion, user_message, recent_context, emotion_summary, embedding,
+                                         conversation_summary)
+        except CircuitOpen:
+            return self._fallback(emotion, "circuit_open")
+        except LLMError as e:
+            print(f"Error during API call: {e}")
+            return self._fallback(emotion, "error")
+
+    async def astream_response(self, emotion: str, user_message: str, recent_context=None, emotion_summary=None,
+                               embedding=None, conversation_summary=None):
+        """
+        Async variant of `stream_response` that streams through `llm_client`.
+
+        Yields:
+            Chunks of the response text.
+        """
+        if not self.llm_client:
+            yield self._fallback(emotion, "no_client")
+            return
+        try:
+            self._admit()
+        except CircuitOpen:
+            yield self._fallback(emotion, "circuit_open")
+            return
+
+        chunks = []
+        try:
+            async for content in self.llm_client.stream_chat(
+                self.build_messages(emotion, user_message, recent_context, emotion_summary, conversation_summary),
+                max_tokens=LLM_MAX_TOKENS,
+                temperature=0.7,
+            ):
+                chunks.append(content)
+                yield content
+        except (GeneratorExit, asyncio.CancelledError):
+            self._abandoned(chunks)
+            raise
+        except LLMError as e:
+            print(f"Error during streaming API call: {e}")
+            self._record(False)
+            if not chunks:
+                yield self._fallback(emotion, "error")
         else:
-            return self.generate_template_response(emotion)
+            self._record(True)
+            self._cache_response(emotion, embedding, "".join(chunks).strip())
 
 
 if __name__ == '__main__':
+    from dotenv import load_dotenv
+
+    load_dotenv()
     # Example usage
     generator = ResponseGenerator()
     
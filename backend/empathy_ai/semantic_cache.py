@@ -0,0 +1,134 @@
+import threading
+
+import numpy as np
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+class _Partition:
+    """The cached replies for one emotion: a row-normalized embedding matrix plus bookkeeping."""
+
+    def __init__(self, capacity: int, dim: int):
+        self.embeddings = np.zeros((capacity, dim), dtype=np.float32)
+        self.replies = [None] * capacity
+        self.last_used = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+        self.hits = 0
+
+
+class SemanticResponseCache:
+    def __init__(self, encoder=None, model_name: str = EMBEDDING_MODEL, threshold: float = 0.92,
+                 max_entries_per_emotion: int = 1024, max_context_turns: int = 1,
+                 local_files_only: bool = False):
+        """
+        Reuses LLM replies for messages that mean nearly the same thing as one
+        already answered, e.g. "hey, how are you?" and "hi how r u".
+
+        Replies are partitioned by detected emotion, so a reply is only reused
+        for a message with the same emotion. Within a partition, embeddings
+        are kept in one matrix and a lookup is a single matrix-vector product.
+        Only turns early in a conversation are eligible, since a reply that
+        depends on earlier turns (or on a summary of them) can't be reused
+        elsewhere.
+
+        Args:
+            encoder: A sentence-transformers model. Loaded from `model_name` if omitted.
+            model_name: The embedding model to load, or a local directory holding it.
+            threshold: The cosine similarity a cached message needs to be reused.
+            max_entries_per_emotion: Replies kept per emotion; the least recently
+                used one is replaced when a partition is full.
+            max_context_turns: The most turns (including the new message) a
+                conversation may have for its latest turn to be eligible.
+            local_files_only: Never contact the Hugging Face Hub when loading.
+        """
+        if encoder is None:
+            from sentence_transformers import SentenceTransformer
+            encoder = SentenceTransformer(model_name, device="cpu", local_files_only=local_files_only)
+        self.encoder = encoder
+        self.threshold = threshold
+        self.max_entries_per_emotion = max_entries_per_emotion
+        self.max_context_turns = max_context_turns
+        self.dim = encoder.get_sentence_embedding_dimension()
+
+        self.lookups = 0
+        self.hits = 0
+        self.stores = 0
+        self.evictions = 0
+        self.ineligible = 0
+
+        self._partitions = {}
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    def eligible(self, conversation_turns: int) -> bool:
+        """
+        Whether the latest turn of a conversation that is `conversation_turns`
+        long (counting the new message) may be answered from, or stored in,
+        the cache. Pass the full length, not just the turns that fit in the
+        prompt: the rest still shapes the reply through the rolling summary.
+        """
+        if conversation_turns <= self.max_context_turns:
+            return True
+        with self._lock:
+            self.ineligible += 1
+        return False
+
+    def embed(self, text: str) -> np.ndarray:
+        """Returns the unit-length embedding of `text`."""
+        return self.encoder.encode(
+            text.strip().lower(), normalize_embeddings=True, convert_to_numpy=True
+        ).astype(np.float32)
+
+    def lookup(self, emotion: str, embedding: np.ndarray) -> str | None:
+        """Returns the reply to the most similar cached message, if it is similar enough."""
+        with self._lock:
+            self.lookups += 1
+            partition = self._partitions.get(emotion)
+            if partition is None or partition.size == 0:
+                return None
+            # Rows are unit length, so the dot product is the cosine similarity.
+            similarities = partition.embeddings[:partition.size] @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            self._clock += 1
+            partition.last_used[best] = self._clock
+            partition.hits += 1
+            self.hits += 1
+            return partition.replies[best]
+
+    def store(self, emotion: str, embedding: np.ndarray, reply: str):
+        with self._lock:
+            partition = self._partitions.get(emotion)
+            if partition is None:
+                partition = self._partitions[emotion] = _Partition(self.max_entries_per_emotion, self.dim)
+            if partition.size < self.max_entries_per_emotion:
+                row = partition.size
+                partition.size += 1
+            else:
+                row = int(np.argmin(partition.last_used))
+                self.evictions += 1
+            self._clock += 1
+            partition.embeddings[row] = embedding
+            partition.replies[row] = reply
+            partition.last_used[row] = self._clock
+            self.stores += 1
+
+    def clear(self):
+        with self._lock:
+            self._partitions.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "ineligible": self.ineligible,
+                "emotions": {
+                    emotion: {"entries": partition.size, "hits": partition.hits}
+                    for emotion, partition in self._partitions.items()
+                },
+            }
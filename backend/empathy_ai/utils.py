@@ -1,41 +1,242 @@
 import datetime
+import glob
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LOG_FILE = "logs/conversations.jsonl"
+
+
+class StageTimer:
+    """Times the stages of a turn, e.g. emotion detection then generation."""
+
+    def __init__(self):
+        self.start = self._last = time.perf_counter()
+        self.stages = {}
+
+    def mark(self, stage: str):
+        """Records the time since the previous mark (or the start) as `stage`."""
+        now = time.perf_counter()
+        self.stages[stage] = round((now - self._last) * 1000, 2)
+        self._last = now
+
+    def result(self) -> dict:
+        """The stage latencies in milliseconds, plus the `total` so far."""
+        return {**self.stages, "total": round((time.perf_counter() - self.start) * 1000, 2)}
+
+
+class ConversationLogger:
+    def __init__(self, path: str = LOG_FILE, max_queue: int = 10000, batch_size: int = 256,
+                 flush_interval: float = 1.0, max_bytes: int = 50 * 1024 * 1024,
+                 rotate_interval: float | None = None, backup_count: int = 10,
+                 compress: bool = False):
+        """
+        Logs conversation turns as JSON lines, written by a background thread.
+
+        `log` only puts the record on a bounded queue and never blocks: when
+        the queue is full the record is dropped and counted. The writer thread
+        serializes queued records and appends them in batches. The file is
+        rotated when it would grow past `max_bytes` or is older than
+        `rotate_interval`; rotated files get a timestamp suffix, are optionally
+        gzipped, and only the newest `backup_count` are kept.
+
+        Args:
+            path: The log file. Its directory is created if needed.
+            max_queue: The most records waiting to be written.
+            batch_size: The most records written at once.
+            flush_interval: The longest a record waits, in seconds, before being written.
+            max_bytes: The size at which the file is rotated. 0 disables size rotation.
+            rotate_interval: The age, in seconds, at which the file is rotated.
+            backup_count: Rotated files kept.
+            compress: Whether to gzip rotated files.
+        """
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        self.compress = compress
+
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.rotations = 0
+        self.write_errors = 0
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stopping = threading.Event()
+        self._thread = None
+        self._file = None
+        self._size = 0
+        self._opened_at = 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="conversation-logger", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Writes out whatever is queued, then stops the writer thread."""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def log(self, record: dict) -> bool:
+        """Queues a record for writing. Returns False if it was dropped."""
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def log_turn(self, user: str | None, conversation_id: str | None, emotion_data: dict,
+                 latencies: dict | None = None, user_message: str | None = None,
+                 ai_response: str | None = None, **extra) -> bool:
+        """
+        Logs one conversation turn.
+
+        Args:
+            user: The user's name, if known.
+            conversation_id: The conversation the turn belongs to, if any.
+            emotion_data: The detector's output: `emotion`, `confidence` and `scores`.
+            latencies: Per-stage latencies in milliseconds, e.g. `StageTimer.result()`.
+            user_message: The message text, if it should be logged.
+            ai_response: The reply text, if it should be logged.
+            **extra: Any further fields for the record.
+        """
+        record = {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "user": user,
+            "conversation_id": conversation_id,
+            "emotion": emotion_data.get("emotion"),
+            "confidence": emotion_data.get("confidence"),
+            "scores": emotion_data.get("scores"),
+            "latency_ms": latencies or {},
+        }
+        if user_message is not None:
+            record["user_message"] = user_message
+        if ai_response is not None:
+            record["ai_response"] = ai_response
+        record.update(extra)
+        return self.log(record)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "rotations": self.rotations,
+            "write_errors": self.write_errors,
+        }
+
+    # --- Writer thread ---
+    def _run(self):
+        buffer = []
+        last_flush = time.monotonic()
+        while True:
+            try:
+                buffer.append(self._queue.get(timeout=0.1))
+                while len(buffer) < self.batch_size:
+                    buffer.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            stopping = self._stopping.is_set()
+            now = time.monotonic()
+            if buffer and (len(buffer) >= self.batch_size or now - last_flush >= self.flush_interval
+                           or stopping):
+                self._write(buffer)
+                buffer = []
+                last_flush = now
+            if stopping and not buffer and self._queue.empty():
+                break
+        self._close()
+
+    def _write(self, records: list):
+        data = "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records)
+        try:
+            self._maybe_rotate(len(data.encode("utf-8")))
+            if self._file is None:
+                self._open()
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data.encode("utf-8"))
+            self.written += len(records)
+            self.batches += 1
+        except OSError as e:
+            self.write_errors += 1
+            logger.warning("Could not write to conversation log %s: %s", self.path, e)
+            self._close()
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+        self._opened_at = time.time()
+
+    def _close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    def _maybe_rotate(self, incoming: int):
+        if self._file is None:
+            if not os.path.exists(self.path):
+                return
+            self._open()
+        too_big = self.max_bytes and self._size and self._size + incoming > self.max_bytes
+        too_old = self.rotate_interval and time.time() - self._opened_at >= self.rotate_interval
+        if not (too_big or too_old) or not self._size:
+            return
+
+        self._close()
+        suffix = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        rotated = f"{self.path}.{suffix}"
+        counter = 1
+        while os.path.exists(rotated) or os.path.exists(rotated + ".gz"):
+            rotated = f"{self.path}.{suffix}-{counter}"
+            counter += 1
+        os.replace(self.path, rotated)
+        if self.compress:
+            with open(rotated, "rb") as source, gzip.open(rotated + ".gz", "wb") as target:
+                shutil.copyfileobj(source, target)
+            os.remove(rotated)
+        self.rotations += 1
+
+        backups = sorted(glob.glob(glob.escape(self.path) + ".*"), key=os.path.getmtime)
+        for old in backups[:max(0, len(backups) - self.backup_count)]:
+            os.remove(old)
 
-LOG_FILE = "logs/conversation.log"
-
-def log_conversation(user_message: str, emotion_data: dict, ai_response: str):
-    """
-    Logs the conversation turn to a file.
-
-    Args:
-        user_message: The user's input message.
-        emotion_data: The dictionary containing the detected emotion and confidence.
-        ai_response: The AI's generated response.
-    """
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = (
-        f"[{timestamp}]\n"
-        f"User: {user_message}\n"
-        f"Emotion: {emotion_data['emotion']} (Confidence: {emotion_data['confidence']})\n"
-        f"AI: {ai_response}\n"
-        f"{'-'*40}\n"
-    )
-    
-    try:
-        with open(LOG_FILE, "a") as f:
-            f.write(log_entry)
-    except IOError as e:
-        print(f"Error: Could not write to log file {LOG_FILE}. {e}")
 
 if __name__ == '__main__':
     # Example usage
-    log_conversation(
-        "I feel amazing today!",
-        {"emotion": "joy", "confidence": 0.99},
-        "That's wonderful to hear!"
+    conversation_logger = ConversationLogger()
+    conversation_logger.start()
+    conversation_logger.log_turn(
+        None, None, {"emotion": "joy", "confidence": 0.99},
+        user_message="I feel amazing today!", ai_response="That's wonderful to hear!",
     )
-    log_conversation(
-        "I'm not sure how to feel.",
-        {"emotion": "neutral", "confidence": 0.85},
-        "Thanks for sharing. I'm here to listen."
+    conversation_logger.log_turn(
+        None, None, {"emotion": "neutral", "confidence": 0.85},
+        user_message="I'm not sure how to feel.", ai_response="Thanks for sharing. I'm here to listen.",
     )
+    conversation_logger.stop()
     print(f"Check the '{LOG_FILE}' file for example logs.")
@@ -0,0 +1,149 @@
+import asyncio
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class Overloaded(Exception):
+    """Raised when work is rejected because an executor's wait queue is full."""
+
+    def __init__(self, name: str, retry_after: int, status_code: int = 503):
+        super().__init__(f"{name} is at capacity")
+        self.name = name
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class BoundedExecutor:
+    def __init__(self, name: str, max_workers: int, max_queue: int, retry_after: int = 1,
+                 processes: bool = False):
+        """
+        A thread pool that admits at most `max_workers` running plus `max_queue`
+        waiting jobs, and rejects anything beyond that immediately.
+
+        Args:
+            name: Used for thread names and error messages.
+            max_workers: The number of jobs allowed to run at once.
+            max_queue: The number of jobs allowed to wait for a free worker.
+            retry_after: The Retry-After hint, in seconds, attached to rejections.
+            processes: Run jobs in worker processes instead of threads, for
+                CPU-bound work that would otherwise hold the GIL. Jobs must then
+                be picklable, and `iterate` is not supported.
+        """
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.retry_after = retry_after
+        self.processes = processes
+        if processes:
+            self.pool = self._process_pool()
+        else:
+            self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+
+        self.rejected = 0
+        self.completed = 0
+        self._admitted = 0
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def check_capacity(self):
+        """Raises `Overloaded` if a job submitted right now would be rejected."""
+        with self._lock:
+            if self._admitted >= self.capacity:
+                self.rejected += 1
+                raise Overloaded(self.name, self.retry_after)
+
+    def acquire(self):
+        """Reserves a slot, raising `Overloaded` if the executor is full."""
+        with self._lock:
+            if self._admitted >= self.capacity:
+                self.rejected += 1
+                raise Overloaded(self.name, self.retry_after)
+            self._admitted += 1
+
+    def release(self):
+        with self._lock:
+            self._admitted -= 1
+            self.completed += 1
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Runs a blocking callable on the pool without blocking the event loop.
+
+        The slot is held until the callable actually finishes, even if the
+        awaiting request is cancelled, so abandoned work still counts against
+        the limit while it occupies a thread.
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """
+        Starts a blocking callable on the pool, raising `Overloaded` if it is
+        full. Unlike an awaiting wrapper, the returned future only finishes
+        when the callable does, so callers can tell when a thread is free again.
+        """
+        self.acquire()
+        try:
+            future = self.pool.submit(functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            self.release()
+            raise
+        future.add_done_callback(lambda _: self.release())
+        return future
+
+    async def iterate(self, iterator):
+        """
+        Consumes a blocking iterator on the pool, yielding items as they arrive.
+
+        One slot is held for the whole iteration, so a long-lived stream counts
+        against the limits the same way a single call does. If the consumer
+        stops while a thread is still blocked in `next()`, the slot is held
+        until that call returns.
+        """
+        self.acquire()
+        sentinel = object()
+        future = None
+        try:
+            while True:
+                future = self.pool.submit(next, iterator, sentinel)
+                item = await asyncio.wrap_future(future)
+                if item is sentinel:
+                    break
+                yield item
+        finally:
+            if future is not None and not future.done():
+                future.add_done_callback(lambda _: self.release())
+            else:
+                self.release()
+
+    def after_fork(self):
+        """
+        Replaces a process pool inherited through fork(): its queues are shared
+        with the parent's copy, so results could go to the wrong process.
+        """
+        if self.processes:
+            self.pool = self._process_pool()
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        # Workers are spawned rather than forked: the server process has
+        # model-loading threads running, which a fork would copy mid-flight.
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_use = self._admitted
+        return {
+            "in_use": in_use,
+            "running": min(in_use, self.max_workers),
+            "queued": max(0, in_use - self.max_workers),
+            "capacity": self.capacity,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,357 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from storage import Storage
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = "journal-"
+SEGMENT_SUFFIX = ".jsonl"
+
+
+class WriteBehindStorage(Storage):
+    def __init__(self, storage: Storage, directory: str, apply_interval: float = 1.0,
+                 retry_backoff: float = 1.0, max_retry_backoff: float = 60.0):
+        """
+        Wraps a storage backend so new turns are acknowledged once they are
+        fsynced to an append-only JSONL journal, and applied to the backend later.
+
+        Concurrent writers share fsyncs: while one batch is being synced the next
+        one accumulates, then goes to disk with a single write and fsync. A
+        background task moves journal entries into the backend every
+        `apply_interval` seconds, on a thread of its own so a slow backend never
+        delays an fsync, and deletes journal segments once everything in them
+        has been applied. Reads apply any pending entries they depend on first,
+        so callers always see their own writes.
+
+        An entry the backend rejects (say, "database is locked") stays in the
+        journal and is retried after `retry_backoff` seconds, doubling up to
+        `max_retry_backoff`; later entries for the same conversation wait
+        behind it. Entries still failing at shutdown are replayed on the next
+        start.
+
+        Args:
+            storage: The backend the journal is applied to.
+            directory: Where journal segments live. Created if missing.
+            apply_interval: Seconds between background apply passes.
+            retry_backoff: Seconds before the first retry of a failed entry.
+            max_retry_backoff: The longest wait between retries.
+        """
+        self.storage = storage
+        self.directory = directory
+        self.apply_interval = apply_interval
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+
+        self.commits = 0
+        self.fsyncs = 0
+        self.applied = 0
+        self.apply_failures = 0
+
+        # seq -> (segment number, record), in journal order.
+        self._pending = {}
+        self._segment_counts = {}
+        # seq -> (consecutive failures, monotonic time of the next attempt)
+        self._retries = {}
+        self._lock = threading.Lock()
+        # Held while entries are applied, so a read and the background pass
+        # never apply the same entry twice.
+        self._apply_lock = threading.Lock()
+        self._seq = 0
+
+        self._segment = None
+        self._file = None
+        self._queue = []
+        self._closing = False
+        self._wakeup = None
+        self._writer = None
+        self._applier = None
+        # File writes and fsyncs must stay in order, so they get a single
+        # thread; background applies get another.
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal")
+        self._applier_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal-apply")
+
+        os.makedirs(directory, exist_ok=True)
+        self._replay()
+        self._open_segment(self._segments()[-1] + 1 if self._segments() else 1)
+
+    # --- Storage interface ---
+    def get_user(self, username):
+        return self.storage.get_user(username)
+
+    def create_user(self, user):
+        self.storage.create_user(user)
+
+    def update_user(self, username, fields):
+        self.storage.update_user(username, fields)
+
+    def create_conversation(self, conversation):
+        self.storage.create_conversation(conversation)
+
+    def update_conversation(self, conversation_id, fields):
+        self._apply_pending(lambda record: record['conversation_id'] == conversation_id)
+        self.storage.update_conversation(conversation_id, fields)
+
+    def append_messages(self, conversation_id, start, messages):
+        self._apply_pending(lambda record: record['conversation_id'] == conversation_id)
+        self.storage.append_messages(conversation_id, start, messages)
+
+    def get_conversation(self, conversation_id, after=None, tail=None):
+        self._apply_pending(lambda record: record['conversation_id'] == conversation_id)
+        return self.storage.get_conversation(conversation_id, after=after, tail=tail)
+
+    def get_conversation_summary(self, conversation_id):
+        self._apply_pending(lambda record: record['conversation_id'] == conversation_id)
+        return self.storage.get_conversation_summary(conversation_id)
+
+    def get_history_version(self, username):
+        self._apply_pending(lambda record: record['username'] == username)
+        return self.storage.get_history_version(username)
+
+    def list_conversations(self, username, limit=None, before=None, since_version=None):
+        self._apply_pending(lambda record: record['username'] == username)
+        return self.storage.list_conversations(
+            username, limit=limit, before=before, since_version=since_version
+        )
+
+    async def append_turns(self, conversation_id, username, start, messages, conversation=None,
+                           updates=None):
+        """Journals the turns and returns once they are durable on disk."""
+        record = {
+            'conversation_id': conversation_id,
+            'username': username,
+            'start': start,
+            'messages': messages,
+            'conversation': conversation,
+            'updates': updates,
+        }
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((record, future))
+        self._wakeup.set()
+        await future
+
+    def close(self):
+        self._io.shutdown(wait=True)
+        self._applier_pool.shutdown(wait=True)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.storage.close()
+
+    # --- Lifecycle ---
+    def start(self):
+        """Starts the group-commit writer and the background applier."""
+        if self._writer is None:
+            self._closing = False
+            self._wakeup = asyncio.Event()
+            self._writer = asyncio.create_task(self._write_loop())
+            self._applier = asyncio.create_task(self._apply_loop())
+
+    async def stop(self):
+        """Flushes queued writes, applies everything and compacts the journal."""
+        if self._writer is None:
+            return
+        self._applier.cancel()
+        try:
+            await self._applier
+        except asyncio.CancelledError:
+            pass
+        # The writer exits on its own once everything queued is on disk.
+        self._closing = True
+        self._wakeup.set()
+        await self._writer
+        self._writer = self._applier = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._applier_pool, self._apply_pending, None, True)
+        await loop.run_in_executor(self._io, self._compact)
+        with self._lock:
+            left = len(self._pending)
+        if left:
+            logger.warning("%d journal entries could not be applied; they will be replayed on the next start",
+                           left)
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = len(self._pending)
+            retrying = len(self._retries)
+        return {
+            "commits": self.commits,
+            "fsyncs": self.fsyncs,
+            "records_per_fsync": self.commits / self.fsyncs if self.fsyncs else 0.0,
+            "applied": self.applied,
+            "apply_failures": self.apply_failures,
+            "pending": pending,
+            "retrying": retrying,
+            "segments": len(self._segment_counts) + 1,
+        }
+
+    # --- Internals ---
+    def _segments(self) -> list:
+        numbers = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                numbers.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+        return sorted(numbers)
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{number:08d}{SEGMENT_SUFFIX}")
+
+    def _open_segment(self, number: int):
+        if self._file is not None:
+            self._file.close()
+        self._segment = number
+        self._file = open(self._segment_path(number), "a", encoding="utf-8")
+
+    def _replay(self):
+        """
+        Loads the journal entries left over from a previous run and applies
+        them. Segments are removed once all their entries are in the backend.
+        """
+        loaded = 0
+        for number in self._segments():
+            self._segment_counts.setdefault(number, 0)
+            with open(self._segment_path(number), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash mid-write was never
+                        # acknowledged, so it is safe to drop.
+                        break
+                    with self._lock:
+                        self._register(number, record)
+                    loaded += 1
+        if loaded:
+            self._apply_pending(force=True)
+            logger.info("Replayed %d journal entries from %s (%d left to retry)",
+                        loaded, self.directory, len(self._pending))
+        self._compact()
+
+    def _register(self, segment: int, record: dict):
+        """Records a journal entry as pending; call with `_lock` held."""
+        self._seq += 1
+        self._pending[self._seq] = (segment, record)
+        self._segment_counts[segment] = self._segment_counts.get(segment, 0) + 1
+
+    def _apply(self, record: dict):
+        if record.get('conversation'):
+            self.storage.create_conversation(record['conversation'])
+        self.storage.append_messages(record['conversation_id'], record['start'], record['messages'])
+        if record.get('updates'):
+            self.storage.update_conversation(record['conversation_id'], record['updates'])
+
+    def _apply_pending(self, matches=None, force: bool = False):
+        """
+        Applies pending entries (optionally only those `matches` accepts) in
+        journal order. Entries waiting out a retry backoff are skipped unless
+        `force` is set; either way, a conversation whose entry fails or is
+        skipped gets no later entries applied in this pass.
+        """
+        with self._apply_lock:
+            with self._lock:
+                entries = [
+                    (seq, record, self._retries.get(seq))
+                    for seq, (_, record) in self._pending.items()
+                    if matches is None or matches(record)
+                ]
+            now = time.monotonic()
+            blocked = set()
+            for seq, record, retry in entries:
+                conversation_id = record['conversation_id']
+                if conversation_id in blocked:
+                    continue
+                if retry is not None and not force and retry[1] > now:
+                    blocked.add(conversation_id)
+                    continue
+                try:
+                    self._apply(record)
+                except Exception:
+                    failures = retry[0] + 1 if retry else 1
+                    delay = min(self.max_retry_backoff, self.retry_backoff * 2 ** (failures - 1))
+                    logger.exception("Failed to apply journal entry for conversation %s (attempt %d); "
+                                     "retrying in %.1fs", conversation_id, failures, delay)
+                    blocked.add(conversation_id)
+                    with self._lock:
+                        self._retries[seq] = (failures, time.monotonic() + delay)
+                        self.apply_failures += 1
+                    continue
+                with self._lock:
+                    segment, _ = self._pending.pop(seq)
+                    self._retries.pop(seq, None)
+                    self._segment_counts[segment] -= 1
+                    self.applied += 1
+
+    def _compact(self):
+        """
+        Rotates to a new segment if the current one has entries, and deletes
+        the segments whose entries have all been applied. Runs on the writer
+        thread once the journal is open, as it may switch the active segment.
+        """
+        with self._lock:
+            if self._file is not None and self._file.tell() > 0:
+                self._segment_counts.setdefault(self._segment, 0)
+                self._open_segment(self._segment + 1)
+            done = [
+                segment for segment, count in self._segment_counts.items()
+                if count == 0 and segment != self._segment
+            ]
+            for segment in done:
+                del self._segment_counts[segment]
+        for segment in done:
+            os.remove(self._segment_path(segment))
+
+    def _write_batch(self, records: list):
+        self._file.write("".join(json.dumps(record) + "\n" for record in records))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        # Register the entries before the next job on this thread (possibly a
+        # rotation) can look at the segment counts.
+        with self._lock:
+            for record in records:
+                self._register(self._segment, record)
+
+    async def _write_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            batch, self._queue = self._queue, []
+            if not batch:
+                if self._closing:
+                    return
+                continue
+            records = [record for record, _ in batch]
+            try:
+                # The write is shielded so that a cancelled request can't leave
+                # a half-acknowledged batch behind.
+                await asyncio.shield(loop.run_in_executor(self._io, self._write_batch, records))
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                if self._closing:
+                    self._wakeup.set()
+
+            self.fsyncs += 1
+            self.commits += len(batch)
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+
+    async def _apply_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.apply_interval)
+            try:
+                await loop.run_in_executor(self._applier_pool, self._apply_pending)
+                await loop.run_in_executor(self._io, self._compact)
+            except Exception:
+                logger.exception("Journal apply pass failed")
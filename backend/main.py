@@ -1,31 +1,281 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from pydantic import BaseModel, Field
-from tinydb import TinyDB, Query, where
 from typing import List
 from datetime import datetime, timedelta
+from contextlib import asynccontextmanager, nullcontext
+import anyio
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
 import uuid
 
+from dotenv import load_dotenv
+
 # --- Local AI Modules ---
-from empathy_ai.emotion_detector import EmotionDetector
-from empathy_ai.response_generator import ResponseGenerator
+from empathy_ai.emotion_detector import EmotionCache, EmotionDetector
+from empathy_ai.response_generator import LLM_MODEL, ResponseGenerator
+from empathy_ai.errors import LLMError
+from empathy_ai.circuit_breaker import STATES as BREAKER_STATES, CircuitBreaker, CircuitOpen
+from empathy_ai.context import ContextBuilder, TokenCounter
+from empathy_ai.emotion_stats import (
+    describe_emotion_stats, describe_emotional_arc, dominant_mood, update_emotion_stats,
+)
+from empathy_ai.batching import EmotionBatcher
+from empathy_ai.utils import ConversationLogger, StageTimer
+from execution import BoundedExecutor, Overloaded
+from storage import open_storage
+from journal import WriteBehindStorage
+from startup import StartupSequence
+from scheduler import FairScheduler
+from metrics import MetricsMiddleware, MetricsRegistry
+from auth_cache import ExpiringCache
+import migrate_tinydb
+import passwords
+
+# Settings may also come from a .env file in the working directory.
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
 
 # --- Configuration ---
 SECRET_KEY = "a-very-secret-key"  # In production, use a secure, environment-variable-managed key
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Authenticated requests skip JWT verification and the user lookup when the
+# same token was seen recently: verified tokens are cached until they expire
+# and user records for AUTH_USER_CACHE_TTL_SECONDS (they are also dropped on
+# signup and profile changes). A size of 0 disables either cache.
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+AUTH_USER_CACHE_TTL_SECONDS = float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "300"))
+
+# bcrypt runs in PASSWORD_WORKERS worker processes, off the event loop, with at
+# most PASSWORD_QUEUE_MAX hashes waiting (beyond that, login and signup get
+# 503). PASSWORD_HASH_ROUNDS is the bcrypt cost for new hashes; passwords stored
+# at another cost are rehashed transparently on the user's next login.
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", str(passwords.DEFAULT_ROUNDS)))
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2"))
+PASSWORD_QUEUE_MAX = int(os.getenv("PASSWORD_QUEUE_MAX", "64"))
+
+# Micro-batching for emotion detection: trade a few milliseconds of latency
+# for far fewer forward passes under concurrent load.
+EMOTION_BATCH_MAX_SIZE = int(os.getenv("EMOTION_BATCH_MAX_SIZE", "16"))
+EMOTION_BATCH_MAX_WAIT_MS = float(os.getenv("EMOTION_BATCH_MAX_WAIT_MS", "5"))
+EMOTION_QUEUE_MAX = int(os.getenv("EMOTION_QUEUE_MAX", "256"))
+
+# CPU inference backend for the emotion model: "pytorch" (fp32), "int8"
+# (dynamic quantization) or "onnx" (ONNX Runtime). Quantized/exported models
+# are built once and kept in EMOTION_ARTIFACT_DIR (int8 weights per model
+# revision and torch version, rebuilt when either changes); check label parity with
+# `python -m empathy_ai.parity --backend <name>` before switching. "lexicon"
+# replaces the model with a keyword lexicon: less accurate, but it loads
+# instantly and needs no torch. Together with LLM_CLIENT="none" (or "async")
+# and LLM_TOKENIZER="" it gives a deployment that never imports torch or
+# transformers.
+EMOTION_BACKEND = os.getenv("EMOTION_BACKEND", "pytorch")
+EMOTION_ARTIFACT_DIR = os.getenv("EMOTION_ARTIFACT_DIR", "model_cache")
+
+# Models load in the background after the server binds; /readyz reports when
+# they are warm, and chat requests arriving before then wait up to
+# READY_WAIT_SECONDS before being turned away with 503. With EMPATHY_OFFLINE=1
+# the Hub is never contacted and the model must already be in EMOTION_MODEL_DIR
+# (populate it with `python -m empathy_ai.download <dir> --revision <sha>`).
+EMPATHY_OFFLINE = os.getenv("EMPATHY_OFFLINE", "0") == "1"
+EMOTION_MODEL_DIR = os.getenv("EMOTION_MODEL_DIR", "")
+READY_WAIT_SECONDS = float(os.getenv("READY_WAIT_SECONDS", "5"))
+
+# Short, repetitive messages ("hi", "thanks") skip the model via a result
+# cache keyed on normalized text. EMOTION_CACHE_SIZE=0 disables it.
+EMOTION_CACHE_SIZE = int(os.getenv("EMOTION_CACHE_SIZE", "4096"))
+EMOTION_CACHE_MAX_BYTES = int(os.getenv("EMOTION_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+EMOTION_CACHE_TTL_SECONDS = float(os.getenv("EMOTION_CACHE_TTL_SECONDS", "3600"))
+
+# Long messages are split on sentence boundaries into chunks of up to
+# EMOTION_CHUNK_TOKENS tokens, classified in one batch and averaged by length;
+# the per-chunk emotions tell the generator how the message's mood shifts.
+# At most EMOTION_MAX_CHUNKS chunks are classified, which bounds the latency
+# of a very long message.
+EMOTION_CHUNK_TOKENS = int(os.getenv("EMOTION_CHUNK_TOKENS", "256"))
+EMOTION_MAX_CHUNKS = int(os.getenv("EMOTION_MAX_CHUNKS", "8"))
+
+# Blocking model and LLM work runs on dedicated thread pools so the event loop
+# stays free for /token, /history and friends. Requests beyond the queue
+# limits are turned away with 503 + Retry-After instead of piling up.
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "8"))
+LLM_QUEUE_MAX = int(os.getenv("LLM_QUEUE_MAX", "32"))
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "2"))
+
+# LLM slots are shared between users by a fair-share scheduler: each user may
+# hold LLM_USER_MAX_IN_FLIGHT slots and queue LLM_USER_QUEUE_MAX more requests
+# (beyond that they get 429), and free slots go to users round-robin rather
+# than first come, first served. A user's `llm_weight` (1.0 unless set, e.g.
+# with `UPDATE users SET llm_weight = 2 WHERE username = ...` in SQLite) gives
+# them a proportionally larger share once their cached record expires.
+LLM_USER_MAX_IN_FLIGHT = int(os.getenv("LLM_USER_MAX_IN_FLIGHT", "2"))
+LLM_USER_QUEUE_MAX = int(os.getenv("LLM_USER_QUEUE_MAX", "4"))
+
+# LLM_CLIENT="async" talks to an OpenAI-compatible endpoint over a pooled async
+# HTTP client with timeouts, jittered retries and optional hedging (a second
+# request sent once the first has outlasted the recent p95). "sync" keeps the
+# huggingface_hub InferenceClient on the LLM thread pool, and "none" replies
+# from templates only. For local testing, run bench/stub_llm.py and set
+# LLM_BASE_URL=http://127.0.0.1:8081/v1.
+LLM_CLIENT = os.getenv("LLM_CLIENT", "async")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://router.huggingface.co/v1")
+LLM_API_MODEL = os.getenv("LLM_API_MODEL", f"{LLM_MODEL}:nscale")
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "3"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+
+# Latency SLO for /chat: if the LLM hasn't replied within LLM_DEADLINE_SECONDS
+# (0 = no deadline), a template reply is returned straight away. LLM_LATE_REPLY
+# decides what happens to the LLM's reply: "followup" stores it as an extra AI
+# turn once it arrives, unless the user has written again by then, and
+# "discard" cancels the call. After LLM_BREAKER_FAILURES consecutive errors or
+# timeouts (0 = no breaker) the LLM is skipped for LLM_BREAKER_RESET_SECONDS,
+# after which a probe call decides whether to resume.
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "10"))
+LLM_LATE_REPLY = os.getenv("LLM_LATE_REPLY", "followup")
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# With SEMANTIC_CACHE=1, LLM replies to early-conversation messages are reused
+# for later messages with the same emotion whose embeddings are at least
+# SEMANTIC_CACHE_THRESHOLD cosine-similar. Only messages in conversations of
+# at most SEMANTIC_CACHE_MAX_CONTEXT turns (counting the new message) qualify.
+# Cached replies are keyed on the new message alone, so raising it above 1
+# lets a reply shaped by one conversation's earlier turns be served in
+# another conversation, or to another user.
+# SEMANTIC_CACHE_MODEL defaults to the cache's own EMBEDDING_MODEL.
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_CACHE_MODEL = os.getenv("SEMANTIC_CACHE_MODEL")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1024"))
+SEMANTIC_CACHE_MAX_CONTEXT = int(os.getenv("SEMANTIC_CACHE_MAX_CONTEXT", "1"))
+
+# The LLM sees as many of the most recent turns (out of the last
+# CONTEXT_WINDOW_TURNS) as fit in CONTEXT_TOKEN_BUDGET tokens of the
+# LLM_TOKENIZER tokenizer. Older turns are folded into a rolling summary, stored
+# with the conversation, of at most CONTEXT_SUMMARY_TOKENS tokens.
+CONTEXT_WINDOW_TURNS = int(os.getenv("CONTEXT_WINDOW_TURNS", "40"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1024"))
+CONTEXT_SUMMARY_TOKENS = int(os.getenv("CONTEXT_SUMMARY_TOKENS", "256"))
+LLM_TOKENIZER = os.getenv("LLM_TOKENIZER", LLM_MODEL)
+
+# Each turn is logged as a JSON line (user, conversation, emotion scores and
+# per-stage latencies, but not the message text) to CONVERSATION_LOG by a
+# background writer. The file rotates at CONVERSATION_LOG_MAX_BYTES or after
+# CONVERSATION_LOG_ROTATE_SECONDS, keeping CONVERSATION_LOG_BACKUPS old files,
+# gzipped with CONVERSATION_LOG_COMPRESS=1. Turns arriving while
+# CONVERSATION_LOG_QUEUE_MAX records are waiting are dropped rather than
+# delaying the request. Set CONVERSATION_LOG="" to turn logging off.
+CONVERSATION_LOG = os.getenv("CONVERSATION_LOG", "logs/conversations.jsonl")
+CONVERSATION_LOG_MAX_BYTES = int(os.getenv("CONVERSATION_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+CONVERSATION_LOG_ROTATE_SECONDS = float(os.getenv("CONVERSATION_LOG_ROTATE_SECONDS", "0")) or None
+CONVERSATION_LOG_BACKUPS = int(os.getenv("CONVERSATION_LOG_BACKUPS", "10"))
+CONVERSATION_LOG_COMPRESS = os.getenv("CONVERSATION_LOG_COMPRESS", "0") == "1"
+CONVERSATION_LOG_QUEUE_MAX = int(os.getenv("CONVERSATION_LOG_QUEUE_MAX", "10000"))
+
+# Prometheus-format metrics on /metrics: per-stage chat latencies, request
+# durations, in-flight requests, cache hits, queue depths, LLM fallbacks and
+# database size. METRICS=0 turns instrumentation into no-ops. Per-user LLM
+# scheduler gauges are exported for the METRICS_TOP_USERS users with the most
+# requests queued or in flight, to keep the number of series bounded.
+METRICS = os.getenv("METRICS", "1") == "1"
+METRICS_TOP_USERS = int(os.getenv("METRICS_TOP_USERS", "10"))
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
 # --- Database ---
-db = TinyDB('users_db.json')
-users_table = db.table('users')
-chat_history_table = db.table('chat_history')
-UserQuery = Query()
+# "sqlite" for real deployments; "tinydb" keeps the old single-JSON-file store
+# for development. Existing users_db.json files can be moved over with
+# migrate_tinydb.py.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+DATABASE_PATH = os.getenv(
+    "DATABASE_PATH", "empathy_ai.db" if STORAGE_BACKEND == "sqlite" else "users_db.json"
+)
+# A deployment upgraded from TinyDB still has its accounts and history in
+# TINYDB_LEGACY_PATH. If that file has users and the SQLite database has none,
+# they are migrated at startup; with TINYDB_AUTO_MIGRATE=0 the server refuses
+# to start instead of coming up with every account missing.
+TINYDB_LEGACY_PATH = os.getenv("TINYDB_LEGACY_PATH", "users_db.json")
+TINYDB_AUTO_MIGRATE = os.getenv("TINYDB_AUTO_MIGRATE", "1") == "1"
+# New turns are acknowledged once fsynced to a journal in JOURNAL_DIR and
+# applied to the database in the background. Set JOURNAL_DIR="" to write
+# straight through instead; serve.py always does, since one worker's pending
+# journal entries would be invisible to the others.
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "journal")
+JOURNAL_APPLY_INTERVAL = float(os.getenv("JOURNAL_APPLY_INTERVAL", "1.0"))
+# Database calls run on STORAGE_WORKERS threads, so a lock wait or a TinyDB
+# file rewrite never stalls the event loop; at most STORAGE_QUEUE_MAX calls
+# wait for a thread. TinyDB is not safe to read while another thread writes,
+# so it gets a single thread.
+STORAGE_WORKERS = int(os.getenv("STORAGE_WORKERS", "4" if STORAGE_BACKEND == "sqlite" else "1"))
+STORAGE_QUEUE_MAX = int(os.getenv("STORAGE_QUEUE_MAX", "256"))
+storage = open_storage(STORAGE_BACKEND, DATABASE_PATH)
+legacy_users = (
+    migrate_tinydb.unmigrated_users(TINYDB_LEGACY_PATH, DATABASE_PATH) if STORAGE_BACKEND == "sqlite" else 0
+)
+if legacy_users:
+    if not TINYDB_AUTO_MIGRATE:
+        raise RuntimeError(
+            f"{TINYDB_LEGACY_PATH} has {legacy_users} users but {DATABASE_PATH} has none. Run "
+            f"`python migrate_tinydb.py {TINYDB_LEGACY_PATH} {DATABASE_PATH}` or set STORAGE_BACKEND=tinydb."
+        )
+    migrated = migrate_tinydb.migrate(TINYDB_LEGACY_PATH, DATABASE_PATH)
+    logger.warning("Migrated %s from %s into the empty %s",
+                   migrate_tinydb.describe(migrated), TINYDB_LEGACY_PATH, DATABASE_PATH)
+if JOURNAL_DIR:
+    storage = WriteBehindStorage(storage, JOURNAL_DIR, apply_interval=JOURNAL_APPLY_INTERVAL)
+
+# --- Conversation Log ---
+conversation_logger = ConversationLogger(
+    CONVERSATION_LOG,
+    max_queue=CONVERSATION_LOG_QUEUE_MAX,
+    max_bytes=CONVERSATION_LOG_MAX_BYTES,
+    rotate_interval=CONVERSATION_LOG_ROTATE_SECONDS,
+    backup_count=CONVERSATION_LOG_BACKUPS,
+    compress=CONVERSATION_LOG_COMPRESS,
+) if CONVERSATION_LOG else None
+
+# --- Metrics ---
+metrics = MetricsRegistry(enabled=METRICS, prefix="empathy_")
+requests_in_flight = metrics.gauge("http_requests_in_flight", "HTTP requests being handled.")
+request_seconds = metrics.histogram(
+    "http_request_seconds", "HTTP request duration, including validation and serialization.",
+    ("method", "route", "status"),
+)
+chat_stage_seconds = metrics.histogram(
+    "chat_stage_seconds", "Time spent in each stage of a chat turn.", ("endpoint", "stage"),
+)
+llm_wait_seconds = metrics.histogram(
+    "llm_scheduler_wait_seconds", "Time LLM requests waited for a fair-share slot.",
+)
+late_replies_total = metrics.counter(
+    "llm_late_replies_total", "LLM replies still pending at the deadline, by what became of them.", ("outcome",),
+)
 
 # --- Password Hashing ---
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_executor = BoundedExecutor(
+    "password hashing", PASSWORD_WORKERS, PASSWORD_QUEUE_MAX, RETRY_AFTER_SECONDS, processes=True
+)
+
+# --- Auth Caches ---
+token_cache = ExpiringCache("token", max_entries=AUTH_TOKEN_CACHE_SIZE)
+user_cache = ExpiringCache("user", max_entries=AUTH_USER_CACHE_SIZE, ttl=AUTH_USER_CACHE_TTL_SECONDS)
 
 # --- Pydantic Models ---
 class User(BaseModel):
@@ -48,6 +298,9 @@ class TokenData(BaseModel):
 class ChatTurn(BaseModel):
     role: str
     content: str
+    # Set on user turns: the detected emotion and the full score distribution.
+    emotion: str | None = None
+    scores: dict[str, float] | None = None
 
 class Conversation(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -55,11 +308,32 @@ class Conversation(BaseModel):
     title: str
     timestamp: str = Field(default_factory=lambda: datetime.utcnow().isoformat())
     messages: List[ChatTurn] = []
+    # `messages` may be a window of the conversation: `offset` is the position
+    # of its first entry and `message_count` the conversation's full length.
+    offset: int = 0
+    message_count: int = 0
+    version: int = 0
+    # Rolling summary of the turns before `summarized_through`, for the LLM only.
+    summary: str = Field("", exclude=True)
+    summarized_through: int = Field(0, exclude=True)
+    # Running emotion aggregates, see empathy_ai/emotion_stats.py.
+    emotion_stats: dict = Field(default_factory=dict, exclude=True)
 
 class ConversationSummary(BaseModel):
     id: str
     title: str
     timestamp: str
+    message_count: int = 0
+    version: int = 0
+
+class EmotionStats(BaseModel):
+    conversation_id: str
+    turns: int = 0
+    counts: dict[str, int] = {}
+    mood: dict[str, float] = {}
+    recent: List[str] = []
+    dominant_mood: str | None = None
+    summary: str = ""
 
 class ChatRequest(BaseModel):
     user_message: str
@@ -69,13 +343,19 @@ class ChatResponse(BaseModel):
     ai_response: str
     conversation_id: str
     detected_emotion: str | None = None
+    # Set when the LLM missed the deadline and its reply may still be added
+    # to the conversation as a follow-up turn.
+    followup_pending: bool = False
 
 # --- Auth Functions ---
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password) -> tuple[bool, str | None]:
+    """Returns whether the password matches, and a new hash if it should be rehashed."""
+    return await password_executor.run(
+        passwords.verify_password, plain_password, hashed_password, PASSWORD_HASH_ROUNDS
+    )
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await password_executor.run(passwords.hash_password, password, PASSWORD_HASH_ROUNDS)
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -87,6 +367,24 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+async def run_storage(fn, *args, **kwargs):
+    """Runs a blocking storage call on the storage pool."""
+    return await storage_executor.run(fn, *args, **kwargs)
+
+async def get_user_record(username: str) -> dict | None:
+    """Looks a user up through the user cache."""
+    user = user_cache.get(username)
+    if user is None:
+        user = await run_storage(storage.get_user, username)
+        if user is not None:
+            user_cache.put(username, user)
+    return user
+
+async def update_user_record(username: str, fields: dict):
+    """Updates a user and drops their cached record."""
+    await run_storage(storage.update_user, username, fields)
+    user_cache.invalidate(username)
+
 # --- Dependencies ---
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -96,16 +394,19 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    username = token_cache.get(token)
+    if username is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            username: str = payload.get("sub")
+            if username is None:
+                raise credentials_exception
+            token_data = TokenData(username=username)
+        except JWTError:
             raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
-        raise credentials_exception
-    
-    user = users_table.get(UserQuery.username == token_data.username)
+        token_cache.put(token, token_data.username, payload.get("exp"))
+
+    user = await get_user_record(username)
     if user is None:
         raise credentials_exception
     return user
@@ -115,6 +416,16 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
     # and check it here.
     return current_user
 
+async def require_models_ready():
+    """Holds chat requests briefly while the models load, then rejects them with 503."""
+    if not await startup.wait_ready(READY_WAIT_SECONDS):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Models are still loading, please retry shortly"
+            if startup.status != "failed" else "Models failed to load",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+        )
+
 # --- Helper Functions ---
 def generate_chat_title(message: str) -> str:
     """Generates a short title from the first user message."""
@@ -124,11 +435,524 @@ def generate_chat_title(message: str) -> str:
         title += "..."
     return title
 
+async def load_or_start_conversation(request: "ChatRequest", current_user: dict) -> "Conversation":
+    """Loads the requested conversation, or starts a new one, with the user's message appended."""
+    user_message_turn = ChatTurn(role="user", content=request.user_message)
+
+    if request.conversation_id:
+        # The user has moved on; a late reply must not take the new message's place.
+        await settle_followup(request.conversation_id, current_user['username'])
+        # Load the tail of the existing conversation; only the context window is needed.
+        conversation_doc = await run_storage(
+            storage.get_conversation, request.conversation_id, tail=CONTEXT_WINDOW_TURNS
+        )
+        if not conversation_doc or conversation_doc['username'] != current_user['username']:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        conversation = Conversation(**conversation_doc)
+        conversation.messages.append(user_message_turn)
+    else:
+        # Create new conversation
+        conversation = Conversation(
+            username=current_user['username'],
+            title=generate_chat_title(request.user_message),
+            messages=[user_message_turn]
+        )
+    return conversation
+
+async def save_turns(conversation: "Conversation", turns: List["ChatTurn"], updates: dict | None = None):
+    """
+    Persists the given trailing turns of the conversation, creating it on its
+    first save. `updates` are conversation fields stored along with them.
+    """
+    start = conversation.offset + len(conversation.messages) - len(turns)
+    args = (conversation.id, conversation.username, start, [turn.dict(exclude_none=True) for turn in turns])
+    kwargs = dict(
+        conversation=conversation.dict(include={'id', 'username', 'title', 'timestamp'}) if start == 0 else None,
+        updates=updates,
+    )
+    if isinstance(storage, WriteBehindStorage):
+        # Only waits for the journal's fsync, which has a thread of its own.
+        await storage.append_turns(*args, **kwargs)
+    else:
+        await run_storage(storage.store_turns, *args, **kwargs)
+
+def record_user_emotion(conversation: "Conversation", emotion_data: dict) -> dict:
+    """
+    Attaches the detected emotion to the new user turn and folds it into the
+    conversation's running aggregates.
+
+    Returns:
+        The conversation fields to store along with the turn.
+    """
+    turn = conversation.messages[-1]
+    turn.emotion = emotion_data.get("emotion", "neutral")
+    turn.scores = {label: round(score, 4) for label, score in emotion_data.get("scores", {}).items()} or None
+    conversation.emotion_stats = update_emotion_stats(conversation.emotion_stats, turn.emotion, turn.scores)
+    return {'emotion_stats': conversation.emotion_stats}
+
+def build_prompt_context(conversation: "Conversation", emotion: str, emotion_summary: str,
+                         updates: dict) -> dict:
+    """
+    Picks the turns that fit the context budget. If more turns were folded
+    into the conversation's rolling summary, the new summary is added to
+    `updates` to be stored with the turn.
+
+    Returns:
+        The `ContextBuilder.build` result.
+    """
+    context = context_builder.build(
+        conversation.messages, conversation.offset, conversation.summary, conversation.summarized_through
+    )
+    if context["changed"]:
+        updates['summary'] = context["summary"]
+        updates['summarized_through'] = context["summarized_through"]
+    prompt_tokens = context_builder.counter.count_messages(response_generator.build_messages(
+        emotion, conversation.messages[-1].content, context["turns"], emotion_summary, context["summary"]
+    ))
+    logger.info(
+        "Prompt for conversation %s: %d tokens (%s), %d turns in context, summary through %d",
+        conversation.id, prompt_tokens, "exact" if context_builder.counter.exact else "approximate",
+        len(context["turns"]), context["summarized_through"],
+    )
+    return context
+
+async def lookup_cached_response(emotion: str, conversation: "Conversation") -> tuple:
+    """
+    Checks the semantic response cache for the conversation's new message, on
+    the inference pool; see `ResponseGenerator.lookup_cached_response`.
+    Eligibility goes by the conversation's full length, not the turns that fit
+    in the prompt, since trimmed turns still reach the LLM via the summary.
+    """
+    if response_generator.semantic_cache is None:
+        return None, None
+    return await asyncio.get_running_loop().run_in_executor(
+        inference_executor.pool, response_generator.lookup_cached_response,
+        emotion, conversation.messages[-1].content, conversation.offset + len(conversation.messages),
+    )
+
+async def single_chunk(text: str):
+    yield text
+
+async def generate_ai_response(username: str, weight: float = 1.0, **kwargs) -> tuple:
+    """
+    Generates the AI's reply, on the async LLM client if there is one or the
+    LLM pool otherwise, waiting at most LLM_DEADLINE_SECONDS for the LLM.
+
+    The call runs in one of the user's LLM scheduler slots, which is held
+    until the call actually stops: for a reply that misses the deadline, that
+    is after this returns, so late calls still count against the global and
+    per-user limits.
+
+    Returns:
+        `(reply, late_reply)`. If the deadline passed, `reply` is a template
+        and `late_reply` the task still producing the LLM's reply; otherwise
+        `late_reply` is None.
+    """
+    emotion = kwargs["emotion"]
+    if response_generator.llm_client is None and response_generator.api_client is None:
+        return response_generator.fallback_response(emotion, "no_client"), None
+
+    await llm_scheduler.acquire(username, weight)
+    loop = asyncio.get_running_loop()
+    try:
+        if response_generator.llm_client is not None:
+            reply = asyncio.ensure_future(response_generator.allm_reply(**kwargs))
+            stopped = reply
+        else:
+            # A cancelled wrapper doesn't stop the thread; the slot waits for
+            # the pool's own future.
+            stopped = llm_executor.submit(response_generator.llm_reply, **kwargs)
+            reply = asyncio.wrap_future(stopped)
+    except Overloaded:
+        llm_scheduler.release(username)
+        return response_generator.fallback_response(emotion, "overloaded"), None
+    except BaseException:
+        llm_scheduler.release(username)
+        raise
+
+    def release(_):
+        try:
+            loop.call_soon_threadsafe(llm_scheduler.release, username)
+        except RuntimeError:
+            pass  # The loop has shut down, and the scheduler with it.
+
+    stopped.add_done_callback(release)
+
+    try:
+        done, _ = await asyncio.wait({reply}, timeout=LLM_DEADLINE_SECONDS or None)
+    except asyncio.CancelledError:
+        reply.cancel()
+        raise
+    if not done:
+        logger.warning("LLM missed the %.1fs deadline; serving a template reply", LLM_DEADLINE_SECONDS)
+        return response_generator.timeout_response(emotion), reply
+    try:
+        return reply.result(), None
+    except CircuitOpen:
+        return response_generator.fallback_response(emotion, "circuit_open"), None
+    except LLMError as e:
+        logger.warning("LLM call failed: %s", e)
+        return response_generator.fallback_response(emotion, "error"), None
+
+# Follow-ups waiting on a late LLM reply: conversation id -> (username, saver task, late reply).
+pending_followups = {}
+
+def handle_late_reply(conversation: "Conversation", late_reply: asyncio.Future) -> bool:
+    """
+    Stores a reply that missed the deadline as a follow-up turn once it
+    arrives, or cancels it, depending on LLM_LATE_REPLY.
+
+    Returns:
+        Whether a follow-up may still be added to the conversation.
+    """
+    if LLM_LATE_REPLY != "followup":
+        late_reply.cancel()
+        late_replies_total.inc(outcome="discarded")
+        return False
+    position = conversation.offset + len(conversation.messages)
+
+    async def save_followup():
+        try:
+            text = await late_reply
+        except asyncio.CancelledError:
+            late_replies_total.inc(outcome="abandoned")
+            return
+        except Exception as e:
+            logger.warning("Late LLM reply for conversation %s failed: %s", conversation.id, e)
+            late_replies_total.inc(outcome="failed")
+            return
+        # A message handled by another worker can't settle this one; don't
+        # let the follow-up take its position.
+        summary = await run_storage(storage.get_conversation_summary, conversation.id)
+        if summary is None or summary.get('message_count', position) != position or not text:
+            late_replies_total.inc(outcome="abandoned")
+            return
+        conversation.messages.append(ChatTurn(role="ai", content=text))
+        await save_turns(conversation, conversation.messages[-1:])
+        late_replies_total.inc(outcome="saved")
+
+    async def run_followup():
+        try:
+            await save_followup()
+        finally:
+            if pending_followups.get(conversation.id, (None, None))[1] is task:
+                del pending_followups[conversation.id]
+
+    task = asyncio.create_task(run_followup())
+    pending_followups[conversation.id] = (conversation.username, task, late_reply)
+    return True
+
+async def settle_followup(conversation_id: str, username: str):
+    """Abandons a follow-up still waiting on the LLM, or lets one already being saved finish."""
+    pending = pending_followups.get(conversation_id)
+    if pending is None or pending[0] != username:
+        return
+    del pending_followups[conversation_id]
+    _, task, late_reply = pending
+    late_reply.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+async def detect_message_emotion(message: str) -> dict:
+    """Runs the message through the emotion batcher, rejecting it if the queue is full."""
+    try:
+        return await emotion_batcher.detect_emotion(message)
+    except asyncio.QueueFull:
+        raise Overloaded("emotion detection", RETRY_AFTER_SECONDS)
+
+def encode_history_cursor(summary: dict) -> str:
+    """Encodes the position after `summary` in the history list as an opaque cursor."""
+    raw = json.dumps([summary['timestamp'], summary['id']]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_history_cursor(cursor: str) -> tuple:
+    try:
+        timestamp, conversation_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(timestamp), str(conversation_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def make_etag(kind: str, version: int, *params) -> str:
+    """
+    Builds a weak ETag from a version counter and the query parameters that
+    select what was returned, so each page or window gets its own tag.
+    """
+    if not any(param is not None for param in params):
+        return f'W/"{kind}{version}"'
+    digest = hashlib.sha1(json.dumps(params).encode()).hexdigest()[:12]
+    return f'W/"{kind}{version}-{digest}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Checks the request's If-None-Match header against `etag`."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (tag.strip() for tag in header.split(","))
+
+def record_turn(endpoint: str, current_user: dict, conversation, emotion_data: dict,
+                timer: StageTimer, **extra):
+    """Observes a turn's stage latencies and logs it."""
+    latencies = timer.result()
+    if metrics.enabled:
+        for stage, milliseconds in latencies.items():
+            chat_stage_seconds.observe(milliseconds / 1000, endpoint=endpoint, stage=stage)
+    if conversation_logger is not None:
+        conversation_logger.log_turn(
+            current_user['username'], conversation.id, emotion_data, latencies, **extra
+        )
+
+def sse_event(event: str, data: dict) -> str:
+    """Formats a single Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# --- Execution ---
+# The batcher only ever has one batch in flight, so the inference pool needs no
+# queue of its own; admission is bounded by the batcher's queue instead.
+inference_executor = BoundedExecutor("inference", INFERENCE_WORKERS, 0, RETRY_AFTER_SECONDS)
+# The scheduler admits at most LLM_WORKERS calls at a time and does the
+# queueing itself, so the LLM pool never has to.
+llm_executor = BoundedExecutor("llm", LLM_WORKERS, 0, RETRY_AFTER_SECONDS)
+storage_executor = BoundedExecutor("storage", STORAGE_WORKERS, STORAGE_QUEUE_MAX, RETRY_AFTER_SECONDS)
+llm_scheduler = FairScheduler(
+    "llm",
+    max_concurrency=LLM_WORKERS,
+    per_user_limit=LLM_USER_MAX_IN_FLIGHT,
+    per_user_queue=LLM_USER_QUEUE_MAX,
+    max_queue=LLM_QUEUE_MAX,
+    retry_after=RETRY_AFTER_SECONDS,
+    wait_seconds=llm_wait_seconds,
+)
+
+# --- AI Components ---
+# Set by the startup phases below once the models are loaded.
+emotion_detector = None
+response_generator = None
+emotion_batcher = None
+context_builder = None
+
+def load_emotion_model():
+    global emotion_detector, emotion_batcher
+    if EMPATHY_OFFLINE and not EMOTION_MODEL_DIR:
+        raise RuntimeError("EMPATHY_OFFLINE=1 requires EMOTION_MODEL_DIR to point at a downloaded model")
+    detector_kwargs = {"model_name": EMOTION_MODEL_DIR} if EMOTION_MODEL_DIR else {}
+    emotion_detector = EmotionDetector(
+        cache=EmotionCache(
+            max_entries=EMOTION_CACHE_SIZE,
+            max_bytes=EMOTION_CACHE_MAX_BYTES,
+            ttl=EMOTION_CACHE_TTL_SECONDS,
+        ),
+        use_cache=EMOTION_CACHE_SIZE > 0,
+        backend=EMOTION_BACKEND,
+        artifact_dir=EMOTION_ARTIFACT_DIR,
+        local_files_only=EMPATHY_OFFLINE,
+        max_chunk_tokens=EMOTION_CHUNK_TOKENS,
+        max_chunks=EMOTION_MAX_CHUNKS,
+        **detector_kwargs,
+    )
+    emotion_batcher = EmotionBatcher(
+        emotion_detector,
+        max_batch_size=EMOTION_BATCH_MAX_SIZE,
+        max_wait_ms=EMOTION_BATCH_MAX_WAIT_MS,
+        executor=inference_executor.pool,
+        max_queue=EMOTION_QUEUE_MAX,
+    )
+
+def load_response_generator():
+    global response_generator
+    # httpx and numpy are only imported when the async client or the semantic
+    # cache is enabled, so that the default app starts without them.
+    llm_client = None
+    if LLM_CLIENT == "async":
+        from empathy_ai.llm_client import AsyncLLMClient
+
+        llm_client = AsyncLLMClient(
+            LLM_BASE_URL,
+            api_key=os.getenv("HF_TOKEN"),
+            model=LLM_API_MODEL,
+            connect_timeout=LLM_CONNECT_TIMEOUT,
+            read_timeout=LLM_READ_TIMEOUT,
+            max_connections=LLM_WORKERS,
+            max_retries=LLM_MAX_RETRIES,
+            hedge=LLM_HEDGE,
+            hedge_min_delay=LLM_HEDGE_MIN_DELAY,
+        )
+    semantic_cache = None
+    if SEMANTIC_CACHE:
+        from empathy_ai.semantic_cache import EMBEDDING_MODEL, SemanticResponseCache
+
+        semantic_cache = SemanticResponseCache(
+            model_name=SEMANTIC_CACHE_MODEL or EMBEDDING_MODEL,
+            threshold=SEMANTIC_CACHE_THRESHOLD,
+            max_entries_per_emotion=SEMANTIC_CACHE_SIZE,
+            max_context_turns=SEMANTIC_CACHE_MAX_CONTEXT,
+            local_files_only=EMPATHY_OFFLINE,
+        )
+    breaker = CircuitBreaker(
+        failure_threshold=LLM_BREAKER_FAILURES,
+        reset_timeout=LLM_BREAKER_RESET_SECONDS,
+    ) if LLM_BREAKER_FAILURES > 0 else None
+    response_generator = ResponseGenerator(
+        llm_client=llm_client,
+        semantic_cache=semantic_cache,
+        breaker=breaker,
+        deadline=LLM_DEADLINE_SECONDS or None,
+        sync_client=LLM_CLIENT == "sync",
+    )
+
+def load_tokenizer():
+    global context_builder
+    context_builder = ContextBuilder(
+        TokenCounter(LLM_TOKENIZER, local_files_only=EMPATHY_OFFLINE),
+        budget=CONTEXT_TOKEN_BUDGET,
+        summary_budget=CONTEXT_SUMMARY_TOKENS,
+    )
+
+startup = StartupSequence([
+    ("load_emotion_model", load_emotion_model),
+    ("load_response_generator", load_response_generator),
+    ("load_tokenizer", load_tokenizer),
+    ("warm_up", lambda: emotion_detector.warm_up()),
+])
+
+def file_size(path: str) -> int | None:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+def collect_component_metrics():
+    """Reads the stats the components keep themselves, at scrape time."""
+    yield "models_ready", "gauge", "Whether the models are loaded and warm.", [({}, startup.ready)]
+
+    caches = {"auth_token": token_cache.stats(), "auth_user": user_cache.stats()}
+    if emotion_detector is not None and emotion_detector.cache is not None:
+        caches["emotion"] = emotion_detector.cache.stats()
+    if response_generator is not None and response_generator.semantic_cache is not None:
+        semantic = response_generator.semantic_cache.stats()
+        caches["semantic"] = {
+            "hits": semantic["hits"],
+            "misses": semantic["lookups"] - semantic["hits"],
+            "evictions": semantic["evictions"],
+            "entries": sum(partition["entries"] for partition in semantic["emotions"].values()),
+        }
+    yield "cache_hits_total", "counter", "Cache hits.", [
+        ({"cache": name}, stats["hits"]) for name, stats in caches.items()
+    ]
+    yield "cache_misses_total", "counter", "Cache misses.", [
+        ({"cache": name}, stats["misses"]) for name, stats in caches.items()
+    ]
+    yield "cache_evictions_total", "counter", "Entries evicted to make room.", [
+        ({"cache": name}, stats["evictions"]) for name, stats in caches.items()
+    ]
+    yield "cache_entries", "gauge", "Entries currently cached.", [
+        ({"cache": name}, stats["entries"]) for name, stats in caches.items()
+    ]
+
+    executors = {
+        executor.name: executor.stats()
+        for executor in (inference_executor, llm_executor, password_executor, storage_executor)
+    }
+    scheduler = llm_scheduler.stats()
+    queues = {name: stats["queued"] for name, stats in executors.items()}
+    queues["llm_scheduler"] = scheduler["queued"]
+    if emotion_batcher is not None:
+        queues["emotion_batcher"] = emotion_batcher.stats()["queue_depth"]
+    if isinstance(storage, WriteBehindStorage):
+        journal = storage.stats()
+        queues["journal"] = journal["pending"]
+        yield "journal_apply_failures_total", "counter", "Journal entries the database rejected (they are retried).", [
+            ({}, journal["apply_failures"])
+        ]
+    if conversation_logger is not None:
+        log_stats = conversation_logger.stats()
+        queues["conversation_log"] = log_stats["queued"]
+        yield "conversation_log_dropped_total", "counter", "Turns dropped because the log queue was full.", [
+            ({}, log_stats["dropped"])
+        ]
+    yield "queue_depth", "gauge", "Work waiting to start.", [
+        ({"queue": name}, depth) for name, depth in queues.items()
+    ]
+    yield "executor_running", "gauge", "Jobs running on each pool.", [
+        ({"executor": name}, stats["running"]) for name, stats in executors.items()
+    ] + [({"executor": "llm_scheduler"}, scheduler["running"])]
+    yield "executor_rejected_total", "counter", "Jobs turned away because a pool was full.", [
+        ({"executor": name}, stats["rejected"]) for name, stats in executors.items()
+    ] + [({"executor": "llm_scheduler"}, scheduler["rejected"])]
+
+    busiest = sorted(
+        scheduler["users"].items(), key=lambda item: item[1]["queued"] + item[1]["in_flight"], reverse=True,
+    )[:METRICS_TOP_USERS]
+    yield "llm_user_queued", "gauge", "LLM requests a user has waiting (busiest users only).", [
+        ({"user": user}, stats["queued"]) for user, stats in busiest
+    ]
+    yield "llm_user_in_flight", "gauge", "LLM slots a user holds (busiest users only).", [
+        ({"user": user}, stats["in_flight"]) for user, stats in busiest
+    ]
+    yield "llm_user_mean_wait_seconds", "gauge", "A user's mean wait for an LLM slot while active (busiest users only).", [
+        ({"user": user}, stats["mean_wait_ms"] / 1000) for user, stats in busiest
+    ]
+    yield "llm_user_max_wait_seconds", "gauge", "A user's longest wait for an LLM slot while active (busiest users only).", [
+        ({"user": user}, stats["max_wait_ms"] / 1000) for user, stats in busiest
+    ]
+
+    if response_generator is not None:
+        yield "llm_fallbacks_total", "counter", "Template responses served in place of the LLM.", [
+            ({"reason": reason}, count)
+            for reason, count in response_generator.stats()["fallbacks"].items()
+        ]
+        if response_generator.breaker is not None:
+            breaker = response_generator.breaker.stats()
+            yield "llm_circuit_state", "gauge", "The LLM circuit breaker's state (1 for the current one).", [
+                ({"state": state}, state == breaker["state"]) for state in BREAKER_STATES
+            ]
+            yield "llm_circuit_opened_total", "counter", "Times the LLM circuit breaker opened.", [
+                ({}, breaker["opened"])
+            ]
+            yield "llm_circuit_rejected_total", "counter", "LLM calls skipped by the open circuit breaker.", [
+                ({}, breaker["rejected"])
+            ]
+        if response_generator.llm_client is not None:
+            client = response_generator.llm_client.stats()
+            for key in ("requests", "retries", "failures", "hedges"):
+                yield f"llm_client_{key}_total", "counter", f"LLM client {key}.", [({}, client[key])]
+
+    yield "db_size_bytes", "gauge", "Size of the database files.", [
+        ({"file": os.path.basename(path)}, file_size(path))
+        for path in (DATABASE_PATH, DATABASE_PATH + "-wal")
+    ]
+
+metrics.add_collector(collect_component_metrics)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.start()
+    if conversation_logger is not None:
+        conversation_logger.start()
+    if isinstance(storage, WriteBehindStorage):
+        storage.start()
+    yield
+    for _, task, late_reply in list(pending_followups.values()):
+        late_reply.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    if emotion_batcher is not None:
+        await emotion_batcher.stop()
+    if isinstance(storage, WriteBehindStorage):
+        await storage.stop()
+    if response_generator is not None and response_generator.llm_client is not None:
+        await response_generator.llm_client.aclose()
+    inference_executor.shutdown()
+    llm_executor.shutdown()
+    password_executor.shutdown()
+    storage_executor.shutdown()
+    storage.close()
+    if conversation_logger is not None:
+        await anyio.to_thread.run_sync(conversation_logger.stop)
+
 # --- App Initialization ---
 app = FastAPI(
     title="Empathy AI",
     description="A conversational AI with a focus on empathetic communication.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -137,22 +961,56 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-History-Version"],
 )
+if metrics.enabled:
+    app.add_middleware(
+        MetricsMiddleware, requests_in_flight=requests_in_flight, request_seconds=request_seconds
+    )
 
-# --- AI Components ---
-emotion_detector = EmotionDetector()
-response_generator = ResponseGenerator()
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": f"Server busy ({exc.name}), please retry shortly"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 # --- API Endpoints ---
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text exposition of the process's metrics."""
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: the models are loaded and warmed up. Reports per-phase startup timings."""
+    report = startup.report()
+    if not startup.ready:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=report)
+    return report
+
 @app.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = users_table.get(UserQuery.username == form_data.username)
-    if not user or not verify_password(form_data.password, user['hashed_password']):
+    user = await run_storage(storage.get_user, form_data.username)
+    valid, new_hash = (
+        await verify_password(form_data.password, user['hashed_password']) if user else (False, None)
+    )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        await update_user_record(user['username'], {'hashed_password': new_hash})
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user['username']}, expires_delta=access_token_expires
@@ -161,16 +1019,17 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
 
 @app.post("/users/signup", response_model=User)
 async def signup_user(user: UserCreate):
-    db_user = users_table.get(UserQuery.username == user.username)
+    db_user = await run_storage(storage.get_user, user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
     
-    hashed_password = get_password_hash(user.password)
-    users_table.insert({
+    hashed_password = await get_password_hash(user.password)
+    await run_storage(storage.create_user, {
         'username': user.username, 
         'name': user.name, 
         'hashed_password': hashed_password
     })
+    user_cache.invalidate(user.username)
     return User(username=user.username, name=user.name)
 
 @app.get("/users/me", response_model=User)
@@ -179,22 +1038,104 @@ async def read_users_me(current_user: dict = Depends(get_current_active_user)):
     return User(username=current_user['username'], name=current_user.get('name', 'friend'))
 
 @app.get("/history", response_model=List[ConversationSummary])
-async def get_history(current_user: User = Depends(get_current_active_user)):
-    user_chats = chat_history_table.search(where('username') == current_user['username'])
-    # Sort by timestamp, newest first
-    sorted_chats = sorted(user_chats, key=lambda x: x['timestamp'], reverse=True)
-    return [ConversationSummary(**chat) for chat in sorted_chats]
+async def get_history(
+    request: Request,
+    response: Response,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    since_version: int | None = Query(None, ge=0),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Lists the user's conversations, newest first, a page at a time. When more
+    pages exist the cursor for the next one is sent in the X-Next-Cursor header.
 
-@app.get("/history/{conversation_id}", response_model=Conversation)
-async def get_conversation(conversation_id: str, current_user: User = Depends(get_current_active_user)):
-    conversation_doc = chat_history_table.get(
-        (where('id') == conversation_id) & (where('username') == current_user['username'])
+    The user's history version is sent as X-History-Version and, together
+    with the query parameters, in the ETag, so unchanged pages get a 304.
+    With `since_version`, only conversations created or changed after that
+    version are listed.
+    """
+    # Read the version first: if a write lands in between, the client simply
+    # sees it again on its next sync.
+    history_version = await run_storage(storage.get_history_version, current_user['username'])
+    etag = make_etag("h", history_version, limit, cursor, since_version)
+    headers = {"ETag": etag, "X-History-Version": str(history_version)}
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+
+    before = decode_history_cursor(cursor) if cursor else None
+    # Fetch one extra row to learn whether another page follows.
+    user_chats = await run_storage(
+        storage.list_conversations,
+        current_user['username'], limit=limit + 1, before=before, since_version=since_version,
     )
-    if not conversation_doc:
+    if len(user_chats) > limit:
+        user_chats = user_chats[:limit]
+        response.headers["X-Next-Cursor"] = encode_history_cursor(user_chats[-1])
+    return [ConversationSummary(**chat) for chat in user_chats]
+
+@app.get("/history/{conversation_id}", response_model=Conversation)
+async def get_conversation(
+    conversation_id: str,
+    request: Request,
+    response: Response,
+    after_message: int | None = Query(None, ge=-1),
+    tail: int | None = Query(None, ge=0),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Returns a conversation. `after_message` limits the messages to those after
+    the given position (a client holding N messages passes N - 1), and `tail`
+    to the last N; `offset` in the response is the position of the first one.
+    The conversation version (with the query parameters) is sent as the ETag,
+    so unchanged ones get a 304.
+    """
+    summary = await run_storage(storage.get_conversation_summary, conversation_id)
+    if not summary or summary['username'] != current_user['username']:
         raise HTTPException(status_code=404, detail="Conversation not found")
+    etag = make_etag("c", summary["version"], after_message, tail)
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    conversation_doc = await run_storage(
+        storage.get_conversation, conversation_id, after=after_message, tail=tail
+    )
+    response.headers["ETag"] = make_etag("c", conversation_doc["version"], after_message, tail)
     return Conversation(**conversation_doc)
 
-@app.post("/chat", response_model=ChatResponse)
+@app.get("/history/{conversation_id}/emotions", response_model=EmotionStats)
+async def get_conversation_emotions(
+    conversation_id: str,
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Returns the conversation's running emotion aggregates: per-emotion turn
+    counts, the exponentially weighted mood vector and the most recent
+    emotions. Served from the conversation record, without reading messages.
+    """
+    summary = await run_storage(storage.get_conversation_summary, conversation_id)
+    if not summary or summary['username'] != current_user['username']:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    etag = f'W/"c{summary["version"]}"'
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    stats = summary.get('emotion_stats') or {}
+    return EmotionStats(
+        conversation_id=conversation_id,
+        turns=stats.get('turns', 0),
+        counts=stats.get('counts', {}),
+        mood=stats.get('mood', {}),
+        recent=stats.get('recent', []),
+        dominant_mood=dominant_mood(stats),
+        summary=describe_emotion_stats(stats),
+    )
+
+@app.post("/chat", response_model=ChatResponse, dependencies=[Depends(require_models_ready)])
 async def chat_endpoint(
     request: ChatRequest,
     current_user: User = Depends(get_current_active_user)
@@ -203,43 +1144,153 @@ async def chat_endpoint(
     Main chat endpoint. Receives user message and optional conversation ID.
     Handles conversation persistence and returns AI response.
     """
-    user_message_turn = ChatTurn(role="user", content=request.user_message)
+    timer = StageTimer()
+    conversation = await load_or_start_conversation(request, current_user)
 
-    if request.conversation_id:
-        # Load existing conversation
-        conversation_doc = chat_history_table.get(where('id') == request.conversation_id)
-        if not conversation_doc or conversation_doc['username'] != current_user['username']:
-            raise HTTPException(status_code=404, detail="Conversation not found")
-        conversation = Conversation(**conversation_doc)
-        conversation.messages.append(user_message_turn)
-    else:
-        # Create new conversation
-        conversation = Conversation(
-            username=current_user['username'],
-            title=generate_chat_title(request.user_message),
-            messages=[user_message_turn]
-        )
-
-    # 1. Detect emotion from the user's message
-    emotion_data = emotion_detector.detect_emotion(request.user_message)
+    # 1. Detect emotion from the user's message and update the running aggregates
+    emotion_data = await detect_message_emotion(request.user_message)
+    timer.mark("emotion")
     detected_emotion = emotion_data.get("emotion", "neutral")
+    updates = record_user_emotion(conversation, emotion_data)
+    emotion_summary = " ".join(filter(None, [
+        describe_emotion_stats(conversation.emotion_stats), describe_emotional_arc(emotion_data),
+    ]))
 
     # 2. Generate an empathetic response
-    recent_context = conversation.messages[-10:] # Use last 10 turns for context
-    ai_response_text = response_generator.generate_response(
-        emotion=detected_emotion,
-        user_message=request.user_message,
-        recent_context=recent_context
-    )
-    
+    context = build_prompt_context(conversation, detected_emotion, emotion_summary, updates)
+    recent_context = context["turns"]
+    cached_reply, embedding = await lookup_cached_response(detected_emotion, conversation)
+    timer.mark("context")
+    late_reply = None
+    if cached_reply is not None:
+        ai_response_text = cached_reply
+    else:
+        ai_response_text, late_reply = await generate_ai_response(
+            current_user['username'],
+            current_user.get('llm_weight', 1.0),
+            emotion=detected_emotion,
+            user_message=request.user_message,
+            recent_context=recent_context,
+            emotion_summary=emotion_summary,
+            embedding=embedding,
+            conversation_summary=context["summary"],
+        )
+    timer.mark("llm")
+
     ai_response_turn = ChatTurn(role="ai", content=ai_response_text)
     conversation.messages.append(ai_response_turn)
 
-    # 3. Save conversation to DB
-    chat_history_table.upsert(conversation.dict(), where('id') == conversation.id)
+    # 3. Save the new turns to the DB
+    await save_turns(conversation, conversation.messages[-2:], updates)
+    timer.mark("save")
+    followup_pending = late_reply is not None and handle_late_reply(conversation, late_reply)
+    record_turn(
+        "chat", current_user, conversation, emotion_data, timer,
+        cached=cached_reply is not None, timed_out=late_reply is not None,
+    )
 
     return ChatResponse(
         ai_response=ai_response_text,
         detected_emotion=detected_emotion,
-        conversation_id=conversation.id
-    ) 
\ No newline at end of file
+        conversation_id=conversation.id,
+        followup_pending=followup_pending,
+    )
+
+@app.post("/chat/stream", dependencies=[Depends(require_models_ready)])
+async def chat_stream_endpoint(
+    request: ChatRequest,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Streaming variant of /chat. Responds with Server-Sent Events: a `meta` event
+    carrying the conversation ID and detected emotion, one `token` event per
+    chunk of the AI response, then `done`. The AI turn is saved once the
+    stream finishes or the client goes away.
+    """
+    timer = StageTimer()
+    conversation = await load_or_start_conversation(request, current_user)
+
+    emotion_data = await detect_message_emotion(request.user_message)
+    timer.mark("emotion")
+    detected_emotion = emotion_data.get("emotion", "neutral")
+    updates = record_user_emotion(conversation, emotion_data)
+    emotion_summary = " ".join(filter(None, [
+        describe_emotion_stats(conversation.emotion_stats), describe_emotional_arc(emotion_data),
+    ]))
+
+    context = build_prompt_context(conversation, detected_emotion, emotion_summary, updates)
+    recent_context = context["turns"]
+    cached_reply, embedding = await lookup_cached_response(detected_emotion, conversation)
+    timer.mark("context")
+    if cached_reply is None:
+        # Reject before the 200 goes out; once streaming, errors can only be events.
+        llm_scheduler.check_admission(current_user['username'])
+        llm_slot = llm_scheduler.slot(current_user['username'], current_user.get('llm_weight', 1.0))
+    else:
+        llm_slot = nullcontext()
+
+    generator_kwargs = dict(
+        emotion=detected_emotion,
+        user_message=request.user_message,
+        recent_context=recent_context,
+        emotion_summary=emotion_summary,
+        embedding=embedding,
+        conversation_summary=context["summary"],
+    )
+    if cached_reply is not None:
+        tokens = single_chunk(cached_reply)
+        chunk_source = tokens
+    elif response_generator.llm_client is not None:
+        tokens = response_generator.astream_response(**generator_kwargs)
+        chunk_source = tokens
+    else:
+        tokens = response_generator.stream_response(**generator_kwargs)
+        chunk_source = llm_executor.iterate(tokens)
+
+    # Save the user's turn now so it is kept even if the stream is cut short.
+    await save_turns(conversation, conversation.messages[-1:], updates)
+
+    async def event_stream():
+        chunks = []
+        yield sse_event("meta", {
+            "conversation_id": conversation.id,
+            "detected_emotion": detected_emotion,
+        })
+        try:
+            async with llm_slot:
+                async for chunk in chunk_source:
+                    if not chunks:
+                        timer.mark("first_token")
+                    chunks.append(chunk)
+                    yield sse_event("token", {"content": chunk})
+            yield sse_event("done", {"ai_response": "".join(chunks).strip()})
+        except Overloaded as exc:
+            yield sse_event("error", {"detail": f"Server busy ({exc.name}), please retry shortly"})
+        finally:
+            # A client disconnect cancels this scope; cleanup and the save must still finish.
+            with anyio.CancelScope(shield=True):
+                if hasattr(tokens, "aclose"):
+                    await tokens.aclose()
+                else:
+                    try:
+                        tokens.close()
+                    except ValueError:
+                        # Still running on a worker thread after a disconnect; it
+                        # will be collected once that chunk returns.
+                        pass
+                timer.mark("llm")
+                ai_response_text = "".join(chunks).strip()
+                if ai_response_text:
+                    conversation.messages.append(ChatTurn(role="ai", content=ai_response_text))
+                    await save_turns(conversation, conversation.messages[-1:])
+                timer.mark("save")
+                record_turn(
+                    "chat_stream", current_user, conversation, emotion_data, timer,
+                    cached=cached_reply is not None, streamed=True, completed=bool(ai_response_text),
+                )
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,249 @@
+"""
+A small in-process metrics registry, rendered in the Prometheus text format.
+
+Counters, gauges and histograms are updated on the request path and cost a
+dict lookup and an addition under a lock. Values that other components
+already track (cache hit counts, queue depths, file sizes) are read only when
+`/metrics` is scraped, through collectors. A disabled registry hands out no-op
+metrics, so instrumented code pays a single method call.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: tuple) -> dict:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> list:
+        """Returns `(suffix, labels, value)` tuples for rendering."""
+        with self._lock:
+            return [("", self._labels(key), value) for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (not cumulative) counts, then the sum and count.
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the `with` block, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> list:
+        with self._lock:
+            states = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        samples = []
+        for key, counts, total, count in states:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                samples.append(("_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, count))
+        return samples
+
+
+class _NoopMetric:
+    """Stands in for every metric type when metrics are disabled."""
+
+    def inc(self, amount: float = 1, **labels):
+        pass
+
+    def dec(self, amount: float = 1, **labels):
+        pass
+
+    def set(self, value: float, **labels):
+        pass
+
+    def observe(self, value: float, **labels):
+        pass
+
+    def time(self, **labels):
+        return nullcontext()
+
+
+_NOOP = _NoopMetric()
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = True, prefix: str = ""):
+        """
+        Args:
+            enabled: When False, every metric is a no-op and nothing is rendered.
+            prefix: Prepended to every metric name.
+        """
+        self.enabled = enabled
+        self.prefix = prefix
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()):
+        return self._register(Counter(self.prefix + name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: tuple = ()):
+        return self._register(Gauge(self.prefix + name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        return self._register(Histogram(self.prefix + name, help, labelnames, buckets))
+
+    def add_collector(self, collect):
+        """
+        Registers a callable run at scrape time. It returns an iterable of
+        `(name, kind, help, samples)` tuples, where `kind` is "counter" or
+        "gauge" and `samples` is a list of `(labels, value)` pairs. Samples
+        with a None value are skipped.
+        """
+        if self.enabled:
+            self._collectors.append(collect)
+
+    def render(self) -> str:
+        """Renders every metric in the Prometheus text exposition format."""
+        if not self.enabled:
+            return ""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        for collect in self._collectors:
+            for name, kind, help, samples in collect():
+                name = self.prefix + name
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    if value is not None:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        if not self.enabled:
+            return _NOOP
+        self._metrics.append(metric)
+        return metric
+
+
+class MetricsMiddleware:
+    def __init__(self, app, requests_in_flight, request_seconds):
+        """
+        ASGI middleware timing every HTTP request, labelled by method, route
+        template (so `/history/{conversation_id}` is one series) and status.
+
+        Args:
+            app: The ASGI app to wrap.
+            requests_in_flight: A gauge of requests currently being handled.
+            request_seconds: A histogram of request durations.
+        """
+        self.app = app
+        self.requests_in_flight = requests_in_flight
+        self.request_seconds = request_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        self.requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.requests_in_flight.dec()
+            route = scope.get("route")
+            self.request_seconds.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status_code,
+            )
@@ -0,0 +1,102 @@
+"""
+One-shot migration of a TinyDB `users_db.json` file into the SQLite store.
+
+    python migrate_tinydb.py users_db.json empathy_ai.db
+
+Users and conversations that already exist in the target are left alone, so
+the migration can be re-run safely. The server runs it by itself at startup
+when it finds users in the TinyDB file but none in the SQLite database.
+"""
+import argparse
+import json
+import sqlite3
+
+from storage import SQLiteStorage
+
+
+def migrate(source_path: str, target_path: str) -> dict:
+    """
+    Copies users and chat history from a TinyDB JSON file into SQLite.
+
+    Returns:
+        Counts of the users, conversations and messages copied, and of the
+        users and conversations skipped because the target already had them.
+    """
+    with open(source_path) as f:
+        data = json.load(f)
+
+    storage = SQLiteStorage(target_path)
+    counts = {"users": 0, "users_skipped": 0, "conversations": 0, "conversations_skipped": 0, "messages": 0}
+
+    # TinyDB stores each table as {doc_id: document}.
+    for user in data.get("users", {}).values():
+        try:
+            storage.create_user(user)
+        except sqlite3.IntegrityError:
+            counts["users_skipped"] += 1
+        else:
+            counts["users"] += 1
+
+    for conversation in data.get("chat_history", {}).values():
+        existing = storage.get_conversation_summary(conversation["id"])
+        storage.create_conversation(conversation)
+        messages = conversation.get("messages", [])
+        storage.append_messages(conversation["id"], 0, messages)
+        updates = {
+            key: conversation[key]
+            for key in ("summary", "summarized_through", "emotion_stats")
+            if conversation.get(key)
+        }
+        if updates:
+            storage.update_conversation(conversation["id"], updates)
+        # An earlier, interrupted run may have copied only some of the messages.
+        stored = storage.get_conversation_summary(conversation["id"])["message_count"]
+        counts["messages"] += stored - (existing["message_count"] if existing else 0)
+        counts["conversations_skipped" if existing else "conversations"] += 1
+
+    storage.close()
+    return counts
+
+
+def unmigrated_users(source_path: str, target_path: str) -> int:
+    """
+    Returns the number of users in the TinyDB file at `source_path` if the
+    SQLite database at `target_path` has no users at all, and 0 otherwise
+    (or if there is no such file): a deployment switched to SQLite without
+    running the migration.
+    """
+    try:
+        with open(source_path) as f:
+            users = json.load(f).get("users", {})
+    except (OSError, ValueError):
+        return 0
+    if not users:
+        return 0
+    storage = SQLiteStorage(target_path)
+    try:
+        empty = storage.conn.execute("SELECT NOT EXISTS (SELECT 1 FROM users)").fetchone()[0]
+    finally:
+        storage.close()
+    return len(users) if empty else 0
+
+
+def describe(counts: dict) -> str:
+    return (
+        f"{counts['users']} users ({counts['users_skipped']} already present), "
+        f"{counts['conversations']} conversations ({counts['conversations_skipped']} already present) "
+        f"and {counts['messages']} messages"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate a TinyDB users_db.json file to SQLite.")
+    parser.add_argument("source", nargs="?", default="users_db.json", help="TinyDB JSON file to read")
+    parser.add_argument("target", nargs="?", default="empathy_ai.db", help="SQLite database to write")
+    args = parser.parse_args()
+
+    counts = migrate(args.source, args.target)
+    print(f"Migrated {describe(counts)} from {args.source} to {args.target}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+bcrypt hashing and verification, written as plain module-level functions so
+they can run in a process pool: bcrypt is pure CPU and would otherwise hold the
+GIL (or the event loop) for hundreds of milliseconds per call.
+"""
+from passlib.context import CryptContext
+
+DEFAULT_ROUNDS = 12
+
+_contexts = {}
+
+
+def _context(rounds: int) -> CryptContext:
+    context = _contexts.get(rounds)
+    if context is None:
+        context = _contexts[rounds] = CryptContext(
+            schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds
+        )
+    return context
+
+
+def hash_password(password: str, rounds: int = DEFAULT_ROUNDS) -> str:
+    return _context(rounds).hash(password)
+
+
+def verify_password(password: str, hashed_password: str,
+                    rounds: int = DEFAULT_ROUNDS) -> tuple[bool, str | None]:
+    """
+    Checks a password against its stored hash.
+
+    Returns:
+        `(valid, new_hash)`, where `new_hash` is a fresh hash at `rounds` if the
+        password is valid but was stored with a different cost, else None.
+    """
+    return _context(rounds).verify_and_update(password, hashed_password)
@@ -0,0 +1,189 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from execution import Overloaded
+
+
+class FairScheduler:
+    def __init__(self, name: str, max_concurrency: int, per_user_limit: int = 2,
+                 per_user_queue: int = 4, max_queue: int = 0, retry_after: int = 1,
+                 wait_seconds=None):
+        """
+        Shares a fixed number of slots between users with weighted fair queueing,
+        so one busy user queues behind their own requests instead of everyone's.
+
+        Each waiting request gets a virtual finish tag of
+        `max(virtual time, user's previous tag) + 1 / weight`, and free slots go
+        to the smallest tag among users below their in-flight limit. A user
+        sending a burst therefore gets interleaved with everyone else rather
+        than served first.
+
+        A user's bookkeeping (tag and stats) is dropped once they have nothing
+        queued or in flight, so memory stays proportional to active users and
+        per-user stats cover their current stretch of activity.
+
+        Args:
+            name: Used in error messages.
+            max_concurrency: Slots shared by all users.
+            per_user_limit: Slots a single user may hold at once.
+            per_user_queue: Requests a single user may have waiting; beyond this
+                they get 429.
+            max_queue: Requests allowed to wait across all users, beyond which
+                everyone gets 503. 0 means no global limit.
+            retry_after: The Retry-After hint, in seconds, attached to rejections.
+            wait_seconds: An optional histogram observing how long each
+                request waited for its slot.
+        """
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.per_user_limit = max(1, per_user_limit)
+        self.per_user_queue = max(0, per_user_queue)
+        self.max_queue = max(0, max_queue)
+        self.retry_after = retry_after
+        self.wait_seconds = wait_seconds
+
+        self.rejected = 0
+        self._running = 0
+        self._queued = 0
+        self._virtual_time = 0.0
+        # user -> deque of [tag, future, enqueued_at], oldest first
+        self._queues = {}
+        self._in_flight = {}
+        self._last_tag = {}
+        self._users = {}
+
+    def check_admission(self, user: str):
+        """Raises `Overloaded` if a request from `user` would be rejected right now."""
+        if self._can_start(user) and not self._queues.get(user):
+            return
+        if len(self._queues.get(user, ())) >= self.per_user_queue:
+            self.rejected += 1
+            self._user_stats(user)["rejected"] += 1
+            self._prune(user)
+            raise Overloaded(f"{self.name} per-user limit",
+                             self.retry_after, status_code=429)
+        if self.max_queue and self._queued >= self.max_queue:
+            self.rejected += 1
+            self._user_stats(user)["rejected"] += 1
+            self._prune(user)
+            raise Overloaded(self.name, self.retry_after)
+
+    async def acquire(self, user: str, weight: float = 1.0):
+        """Waits for a slot for `user`, or raises `Overloaded` if their queue is full."""
+        self.check_admission(user)
+        self._user_stats(user)
+        tag = max(self._virtual_time, self._last_tag.get(user, 0.0)) + 1.0 / max(weight, 0.01)
+        self._last_tag[user] = tag
+        entry = [tag, asyncio.get_running_loop().create_future(), time.monotonic()]
+        self._queues.setdefault(user, deque()).append(entry)
+        self._queued += 1
+        self._dispatch()
+        try:
+            await entry[1]
+        except asyncio.CancelledError:
+            if entry[1].done() and not entry[1].cancelled():
+                # Granted just as the caller gave up; hand the slot on.
+                self.release(user)
+            else:
+                self._remove(user, entry)
+            raise
+
+    def release(self, user: str):
+        self._running -= 1
+        self._in_flight[user] -= 1
+        if not self._in_flight[user]:
+            del self._in_flight[user]
+        self._user_stats(user)["completed"] += 1
+        self._prune(user)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, user: str, weight: float = 1.0):
+        """Holds one of `user`'s slots for the duration of the block."""
+        await self.acquire(user, weight)
+        try:
+            yield
+        finally:
+            self.release(user)
+
+    def stats(self) -> dict:
+        users = {}
+        for user, stats in self._users.items():
+            users[user] = {
+                "queued": len(self._queues.get(user, ())),
+                "in_flight": self._in_flight.get(user, 0),
+                "completed": stats["completed"],
+                "rejected": stats["rejected"],
+                "mean_wait_ms": stats["wait_total"] / stats["started"] * 1000 if stats["started"] else 0.0,
+                "max_wait_ms": stats["wait_max"] * 1000,
+            }
+        return {
+            "running": self._running,
+            "queued": self._queued,
+            "capacity": self.max_concurrency,
+            "rejected": self.rejected,
+            "users": users,
+        }
+
+    # --- Internals ---
+    def _can_start(self, user: str) -> bool:
+        return (self._running < self.max_concurrency
+                and self._in_flight.get(user, 0) < self.per_user_limit)
+
+    def _user_stats(self, user: str) -> dict:
+        stats = self._users.get(user)
+        if stats is None:
+            stats = self._users[user] = {
+                "started": 0, "completed": 0, "rejected": 0, "wait_total": 0.0, "wait_max": 0.0,
+            }
+        return stats
+
+    def _remove(self, user: str, entry: list):
+        queue = self._queues.get(user)
+        if queue is not None and entry in queue:
+            queue.remove(entry)
+            self._queued -= 1
+            if not queue:
+                del self._queues[user]
+            self._prune(user)
+
+    def _prune(self, user: str):
+        """Forgets `user` once they have nothing queued or in flight."""
+        if user not in self._queues and user not in self._in_flight:
+            self._last_tag.pop(user, None)
+            self._users.pop(user, None)
+
+    def _dispatch(self):
+        while self._running < self.max_concurrency:
+            best = None
+            for user, queue in self._queues.items():
+                if self._in_flight.get(user, 0) >= self.per_user_limit:
+                    continue
+                if best is None or queue[0][0] < self._queues[best][0][0]:
+                    best = user
+            if best is None:
+                return
+
+            queue = self._queues[best]
+            tag, future, enqueued_at = queue.popleft()
+            self._queued -= 1
+            if not queue:
+                del self._queues[best]
+            if future.done():
+                # Cancelled while waiting; `acquire` has nothing left to clean up.
+                self._prune(best)
+                continue
+            self._virtual_time = max(self._virtual_time, tag)
+            self._running += 1
+            self._in_flight[best] = self._in_flight.get(best, 0) + 1
+
+            wait = time.monotonic() - enqueued_at
+            stats = self._user_stats(best)
+            stats["started"] += 1
+            stats["wait_total"] += wait
+            stats["wait_max"] = max(stats["wait_max"], wait)
+            if self.wait_seconds is not None:
+                self.wait_seconds.observe(wait)
+            future.set_result(None)
@@ -0,0 +1,194 @@
+"""
+Runs the backend with several worker processes sharing one copy of the models.
+
+    python serve.py --workers 4 --port 8000
+
+The master process loads the emotion model and tokenizer, freezes the garbage
+collector so later collections don't write to the shared pages, binds the
+listening socket and forks the workers. Workers share the model weights
+copy-on-write, each pins torch to `--threads-per-worker` intra-op threads so
+they don't oversubscribe the cores between them, and each accepts connections
+from the shared socket. A worker that dies is replaced.
+
+Multi-worker mode stores straight to SQLite, which is safe across processes
+in WAL mode: TinyDB is refused, since each process would keep its own copy of
+the file in memory, and the write-behind journal is turned off, since turns
+pending in one worker's journal would be invisible to the others. Caches,
+schedulers and /metrics are per worker, and each worker logs conversations to
+its own file.
+"""
+import argparse
+import gc
+import importlib
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+logger = logging.getLogger("serve")
+
+# Startup phases run once in the master. The rest (the LLM client, warm-up)
+# run in each worker, since they hold connections or threads.
+PRELOAD_PHASES = ["load_emotion_model", "load_tokenizer"]
+
+
+def limit_torch_threads(threads: int):
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+
+
+def prepare_environment():
+    """Checks and adjusts the settings main.py reads at import."""
+    if os.getenv("STORAGE_BACKEND", "sqlite") != "sqlite":
+        sys.exit("Multiple workers need STORAGE_BACKEND=sqlite; TinyDB isn't safe to share between processes.")
+    if os.getenv("JOURNAL_DIR"):
+        logger.warning("Ignoring JOURNAL_DIR: with several workers, turns are written straight to SQLite.")
+    else:
+        logger.info("Write-behind journal off: with several workers, turns are written straight to SQLite.")
+    os.environ["JOURNAL_DIR"] = ""
+
+
+def worker_log_path(path: str, index: int) -> str:
+    root, extension = os.path.splitext(path)
+    return f"{root}.worker-{index}{extension}"
+
+
+class PreforkServer:
+    def __init__(self, app, backend, sock: socket.socket, workers: int, threads_per_worker: int,
+                 log_level: str = "info"):
+        """
+        Args:
+            app: The ASGI app each worker serves.
+            backend: The backend's `main` module, whose storage and logger
+                need per-process set-up.
+            sock: The bound, listening socket the workers accept from.
+            workers: How many worker processes to keep running.
+            threads_per_worker: Torch intra-op threads per worker.
+            log_level: Uvicorn's log level.
+        """
+        self.app = app
+        self.backend = backend
+        self.sock = sock
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.log_level = log_level
+
+        self.children = {}  # pid -> (worker index, spawn time)
+        self.stopping = False
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for index in range(self.workers):
+            self._spawn(index)
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index, spawned_at = self.children.pop(pid, (None, 0.0))
+            if index is None or self.stopping:
+                continue
+            logger.warning("Worker %d (pid %d) exited with status %d; restarting it", index, pid, status)
+            if time.monotonic() - spawned_at < 1.0:
+                # Don't spin if workers die straight away.
+                time.sleep(1.0)
+            self._spawn(index)
+        self.sock.close()
+
+    def _spawn(self, index: int):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = (index, time.monotonic())
+            logger.info("Started worker %d (pid %d)", index, pid)
+            return
+        try:
+            self._serve(index)
+        except BaseException:
+            logger.exception("Worker %d crashed", index)
+            os._exit(1)
+        os._exit(0)
+
+    def _serve(self, index: int):
+        import uvicorn
+
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        os.environ["EMPATHY_WORKER_ID"] = str(index)
+        limit_torch_threads(self.threads_per_worker)
+
+        self.backend.storage.after_fork()
+        self.backend.password_executor.after_fork()
+        if self.backend.conversation_logger is not None:
+            self.backend.conversation_logger.path = worker_log_path(self.backend.conversation_logger.path, index)
+
+        server = uvicorn.Server(uvicorn.Config(self.app, log_level=self.log_level))
+        server.run(sockets=[self.sock])
+
+    def _stop(self, signum, frame):
+        if self.stopping:
+            return
+        self.stopping = True
+        logger.info("Stopping %d workers", len(self.children))
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+def build_parser() -> argparse.ArgumentParser:
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS", str(cores))))
+    parser.add_argument("--threads-per-worker", type=int, default=int(os.getenv("TORCH_THREADS_PER_WORKER", "0")),
+                        help="Torch intra-op threads per worker; defaults to cores / workers")
+    parser.add_argument("--app", default="main:app", help="The app to serve, as module:attribute")
+    parser.add_argument("--log-level", default="info")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    logging.basicConfig(level=args.log_level.upper())
+    workers = max(1, args.workers)
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+
+    prepare_environment()
+    # The master only loads weights; keeping torch single-threaded here means
+    # no thread pool exists to be broken by fork().
+    limit_torch_threads(1)
+    module_name, _, attribute = args.app.partition(":")
+    app = getattr(importlib.import_module(module_name), attribute or "app")
+    backend = sys.modules["main"]
+
+    preload = list(PRELOAD_PHASES)
+    if backend.EMOTION_BACKEND == "onnx":
+        # ONNX Runtime starts its thread pools with the session, so each worker loads its own.
+        preload.remove("load_emotion_model")
+    backend.startup.preload(preload)
+
+    gc.collect()
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    logger.info("Serving on http://%s:%d with %d workers x %d torch threads",
+                args.host, args.port, workers, threads)
+
+    PreforkServer(app, backend, sock, workers, threads, args.log_level).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StartupSequence:
+    def __init__(self, phases: list):
+        """
+        Runs slow startup work (model loading, warm-up) on a background thread so
+        the server can bind and answer health checks straight away.
+
+        Args:
+            phases: `(name, callable)` pairs, run in order. If one raises, the
+                sequence stops and is marked failed.
+        """
+        self.phases = phases
+        self.status = "pending"
+        self.error = None
+        self.timings = {}
+        self.started_at = None
+        self._preloaded = set()
+
+        self._thread = None
+        self._loop = None
+        self._ready = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def start(self):
+        """Starts the phases on a daemon thread. Call from the running event loop."""
+        if self._thread is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+        self.status = "loading"
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="startup", daemon=True)
+        self._thread.start()
+
+    def run_blocking(self):
+        """Runs every phase on the calling thread, for callers that must not proceed until ready."""
+        self.status = "loading"
+        self.started_at = time.monotonic()
+        self._run()
+
+    def preload(self, names: list):
+        """
+        Runs the named phases now, on the calling thread, and skips them when
+        the sequence runs later. Lets a pre-fork master load the models once
+        for all of its workers.
+
+        Raises:
+            Whatever the failing phase raised.
+        """
+        for name, phase in self.phases:
+            if name not in names:
+                continue
+            start = time.perf_counter()
+            phase()
+            self.timings[name] = time.perf_counter() - start
+            self._preloaded.add(name)
+            logger.info("Preloaded startup phase %s in %.2fs", name, self.timings[name])
+
+    async def wait_ready(self, timeout: float) -> bool:
+        """Waits up to `timeout` seconds for the sequence to finish; returns whether it is ready."""
+        if self.ready or self._ready is None or timeout <= 0:
+            return self.ready
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.ready
+
+    def report(self) -> dict:
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        report = {
+            "status": self.status,
+            "phases": {name: round(seconds, 3) for name, seconds in self.timings.items()},
+            "elapsed_seconds": round(elapsed, 3),
+        }
+        if self.error:
+            report["error"] = self.error
+        return report
+
+    def _run(self):
+        for name, phase in self.phases:
+            if name in self._preloaded:
+                continue
+            start = time.perf_counter()
+            try:
+                phase()
+            except Exception as e:
+                self.timings[name] = time.perf_counter() - start
+                self.status = "failed"
+                self.error = f"{name}: {e}"
+                logger.exception("Startup phase %s failed after %.2fs", name, self.timings[name])
+                self._signal()
+                return
+            self.timings[name] = time.perf_counter() - start
+            logger.info("Startup phase %s finished in %.2fs", name, self.timings[name])
+        self.status = "ready"
+        logger.info("Startup complete in %.2fs", sum(self.timings.values()))
+        self._signal()
+
+    def _signal(self):
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._ready.set)
@@ -0,0 +1,545 @@
+import json
+import sqlite3
+import threading
+
+# Optional per-message fields, stored alongside role and content.
+MESSAGE_META_FIELDS = ('emotion', 'scores')
+CONVERSATION_FIELDS = ('title', 'summary', 'summarized_through', 'emotion_stats')
+
+
+class Storage:
+    """
+    Persistence interface for users and conversations.
+
+    Users and conversations are plain dictionaries shaped like the Pydantic
+    models in `main.py`. Messages are addressed by their position in the
+    conversation, which makes appends idempotent: writing the same turns at the
+    same position twice stores them once.
+    """
+
+    def get_user(self, username: str) -> dict | None:
+        raise NotImplementedError
+
+    def create_user(self, user: dict):
+        raise NotImplementedError
+
+    def update_user(self, username: str, fields: dict):
+        raise NotImplementedError
+
+    def create_conversation(self, conversation: dict):
+        """Creates a conversation (without messages) unless it already exists."""
+        raise NotImplementedError
+
+    def update_conversation(self, conversation_id: str, fields: dict):
+        """
+        Updates a conversation's own fields (`title`, the rolling `summary` and
+        `summarized_through`, `emotion_stats`) without touching its messages
+        or versions.
+        """
+        raise NotImplementedError
+
+    def append_messages(self, conversation_id: str, start: int, messages: list):
+        """Stores `messages` at positions `start`, `start + 1`, ... of the conversation."""
+        raise NotImplementedError
+
+    def get_conversation(self, conversation_id: str, after: int | None = None,
+                         tail: int | None = None) -> dict | None:
+        """
+        Returns the conversation and its messages, or None.
+
+        Args:
+            conversation_id: The conversation to load.
+            after: Only return messages at positions greater than this.
+            tail: Only return the last `tail` of the selected messages.
+
+        Returns:
+            The conversation's summary fields plus `messages` and `offset`, the
+            position of the first returned message, and the rolling `summary`
+            of messages before position `summarized_through`.
+        """
+        raise NotImplementedError
+
+    def get_conversation_summary(self, conversation_id: str) -> dict | None:
+        """Returns the conversation's fields (including `version` and `emotion_stats`) without its messages."""
+        raise NotImplementedError
+
+    def get_history_version(self, username: str) -> int:
+        """Returns a counter that changes whenever any of the user's conversations does."""
+        raise NotImplementedError
+
+    def list_conversations(self, username: str, limit: int | None = None,
+                           before: tuple | None = None, since_version: int | None = None) -> list:
+        """
+        Returns summaries (id, title, timestamp, message_count, version) of the
+        user's conversations, newest first, without reading any messages.
+
+        Args:
+            username: The owner of the conversations.
+            limit: The maximum number of summaries to return.
+            before: A `(timestamp, id)` pair; only conversations ordered after
+                it (i.e. older) are returned. Used for cursor pagination.
+            since_version: Only return conversations created or changed after
+                the user's history was at this version.
+        """
+        raise NotImplementedError
+
+    async def append_turns(self, conversation_id: str, username: str, start: int,
+                           messages: list, conversation: dict | None = None,
+                           updates: dict | None = None):
+        """
+        Durably stores new turns of a conversation.
+
+        Args:
+            conversation_id: The conversation the turns belong to.
+            username: The conversation's owner.
+            start: The position of the first new turn.
+            messages: The new turns.
+            conversation: The conversation's metadata, when these turns start it.
+            updates: Conversation fields to set with `update_conversation`
+                along with the turns.
+        """
+        self.store_turns(conversation_id, username, start, messages, conversation, updates)
+
+    def store_turns(self, conversation_id: str, username: str, start: int, messages: list,
+                    conversation: dict | None = None, updates: dict | None = None):
+        """Blocking form of `append_turns`, for callers running it on a worker thread."""
+        if conversation is not None:
+            self.create_conversation(conversation)
+        self.append_messages(conversation_id, start, messages)
+        if updates:
+            self.update_conversation(conversation_id, updates)
+
+    def after_fork(self):
+        """
+        Drops any connections inherited from a parent process. Call in a
+        forked child before touching the storage.
+        """
+
+    def close(self):
+        pass
+
+
+def _message_fields(message: dict) -> dict:
+    fields = {'role': message['role'], 'content': message['content']}
+    for key in MESSAGE_META_FIELDS:
+        if message.get(key) is not None:
+            fields[key] = message[key]
+    return fields
+
+
+def _encode_meta(message: dict) -> str | None:
+    meta = {key: message[key] for key in MESSAGE_META_FIELDS if message.get(key) is not None}
+    return json.dumps(meta) if meta else None
+
+
+def _decode_message(row) -> dict:
+    message = {'role': row['role'], 'content': row['content']}
+    if row['meta']:
+        message.update(json.loads(row['meta']))
+    return message
+
+
+class TinyDBStorage(Storage):
+    def __init__(self, path: str):
+        """
+        Stores everything in a single TinyDB JSON file. Every write rewrites the
+        whole file and every lookup is a scan, so this is meant for development.
+        """
+        from tinydb import TinyDB, where
+
+        self._where = where
+        self.db = TinyDB(path)
+        self.users_table = self.db.table('users')
+        self.chat_history_table = self.db.table('chat_history')
+        # Per-user summaries, kept in step with chat_history so the history
+        # list never has to load message bodies.
+        self.summaries_table = self.db.table('conversation_summaries')
+        self._lock = threading.Lock()
+        if not len(self.summaries_table) and len(self.chat_history_table):
+            self.summaries_table.insert_multiple(
+                self._summary(chat) for chat in self.chat_history_table.all()
+            )
+
+    @staticmethod
+    def _summary(conversation: dict) -> dict:
+        return {
+            'id': conversation['id'],
+            'username': conversation['username'],
+            'title': conversation['title'],
+            'timestamp': conversation['timestamp'],
+            'message_count': len(conversation.get('messages', [])),
+            'version': conversation.get('version', 0),
+            'user_version': conversation.get('user_version', 0),
+        }
+
+    def _touch(self, conversation_id: str, username: str, message_count: int):
+        """Bumps the conversation's and its owner's versions after a change."""
+        user = self.users_table.get(self._where('username') == username)
+        history_version = user.get('history_version', 0) + 1 if user else 0
+        if user:
+            self.users_table.update({'history_version': history_version},
+                                    self._where('username') == username)
+
+        def bump(doc):
+            doc['version'] = doc.get('version', 0) + 1
+            doc['user_version'] = history_version
+            doc['message_count'] = message_count
+
+        self.summaries_table.update(bump, self._where('id') == conversation_id)
+        self.chat_history_table.update(
+            lambda doc: doc.update(version=doc.get('version', 0) + 1, user_version=history_version),
+            self._where('id') == conversation_id,
+        )
+
+    def get_user(self, username):
+        return self.users_table.get(self._where('username') == username)
+
+    def create_user(self, user):
+        with self._lock:
+            self.users_table.insert(dict(user))
+
+    def update_user(self, username, fields):
+        with self._lock:
+            self.users_table.update(dict(fields), self._where('username') == username)
+
+    def create_conversation(self, conversation):
+        with self._lock:
+            if self.chat_history_table.contains(self._where('id') == conversation['id']):
+                return
+            doc = {key: value for key, value in conversation.items() if key != 'messages'}
+            doc['messages'] = []
+            self.chat_history_table.insert(doc)
+            self.summaries_table.insert(self._summary(doc))
+            self._touch(doc['id'], doc['username'], 0)
+
+    def update_conversation(self, conversation_id, fields):
+        fields = {key: fields[key] for key in CONVERSATION_FIELDS if key in fields}
+        if not fields:
+            return
+        summary_fields = {key: fields[key] for key in ('title', 'emotion_stats') if key in fields}
+        with self._lock:
+            self.chat_history_table.update(fields, self._where('id') == conversation_id)
+            if summary_fields:
+                self.summaries_table.update(summary_fields, self._where('id') == conversation_id)
+
+    def append_messages(self, conversation_id, start, messages):
+        with self._lock:
+            doc = self.chat_history_table.get(self._where('id') == conversation_id)
+            if doc is None:
+                raise KeyError(conversation_id)
+            stored = doc['messages']
+            if start > len(stored):
+                raise ValueError(
+                    f"Cannot append at position {start}; conversation has {len(stored)} messages"
+                )
+            new = messages[len(stored) - start:]
+            if not new:
+                return
+            self.chat_history_table.update(
+                {'messages': stored + [_message_fields(m) for m in new]},
+                self._where('id') == conversation_id,
+            )
+            self._touch(conversation_id, doc['username'], len(stored) + len(new))
+
+    def get_conversation(self, conversation_id, after=None, tail=None):
+        doc = self.chat_history_table.get(self._where('id') == conversation_id)
+        if doc is None:
+            return None
+        conversation = self.get_conversation_summary(conversation_id)
+        offset = 0 if after is None else min(max(0, after + 1), len(doc['messages']))
+        messages = doc['messages'][offset:]
+        if tail is not None:
+            skip = max(0, len(messages) - tail)
+            offset += skip
+            messages = messages[skip:]
+        conversation['messages'] = messages
+        conversation['offset'] = offset
+        conversation['summary'] = doc.get('summary', '')
+        conversation['summarized_through'] = doc.get('summarized_through', 0)
+        return conversation
+
+    def get_conversation_summary(self, conversation_id):
+        summary = self.summaries_table.get(self._where('id') == conversation_id)
+        if summary is None:
+            return None
+        result = {key: summary.get(key, 0) for key in
+                  ('id', 'username', 'title', 'timestamp', 'message_count', 'version')}
+        result['emotion_stats'] = summary.get('emotion_stats', {})
+        return result
+
+    def get_history_version(self, username):
+        user = self.users_table.get(self._where('username') == username)
+        return user.get('history_version', 0) if user else 0
+
+    def list_conversations(self, username, limit=None, before=None, since_version=None):
+        user_chats = self.summaries_table.search(self._where('username') == username)
+        # Sort by timestamp, newest first
+        sorted_chats = sorted(user_chats, key=lambda x: (x['timestamp'], x['id']), reverse=True)
+        if before is not None:
+            sorted_chats = [chat for chat in sorted_chats if (chat['timestamp'], chat['id']) < tuple(before)]
+        if since_version is not None:
+            sorted_chats = [chat for chat in sorted_chats if chat.get('user_version', 0) > since_version]
+        if limit is not None:
+            sorted_chats = sorted_chats[:limit]
+        return [
+            {key: chat.get(key, 0) for key in ('id', 'title', 'timestamp', 'message_count', 'version')}
+            for chat in sorted_chats
+        ]
+
+    def close(self):
+        self.db.close()
+
+
+# Each entry upgrades the schema by one version (tracked in PRAGMA user_version).
+SQLITE_MIGRATIONS = [
+    """
+    CREATE TABLE users (
+        username TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        hashed_password TEXT NOT NULL
+    );
+    CREATE TABLE conversations (
+        id TEXT PRIMARY KEY,
+        username TEXT NOT NULL,
+        title TEXT NOT NULL,
+        timestamp TEXT NOT NULL
+    );
+    CREATE INDEX conversations_by_user ON conversations (username, timestamp);
+    CREATE TABLE messages (
+        conversation_id TEXT NOT NULL REFERENCES conversations (id),
+        position INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        PRIMARY KEY (conversation_id, position)
+    ) WITHOUT ROWID;
+    """,
+    # Summary columns for the history list, maintained on every append.
+    """
+    ALTER TABLE conversations ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0;
+    UPDATE conversations SET message_count = (
+        SELECT COUNT(*) FROM messages WHERE messages.conversation_id = conversations.id
+    );
+    DROP INDEX conversations_by_user;
+    CREATE INDEX conversations_by_user ON conversations (username, timestamp, id);
+    """,
+    # Version counters behind the ETags and delta sync of the history API.
+    """
+    ALTER TABLE users ADD COLUMN history_version INTEGER NOT NULL DEFAULT 0;
+    ALTER TABLE conversations ADD COLUMN version INTEGER NOT NULL DEFAULT 0;
+    ALTER TABLE conversations ADD COLUMN user_version INTEGER NOT NULL DEFAULT 0;
+    UPDATE conversations SET version = message_count;
+    CREATE INDEX conversations_by_user_version ON conversations (username, user_version);
+    """,
+    # Rolling summary of the turns that no longer fit in the LLM context.
+    """
+    ALTER TABLE conversations ADD COLUMN summary TEXT NOT NULL DEFAULT '';
+    ALTER TABLE conversations ADD COLUMN summarized_through INTEGER NOT NULL DEFAULT 0;
+    """,
+    # Per-message emotion data (JSON) and running per-conversation aggregates.
+    """
+    ALTER TABLE messages ADD COLUMN meta TEXT;
+    ALTER TABLE conversations ADD COLUMN emotion_stats TEXT NOT NULL DEFAULT '{}';
+    """,
+    # Per-user share of the LLM slots, read by the fair-share scheduler.
+    """
+    ALTER TABLE users ADD COLUMN llm_weight REAL NOT NULL DEFAULT 1.0;
+    """,
+]
+
+
+class SQLiteStorage(Storage):
+    def __init__(self, path: str):
+        """
+        Stores users and conversations in SQLite running in WAL mode, so readers
+        never block the writer and a new turn costs one small INSERT.
+        Connections are opened per thread.
+        """
+        self.path = path
+        self._local = threading.local()
+        self._migrate()
+
+    def after_fork(self):
+        # SQLite connections must not be used across fork(); the parent's stay
+        # open in the parent, and this process opens its own.
+        self._local = threading.local()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            # With WAL, NORMAL only risks the last transactions on power loss,
+            # never corruption.
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _migrate(self):
+        conn = self.conn
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, script in enumerate(SQLITE_MIGRATIONS[version:], start=version + 1):
+            conn.executescript(f"BEGIN; {script.strip()} PRAGMA user_version = {number}; COMMIT;")
+
+    def get_user(self, username):
+        row = self.conn.execute(
+            "SELECT username, name, hashed_password, llm_weight FROM users WHERE username = ?",
+            (username,),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def create_user(self, user):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO users (username, name, hashed_password, llm_weight) VALUES (?, ?, ?, ?)",
+                (user['username'], user['name'], user['hashed_password'], user.get('llm_weight', 1.0)),
+            )
+
+    def update_user(self, username, fields):
+        columns = [column for column in ('name', 'hashed_password', 'llm_weight') if column in fields]
+        if not columns:
+            return
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        with self.conn:
+            self.conn.execute(
+                f"UPDATE users SET {assignments} WHERE username = ?",
+                [fields[column] for column in columns] + [username],
+            )
+
+    def _touch(self, conversation_id: str):
+        """Bumps the conversation's and its owner's versions; call inside a transaction."""
+        self.conn.execute(
+            "UPDATE users SET history_version = history_version + 1 "
+            "WHERE username = (SELECT username FROM conversations WHERE id = ?)",
+            (conversation_id,),
+        )
+        self.conn.execute(
+            "UPDATE conversations SET version = version + 1, user_version = "
+            "COALESCE((SELECT history_version FROM users WHERE username = conversations.username), 0) "
+            "WHERE id = ?",
+            (conversation_id,),
+        )
+
+    def create_conversation(self, conversation):
+        with self.conn:
+            created = self.conn.execute(
+                "INSERT OR IGNORE INTO conversations (id, username, title, timestamp) "
+                "VALUES (?, ?, ?, ?)",
+                (conversation['id'], conversation['username'],
+                 conversation['title'], conversation['timestamp']),
+            ).rowcount
+            if created:
+                self._touch(conversation['id'])
+
+    def update_conversation(self, conversation_id, fields):
+        columns = [column for column in CONVERSATION_FIELDS if column in fields]
+        if not columns:
+            return
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        values = [
+            json.dumps(fields[column]) if column == 'emotion_stats' else fields[column]
+            for column in columns
+        ]
+        with self.conn:
+            self.conn.execute(
+                f"UPDATE conversations SET {assignments} WHERE id = ?",
+                values + [conversation_id],
+            )
+
+    def append_messages(self, conversation_id, start, messages):
+        with self.conn:
+            inserted = self.conn.executemany(
+                "INSERT OR IGNORE INTO messages (conversation_id, position, role, content, meta) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (conversation_id, start + offset, message['role'], message['content'], _encode_meta(message))
+                    for offset, message in enumerate(messages)
+                ],
+            ).rowcount
+            if inserted > 0:
+                self.conn.execute(
+                    "UPDATE conversations SET message_count = message_count + ? WHERE id = ?",
+                    (inserted, conversation_id),
+                )
+                self._touch(conversation_id)
+
+    def get_conversation(self, conversation_id, after=None, tail=None):
+        row = self.conn.execute(
+            "SELECT id, username, title, timestamp, message_count, version, emotion_stats, "
+            "summary, summarized_through FROM conversations WHERE id = ?",
+            (conversation_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        conversation = dict(row)
+        conversation['emotion_stats'] = json.loads(conversation['emotion_stats'])
+        query = "SELECT position, role, content, meta FROM messages WHERE conversation_id = ?"
+        params = [conversation_id]
+        if after is not None:
+            query += " AND position > ?"
+            params.append(after)
+        if tail is not None:
+            # Newest `tail` rows via the primary key, flipped back below.
+            query += " ORDER BY position DESC LIMIT ?"
+            params.append(tail)
+            rows = self.conn.execute(query, params).fetchall()[::-1]
+        else:
+            query += " ORDER BY position"
+            rows = self.conn.execute(query, params).fetchall()
+        conversation['messages'] = [_decode_message(row) for row in rows]
+        if rows:
+            conversation['offset'] = rows[0]['position']
+        else:
+            conversation['offset'] = conversation['message_count']
+        return conversation
+
+    def get_conversation_summary(self, conversation_id):
+        row = self.conn.execute(
+            "SELECT id, username, title, timestamp, message_count, version, emotion_stats "
+            "FROM conversations WHERE id = ?",
+            (conversation_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        summary = dict(row)
+        summary['emotion_stats'] = json.loads(summary['emotion_stats'])
+        return summary
+
+    def get_history_version(self, username):
+        row = self.conn.execute(
+            "SELECT history_version FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def list_conversations(self, username, limit=None, before=None, since_version=None):
+        query = ("SELECT id, title, timestamp, message_count, version FROM conversations "
+                 "WHERE username = ?")
+        params = [username]
+        if before is not None:
+            query += " AND (timestamp, id) < (?, ?)"
+            params.extend(before)
+        if since_version is not None:
+            query += " AND user_version > ?"
+            params.append(since_version)
+        query += " ORDER BY timestamp DESC, id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self.conn.execute(query, params)]
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def open_storage(backend: str, path: str) -> Storage:
+    """Opens the storage backend named by `backend` ("sqlite" or "tinydb")."""
+    if backend == "sqlite":
+        return SQLiteStorage(path)
+    if backend == "tinydb":
+        return TinyDBStorage(path)
+    raise ValueError(f"Unknown storage backend: {backend!r}")
@@ -0,0 +1,43 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+# The backend's modules are imported top-level (`import storage`), as main.py does.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# The torch-free configuration, with everything written under a temporary directory.
+APP_ENV = {
+    "STORAGE_BACKEND": "sqlite",
+    "JOURNAL_DIR": "",
+    "CONVERSATION_LOG": "",
+    "EMOTION_BACKEND": "lexicon",
+    "LLM_CLIENT": "none",
+    "LLM_TOKENIZER": "",
+    "SEMANTIC_CACHE": "0",
+    "LOG_LEVEL": "WARNING",
+}
+
+
+@pytest.fixture(scope="session")
+def app_main(tmp_path_factory):
+    """The `main` module, imported once for the session against a scratch database."""
+    directory = tmp_path_factory.mktemp("app")
+    with pytest.MonkeyPatch.context() as patch:
+        for name, value in APP_ENV.items():
+            patch.setenv(name, value)
+        patch.setenv("DATABASE_PATH", str(directory / "empathy_ai.db"))
+        patch.setenv("TINYDB_LEGACY_PATH", str(directory / "users_db.json"))
+        sys.modules.pop("main", None)
+        yield importlib.import_module("main")
+
+
+@pytest.fixture(scope="session")
+def client(app_main):
+    """A test client for the app. Its lifespan, which shuts the executors down, spans the session."""
+    from fastapi.testclient import TestClient
+
+    with TestClient(app_main.app) as client:
+        yield client
@@ -0,0 +1,76 @@
+import asyncio
+import time
+from datetime import timedelta
+
+from auth_cache import ExpiringCache
+
+
+def test_entries_expire_after_ttl():
+    cache = ExpiringCache("test", ttl=0.05)
+    cache.put("alice", {"name": "Alice"})
+    assert cache.get("alice") == {"name": "Alice"}
+    time.sleep(0.06)
+    assert cache.get("alice") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_entries_expire_at_their_own_time_within_the_ttl():
+    cache = ExpiringCache("test", ttl=60)
+    cache.put("soon", "a", expires_at=time.time() + 0.05)
+    cache.put("expired", "b", expires_at=time.time() - 1)
+    assert cache.get("expired") is None
+    time.sleep(0.06)
+    assert cache.get("soon") is None
+
+
+def test_the_least_recently_used_entry_is_evicted():
+    cache = ExpiringCache("test", max_entries=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1 and cache.stats()["entries"] == 2
+
+
+def test_a_zero_size_cache_stores_nothing():
+    cache = ExpiringCache("test", max_entries=0, ttl=60)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+
+
+def test_invalidate():
+    cache = ExpiringCache("test", ttl=60)
+    cache.put("a", 1)
+    cache.invalidate("a")
+    cache.invalidate("missing")
+    assert cache.get("a") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_updating_a_user_drops_their_cached_record(app_main, client):
+    app_main.storage.create_user({'username': 'cached', 'name': 'Before', 'hashed_password': 'old'})
+    headers = {"Authorization": f"Bearer {app_main.create_access_token({'sub': 'cached'})}"}
+    assert client.get("/users/me", headers=headers).json()["name"] == "Before"
+
+    # Written behind the cache's back: still served from the cache.
+    app_main.storage.update_user('cached', {'name': 'Sideways'})
+    assert client.get("/users/me", headers=headers).json()["name"] == "Before"
+
+    # A password change (or rehash on login) goes through update_user_record.
+    asyncio.run(app_main.update_user_record('cached', {'name': 'After', 'hashed_password': 'new'}))
+    assert client.get("/users/me", headers=headers).json()["name"] == "After"
+    assert app_main.user_cache.get('cached')['hashed_password'] == 'new'
+
+
+def test_tokens_are_cached_until_they_expire(app_main, client):
+    app_main.storage.create_user({'username': 'tokens', 'name': 'tokens', 'hashed_password': 'x'})
+    token = app_main.create_access_token({'sub': 'tokens'}, timedelta(minutes=5))
+    assert client.get("/users/me", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+    assert app_main.token_cache.get(token) == 'tokens'
+
+    expired = app_main.create_access_token({'sub': 'tokens'}, timedelta(seconds=-5))
+    assert client.get("/users/me", headers={"Authorization": f"Bearer {expired}"}).status_code == 401
+    assert app_main.token_cache.get(expired) is None
+    assert client.get("/users/me", headers={"Authorization": "Bearer not-a-token"}).status_code == 401
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+
+import pytest
+
+from empathy_ai.batching import EmotionBatcher
+
+
+class StubDetector:
+    """Records the batches it is given; each result just echoes the text."""
+
+    def __init__(self, release=None):
+        self.batches = []
+        self.release = release
+
+    def detect_emotions(self, texts):
+        if self.release is not None:
+            self.release.wait(5)
+        self.batches.append(list(texts))
+        return [{"emotion": "neutral", "confidence": 1.0, "text": text} for text in texts]
+
+
+async def detect_all(batcher, texts):
+    try:
+        return await asyncio.gather(*(batcher.detect_emotion(text) for text in texts))
+    finally:
+        await batcher.stop()
+
+
+def test_concurrent_messages_share_a_batch():
+    detector = StubDetector()
+    batcher = EmotionBatcher(detector, max_batch_size=16, max_wait_ms=50)
+    results = asyncio.run(detect_all(batcher, ["a", "b", "c", "d", "e"]))
+
+    assert [result["text"] for result in results] == ["a", "b", "c", "d", "e"]
+    assert detector.batches == [["a", "b", "c", "d", "e"]]
+    assert batcher.stats()["batch_sizes"] == {5: 1}
+
+
+def test_batches_are_capped_at_max_batch_size():
+    detector = StubDetector()
+    batcher = EmotionBatcher(detector, max_batch_size=2, max_wait_ms=50)
+    asyncio.run(detect_all(batcher, ["a", "b", "c", "d", "e"]))
+
+    assert detector.batches == [["a", "b"], ["c", "d"], ["e"]]
+    assert batcher.stats()["mean_batch_size"] == 5 / 3
+
+
+def test_a_lone_message_is_flushed_after_max_wait():
+    detector = StubDetector()
+    batcher = EmotionBatcher(detector, max_batch_size=16, max_wait_ms=20)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        try:
+            started = loop.time()
+            await batcher.detect_emotion("a")
+            waited = loop.time() - started
+            # Arrives after the first batch's window closed, so it gets its own.
+            await batcher.detect_emotion("b")
+            return waited
+        finally:
+            await batcher.stop()
+
+    waited = asyncio.run(run())
+    assert 0.015 <= waited < 1.0
+    assert detector.batches == [["a"], ["b"]]
+
+
+def test_a_full_queue_rejects_new_messages():
+    release = threading.Event()
+    batcher = EmotionBatcher(StubDetector(release), max_batch_size=1, max_wait_ms=0, max_queue=1)
+
+    async def run():
+        running = asyncio.ensure_future(batcher.detect_emotion("running"))
+        await asyncio.sleep(0.05)
+        queued = asyncio.ensure_future(batcher.detect_emotion("queued"))
+        await asyncio.sleep(0)
+        try:
+            with pytest.raises(asyncio.QueueFull):
+                await batcher.detect_emotion("rejected")
+        finally:
+            release.set()
+        await asyncio.gather(running, queued)
+        await batcher.stop()
+
+    asyncio.run(run())
+    assert batcher.stats()["rejected"] == 1
+
+
+def test_a_full_queue_is_a_503_with_retry_after(app_main, client, monkeypatch):
+    class FullBatcher:
+        async def detect_emotion(self, text):
+            raise asyncio.QueueFull
+
+    app_main.storage.create_user({'username': 'batched', 'name': 'batched', 'hashed_password': 'x'})
+    headers = {"Authorization": f"Bearer {app_main.create_access_token({'sub': 'batched'})}"}
+    monkeypatch.setattr(app_main, "emotion_batcher", FullBatcher())
+
+    response = client.post("/chat", json={"user_message": "hello"}, headers=headers)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(app_main.RETRY_AFTER_SECONDS)
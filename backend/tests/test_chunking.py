@@ -0,0 +1,84 @@
+import re
+
+import pytest
+
+from empathy_ai.emotion_detector import EmotionDetector
+
+
+class WordTokenizer:
+    """A fast-tokenizer stand-in with one token per word."""
+
+    is_fast = True
+
+    def __call__(self, texts, add_special_tokens=False, return_offsets_mapping=False):
+        if return_offsets_mapping:
+            return {"offset_mapping": [match.span() for match in re.finditer(r"\S+", texts)]}
+        return {"input_ids": [text.split() for text in texts]}
+
+
+def detector(max_chunk_tokens=8, max_chunks=8):
+    """The lexicon backend, chunking as if it had a tokenizer."""
+    detector = EmotionDetector(backend="lexicon", use_cache=False, max_chunks=max_chunks)
+    detector.tokenizer = WordTokenizer()
+    detector.max_chunk_tokens = max_chunk_tokens
+    return detector
+
+
+def texts(text, spans):
+    return [text[start:end] for start, end, _ in spans]
+
+
+def test_the_lexicon_backend_never_chunks():
+    plain = EmotionDetector(backend="lexicon", use_cache=False, max_chunk_tokens=16)
+    assert plain.chunk_spans("I am sad. " * 50) == [(0, 500, None)]
+
+
+def test_short_messages_are_one_chunk():
+    assert detector().chunk_spans("I am sad") == [(0, 8, None)]
+    assert detector().chunk_spans("I am sad. You are not.") == [(0, 22, 6)]
+
+
+def test_sentences_are_packed_up_to_the_limit():
+    text = "One two three four. Five six seven. Eight nine ten eleven. Twelve."
+    spans = detector(max_chunk_tokens=8).chunk_spans(text)
+    assert [tokens for _, _, tokens in spans] == [7, 5]
+    assert texts(text, spans) == ["One two three four. Five six seven. ", "Eight nine ten eleven. Twelve."]
+    # Chunks cover the whole message, in order.
+    assert spans[0][0] == 0 and spans[0][1] == spans[1][0] and spans[-1][1] == len(text)
+
+
+def test_a_long_sentence_is_cut_at_token_boundaries():
+    text = " ".join(f"w{i}" for i in range(20)) + "."
+    spans = detector(max_chunk_tokens=8).chunk_spans(text)
+    assert [tokens for _, _, tokens in spans] == [8, 8, 4]
+    assert texts(text, spans)[1] == "w8 w9 w10 w11 w12 w13 w14 w15"
+    assert spans[0][0] == 0 and spans[-1][1] == len(text)
+
+
+def test_max_chunks_keeps_an_even_spread_with_the_ends():
+    text = " ".join(f"Sentence {i} here." for i in range(10))
+    spans = detector(max_chunk_tokens=3, max_chunks=3).chunk_spans(text)
+    assert [chunk.strip() for chunk in texts(text, spans)] == [
+        "Sentence 0 here.", "Sentence 4 here.", "Sentence 9 here.",
+    ]
+    one = detector(max_chunk_tokens=3, max_chunks=1).chunk_spans(text)
+    assert texts(text, one) == ["Sentence 0 here. "]
+
+
+def test_chunk_scores_are_averaged_by_tokens():
+    result = detector()._aggregate(
+        [(0, 10, 3), (10, 20, 1), (20, 25, None)],
+        [{"joy": 1.0, "sadness": 0.0}, {"joy": 0.0, "sadness": 1.0}, {"joy": 0.0, "sadness": 1.0}],
+    )
+    assert result["scores"] == pytest.approx({"joy": 0.6, "sadness": 0.4})
+    assert result["emotion"] == "joy" and result["confidence"] == 0.6
+    assert [chunk["emotion"] for chunk in result["chunks"]] == ["joy", "sadness", "sadness"]
+    assert result["chunks"][2] == {"start": 20, "end": 25, "tokens": None, "emotion": "sadness", "confidence": 1.0}
+
+
+def test_long_messages_carry_their_emotional_arc():
+    text = "I am so happy and excited today. " * 3 + "Now I feel sad and lonely and miserable. " * 3
+    result = detector(max_chunk_tokens=14).detect_emotion(text.strip())
+    assert [chunk["emotion"] for chunk in result["chunks"]] == ["joy", "joy", "sadness", "sadness", "sadness"]
+    assert result["chunks"][0]["start"] == 0 and result["chunks"][-1]["end"] == len(text.strip())
+    assert set(result["scores"]) == {"anger", "disgust", "fear", "joy", "neutral", "sadness", "surprise"}
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from bench.stub_llm import REPLY, make_server
+from empathy_ai.circuit_breaker import CircuitBreaker
+from empathy_ai.llm_client import AsyncLLMClient
+from empathy_ai.response_generator import ResponseGenerator
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.stats() == {"state": "open", "consecutive_failures": 3, "opened": 1, "rejected": 1}
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # A failed probe reopens it for another reset_timeout.
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.opened == 2
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_a_lost_probe_does_not_wedge_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    # The probe never reports back.
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+
+
+def test_generator_skips_a_failing_llm_until_it_recovers():
+    server = make_server(port=0, latency_ms=5.0, jitter_ms=0.0, error_rate=1.0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stats = server.RequestHandlerClass.stats
+
+    async def run():
+        client = AsyncLLMClient(f"http://127.0.0.1:{server.server_address[1]}/v1", max_retries=0)
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+        generator = ResponseGenerator(llm_client=client, breaker=breaker, sync_client=False)
+        try:
+            for _ in range(2):
+                assert await generator.agenerate_response("sadness", "hi") != REPLY
+            assert breaker.state == "open"
+
+            seen = stats["requests"]
+            await generator.agenerate_response("sadness", "hi")
+            assert stats["requests"] == seen
+            assert generator.stats()["fallbacks"] == {"error": 2, "circuit_open": 1}
+
+            server.RequestHandlerClass.config.error_rate = 0.0
+            await asyncio.sleep(0.25)
+            assert await generator.agenerate_response("sadness", "hi") == REPLY
+            assert breaker.state == "closed"
+        finally:
+            await client.aclose()
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_an_abandoned_stream_does_not_keep_the_probe():
+    server = make_server(port=0, latency_ms=300.0, jitter_ms=0.0, chunk_delay_ms=1.0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def half_open_breaker():
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        return breaker
+
+    async def run():
+        client = AsyncLLMClient(f"http://127.0.0.1:{server.server_address[1]}/v1", max_retries=0)
+        try:
+            # The client goes away before the first token: the probe is handed back.
+            breaker = half_open_breaker()
+            generator = ResponseGenerator(llm_client=client, breaker=breaker, sync_client=False)
+            stream = generator.astream_response("sadness", "hi")
+            first = asyncio.ensure_future(stream.__anext__())
+            await asyncio.sleep(0.05)
+            first.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            assert breaker.state == "half_open"
+            assert breaker.allow()
+
+            # Tokens were arriving when the client went away: the provider is fine.
+            breaker = half_open_breaker()
+            generator = ResponseGenerator(llm_client=client, breaker=breaker, sync_client=False)
+            stream = generator.astream_response("sadness", "hi")
+            assert await stream.__anext__()
+            await stream.aclose()
+            assert breaker.state == "closed"
+        finally:
+            await client.aclose()
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.shutdown()
+        server.server_close()
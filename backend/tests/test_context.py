@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+
+from empathy_ai.context import ContextBuilder, TokenCounter, fold_summary, format_turn
+
+COUNTER = TokenCounter()
+
+
+def conversation(count):
+    return [
+        SimpleNamespace(role="user" if i % 2 == 0 else "ai", content=f"Message number {i}. It goes on a while.")
+        for i in range(count)
+    ]
+
+
+def cost(turns):
+    return sum(COUNTER.count(format_turn(turn)) for turn in turns)
+
+
+def test_short_conversations_fit_whole():
+    turns = conversation(4)
+    context = ContextBuilder(COUNTER, budget=1000).build(turns, offset=0)
+    assert context["turns"] == turns
+    assert context["summary"] == "" and not context["changed"]
+    assert context["tokens"] == cost(turns)
+
+
+def test_oldest_turns_are_dropped_into_the_summary():
+    turns = conversation(10)
+    builder = ContextBuilder(COUNTER, budget=cost(turns[-3:]), summary_budget=30)
+    context = builder.build(turns, offset=0)
+
+    assert context["turns"] == turns[-3:]
+    assert context["changed"] and context["summarized_through"] == 7
+    assert context["summary"].split("\n")[-1] == "User: Message number 6."
+    assert COUNTER.count(context["summary"]) <= 30
+    assert context["tokens"] == cost(turns[-3:]) + COUNTER.count(context["summary"])
+
+    # Next time the stored summary's share comes out of the budget first,
+    # leaving room for the new message only.
+    turns.append(SimpleNamespace(role="ai", content="Message number 10. It goes on a while."))
+    context = builder.build(turns, offset=0, summary=context["summary"], summarized_through=7)
+    assert context["turns"] == turns[-1:]
+    assert context["summarized_through"] == 10
+
+
+def test_the_new_message_is_always_kept():
+    turns = conversation(3)
+    context = ContextBuilder(COUNTER, budget=1).build(turns, offset=0)
+    assert context["turns"] == turns[-1:]
+    assert context["summarized_through"] == 2
+
+
+def test_only_newly_dropped_turns_are_summarized():
+    folded = []
+
+    def summarize(summary, turns):
+        folded.append([turn.content for turn in turns])
+        return fold_summary(summary, turns)
+
+    turns = conversation(12)
+    builder = ContextBuilder(COUNTER, budget=cost(turns[-3:]), summary_budget=0, summarize=summarize)
+    first = builder.build(turns[:10], offset=0)
+    assert first["summarized_through"] == 7
+    # Two more turns arrive; the stored summary already covers the first seven.
+    second = builder.build(turns[2:], offset=2, summary=first["summary"],
+                           summarized_through=first["summarized_through"])
+    assert second["summarized_through"] == 9
+    assert folded[1] == [turn.content for turn in turns[7:9]]
+    # Within budget, nothing new is dropped and the summary is left alone.
+    third = builder.build(turns[9:], offset=9, summary=second["summary"], summarized_through=9)
+    assert not third["changed"] and len(folded) == 2
+
+
+def test_summary_is_trimmed_from_its_oldest_lines():
+    builder = ContextBuilder(COUNTER, budget=0, summary_budget=20)
+    summary = builder._trim("\n".join(f"User: line {i} of the summary" for i in range(10)))
+    assert COUNTER.count(summary) <= 20
+    assert summary.endswith("line 9 of the summary")
+
+
+def test_fold_summary_keeps_the_first_sentence_clipped():
+    turns = [
+        SimpleNamespace(role="user", content="I lost my job today.  And then   it rained."),
+        SimpleNamespace(role="ai", content="x" * 200),
+    ]
+    lines = fold_summary("Earlier line", turns, line_chars=20).split("\n")
+    assert lines == ["Earlier line", "User: I lost my job today.", "AI: " + "x" * 17 + "..."]
@@ -0,0 +1,64 @@
+import time
+
+from empathy_ai.emotion_detector import EmotionCache
+
+RESULT = {"emotion": "sadness", "confidence": 0.9, "scores": {"sadness": 0.9, "joy": 0.1}}
+
+
+def test_normalized_text_shares_an_entry():
+    cache = EmotionCache()
+    cache.put("I'm  SAD!!", RESULT)
+    assert cache.get("im sad") == RESULT
+    assert EmotionCache(strip_punctuation=False).get("im sad") is None
+
+
+def test_results_are_copied():
+    cache = EmotionCache()
+    cache.put("sad", RESULT)
+    cache.get("sad")["scores"]["joy"] = 1.0
+    assert cache.get("sad") == RESULT
+
+
+def test_entries_expire_after_ttl():
+    cache = EmotionCache(ttl=0.05)
+    cache.put("sad", RESULT)
+    assert cache.get("sad") == RESULT
+    time.sleep(0.06)
+    assert cache.get("sad") is None
+    stats = cache.stats()
+    assert stats["expirations"] == 1 and stats["entries"] == 0 and stats["bytes"] == 0
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = EmotionCache(max_entries=2)
+    cache.put("one", RESULT)
+    cache.put("two", RESULT)
+    cache.get("one")
+    cache.put("three", RESULT)
+
+    assert cache.get("two") is None
+    assert cache.get("one") == RESULT and cache.get("three") == RESULT
+    assert cache.stats()["evictions"] == 1
+
+
+def test_max_bytes_bounds_the_cache():
+    probe = EmotionCache()
+    probe.put("message 0", RESULT)
+    entry_size = probe.stats()["bytes"]
+
+    cache = EmotionCache(max_bytes=entry_size * 3)
+    for i in range(10):
+        cache.put(f"message {i}", RESULT)
+    stats = cache.stats()
+    assert stats["bytes"] <= entry_size * 3
+    assert stats["entries"] == 3 and stats["evictions"] == 7
+    assert cache.get("message 9") == RESULT and cache.get("message 0") is None
+
+
+def test_replacing_an_entry_keeps_the_byte_count():
+    cache = EmotionCache()
+    cache.put("sad", RESULT)
+    size = cache.stats()["bytes"]
+    cache.put("sad", RESULT)
+    assert cache.stats()["bytes"] == size and cache.stats()["entries"] == 1
@@ -0,0 +1,69 @@
+import pytest
+
+from empathy_ai.emotion_stats import (
+    describe_emotion_stats, describe_emotional_arc, dominant_mood, update_emotion_stats,
+)
+
+
+def test_first_turn_starts_the_aggregates():
+    stats = update_emotion_stats(None, "sadness", {"sadness": 0.8, "joy": 0.2})
+    assert stats == {
+        "turns": 1,
+        "counts": {"sadness": 1},
+        "mood": {"sadness": 0.8, "joy": 0.2},
+        "recent": ["sadness"],
+    }
+
+
+def test_mood_is_an_ewma_of_the_scores():
+    stats = update_emotion_stats({}, "sadness", {"sadness": 1.0})
+    stats = update_emotion_stats(stats, "joy", {"joy": 0.9, "fear": 0.1}, alpha=0.25)
+    assert stats["mood"] == pytest.approx({"sadness": 0.75, "joy": 0.225, "fear": 0.025})
+    assert stats["counts"] == {"sadness": 1, "joy": 1} and stats["turns"] == 2
+    assert dominant_mood(stats) == "sadness"
+
+
+def test_missing_scores_put_all_weight_on_the_emotion():
+    stats = update_emotion_stats(None, "anger")
+    assert stats["mood"] == {"anger": 1.0}
+
+
+def test_updates_leave_the_input_alone():
+    stats = update_emotion_stats(None, "joy")
+    update_emotion_stats(stats, "sadness")
+    assert stats["counts"] == {"joy": 1} and stats["recent"] == ["joy"]
+
+
+def test_recent_keeps_the_last_few_emotions():
+    stats = None
+    for emotion in ["joy", "fear", "anger", "sadness"]:
+        stats = update_emotion_stats(stats, emotion, trend_size=3)
+    assert stats["recent"] == ["fear", "anger", "sadness"]
+    assert stats["turns"] == 4
+
+
+def test_summary_text():
+    assert describe_emotion_stats(None) == ""
+
+    stats = update_emotion_stats(None, "sadness")
+    assert describe_emotion_stats(stats) == "So far, you've mostly been feeling sadness."
+
+    for emotion in ["sadness", "joy", "joy"]:
+        stats = update_emotion_stats(stats, emotion)
+    assert describe_emotion_stats(stats) == (
+        "So far, you've mostly been feeling sadness, but also had moments of joy."
+        " Lately, things have shifted from sadness toward joy."
+    )
+
+
+def test_summary_mentions_a_mood_that_differs_from_the_counts():
+    stats = {"turns": 3, "counts": {"sadness": 2, "joy": 1},
+             "mood": {"sadness": 0.3, "joy": 0.7}, "recent": ["sadness", "joy"]}
+    assert describe_emotion_stats(stats).endswith(" Your mood lately leans toward joy.")
+
+
+def test_emotional_arc():
+    chunks = [{"emotion": "sadness"}, {"emotion": "sadness"}, {"emotion": "joy"}]
+    assert describe_emotional_arc({"chunks": chunks}) == "Within this message, their feelings move from sadness to joy."
+    assert describe_emotional_arc({"chunks": chunks[:2]}) == ""
+    assert describe_emotional_arc({}) == ""
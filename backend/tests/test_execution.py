@@ -0,0 +1,58 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from execution import BoundedExecutor, Overloaded
+
+
+def test_a_cancelled_stream_holds_its_slot_until_the_thread_returns():
+    executor = BoundedExecutor("llm", 1, 0)
+    unblock = threading.Event()
+
+    def tokens():
+        yield "first"
+        unblock.wait(5)
+        yield "second"
+
+    async def consume(received):
+        async for item in executor.iterate(tokens()):
+            received.append(item)
+
+    async def run():
+        received = []
+        task = asyncio.create_task(consume(received))
+        while not received:
+            await asyncio.sleep(0.01)
+        # The consumer gives up while a thread is blocked in next().
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert executor.stats()["in_use"] == 1
+        with pytest.raises(Overloaded):
+            executor.check_capacity()
+
+        unblock.set()
+        deadline = time.monotonic() + 5
+        while executor.stats()["in_use"] and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        assert executor.stats()["in_use"] == 0
+
+    try:
+        asyncio.run(run())
+    finally:
+        executor.shutdown()
+
+
+def test_a_finished_stream_releases_its_slot():
+    executor = BoundedExecutor("llm", 1, 0)
+
+    async def run():
+        return [item async for item in executor.iterate(iter("abc"))]
+
+    try:
+        assert asyncio.run(run()) == ["a", "b", "c"]
+        assert executor.stats()["in_use"] == 0
+    finally:
+        executor.shutdown()
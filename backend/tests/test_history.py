@@ -0,0 +1,88 @@
+def login(app_main, username, conversations=0):
+    """Creates a user with `conversations` two-turn conversations, one a minute apart."""
+    app_main.storage.create_user({'username': username, 'name': username, 'hashed_password': 'x'})
+    for i in range(conversations):
+        app_main.storage.create_conversation({
+            'id': f"{username}-{i:02d}", 'username': username, 'title': f"Chat {i}",
+            'timestamp': f"2024-01-01T00:{i:02d}:00",
+        })
+        app_main.storage.append_messages(f"{username}-{i:02d}", 0, [
+            {'role': 'user', 'content': 'hi'}, {'role': 'ai', 'content': 'hello'},
+        ])
+    token = app_main.create_access_token({"sub": username})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_cursor_pagination_walks_every_conversation_once(app_main, client):
+    headers = login(app_main, "pager", conversations=7)
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3} | ({"cursor": cursor} if cursor else {})
+        response = client.get("/history", params=params, headers=headers)
+        assert response.status_code == 200
+        seen.extend(chat["id"] for chat in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert seen == [f"pager-{i:02d}" for i in reversed(range(7))]
+
+
+def test_invalid_cursor_is_rejected(app_main, client):
+    headers = login(app_main, "badcursor")
+    assert client.get("/history", params={"cursor": "not-a-cursor"}, headers=headers).status_code == 400
+
+
+def test_since_version_returns_only_changed_conversations(app_main, client):
+    headers = login(app_main, "delta", conversations=3)
+    version = int(client.get("/history", headers=headers).headers["X-History-Version"])
+
+    app_main.storage.append_messages("delta-01", 2, [{'role': 'user', 'content': 'again'}])
+    response = client.get("/history", params={"since_version": version}, headers=headers)
+    assert [chat["id"] for chat in response.json()] == ["delta-01"]
+    assert int(response.headers["X-History-Version"]) > version
+
+
+def test_etags_are_per_page(app_main, client):
+    headers = login(app_main, "etags", conversations=5)
+    first = client.get("/history", params={"limit": 2}, headers=headers)
+    second = client.get(
+        "/history", params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]}, headers=headers
+    )
+    assert first.headers["ETag"] != second.headers["ETag"]
+
+    # Revalidating page 2 with page 1's tag must return page 2, not a 304.
+    stale = client.get(
+        "/history", params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]},
+        headers=headers | {"If-None-Match": first.headers["ETag"]},
+    )
+    assert stale.status_code == 200
+    assert stale.json() == second.json()
+
+    same = client.get("/history", params={"limit": 2}, headers=headers | {"If-None-Match": first.headers["ETag"]})
+    assert same.status_code == 304
+
+    app_main.storage.append_messages("etags-00", 2, [{'role': 'user', 'content': 'again'}])
+    changed = client.get("/history", params={"limit": 2}, headers=headers | {"If-None-Match": first.headers["ETag"]})
+    assert changed.status_code == 200
+
+
+def test_conversation_etag_covers_the_window(app_main, client):
+    headers = login(app_main, "window", conversations=1)
+    full = client.get("/history/window-00", headers=headers)
+    tail = client.get("/history/window-00", params={"tail": 1}, headers=headers)
+    assert full.headers["ETag"] != tail.headers["ETag"]
+    assert len(tail.json()["messages"]) == 1
+
+    revalidated = client.get("/history/window-00", headers=headers | {"If-None-Match": full.headers["ETag"]})
+    assert revalidated.status_code == 304
+    other_window = client.get(
+        "/history/window-00", params={"tail": 1}, headers=headers | {"If-None-Match": full.headers["ETag"]}
+    )
+    assert other_window.status_code == 200
+
+
+def test_other_users_conversations_are_hidden(app_main, client):
+    login(app_main, "owner", conversations=1)
+    headers = login(app_main, "intruder")
+    assert client.get("/history/owner-00", headers=headers).status_code == 404
+    assert client.get("/history", headers=headers).json() == []
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import os
+import sqlite3
+
+from journal import WriteBehindStorage
+from storage import SQLiteStorage
+
+
+class FlakyStorage(SQLiteStorage):
+    """Fails `append_messages` while `failures` is positive, like a locked database."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.failures = 0
+
+    def append_messages(self, conversation_id, start, messages):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError("database is locked")
+        super().append_messages(conversation_id, start, messages)
+
+
+def conversation(conversation_id='c1'):
+    return {'id': conversation_id, 'username': 'alice', 'title': 'Hello', 'timestamp': '2024-01-01T00:00:00'}
+
+
+def turn(i):
+    return {'role': 'user' if i % 2 == 0 else 'ai', 'content': f"message {i}"}
+
+
+def segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".jsonl"))
+
+
+def open_journal(tmp_path, backend=None, **kwargs):
+    backend = backend or SQLiteStorage(str(tmp_path / "test.db"))
+    backend.create_user({'username': 'alice', 'name': 'Alice', 'hashed_password': 'x'})
+    return WriteBehindStorage(backend, str(tmp_path / "journal"), **kwargs)
+
+
+def test_concurrent_writers_share_fsyncs(tmp_path):
+    journal = open_journal(tmp_path, apply_interval=60)
+
+    async def run():
+        await journal.append_turns('c0', 'alice', 0, [turn(0)], conversation=conversation('c0'))
+        await asyncio.gather(*(
+            journal.append_turns(f"c{i}", 'alice', 0, [turn(0), turn(1)], conversation=conversation(f"c{i}"))
+            for i in range(1, 21)
+        ))
+        stats = journal.stats()
+        assert stats["commits"] == 21
+        assert stats["fsyncs"] < 21
+        assert stats["pending"] == 21
+        # Reads apply what they depend on first.
+        assert len(journal.get_conversation('c7')['messages']) == 2
+        await journal.stop()
+
+    asyncio.run(run())
+    assert journal.stats()["pending"] == 0
+    assert segments(tmp_path / "journal") == ["journal-00000002.jsonl"]
+    assert len(journal.storage.list_conversations('alice')) == 21
+
+
+def test_replay_applies_leftover_entries(tmp_path):
+    directory = tmp_path / "journal"
+    directory.mkdir()
+    records = [
+        {'conversation_id': 'c1', 'username': 'alice', 'start': 0, 'messages': [turn(0), turn(1)],
+         'conversation': conversation(), 'updates': {'summary': 'S'}},
+        {'conversation_id': 'c1', 'username': 'alice', 'start': 2, 'messages': [turn(2)],
+         'conversation': None, 'updates': None},
+    ]
+    with open(directory / "journal-00000003.jsonl", "w") as f:
+        f.write("".join(json.dumps(record) + "\n" for record in records))
+        f.write('{"conversation_id": "c1", "sta')  # torn by a crash, never acknowledged
+
+    journal = open_journal(tmp_path)
+    stored = journal.storage.get_conversation('c1')
+    assert [m['content'] for m in stored['messages']] == ["message 0", "message 1", "message 2"]
+    assert stored['summary'] == 'S'
+    # Only the new, empty active segment is left.
+    assert segments(directory) == ["journal-00000001.jsonl"]
+    assert os.path.getsize(directory / "journal-00000001.jsonl") == 0
+
+
+def test_failed_entries_are_retried_not_dropped(tmp_path):
+    backend = FlakyStorage(str(tmp_path / "test.db"))
+    journal = open_journal(tmp_path, backend, apply_interval=0.01, retry_backoff=0.05)
+
+    async def run():
+        backend.failures = 3
+        await journal.append_turns('c1', 'alice', 0, [turn(0), turn(1)], conversation=conversation())
+        await journal.append_turns('c1', 'alice', 2, [turn(2), turn(3)])
+        await asyncio.sleep(0.1)
+        # Still failing: both entries are kept, the later one waiting behind
+        # the first, and their segment survives compaction.
+        assert journal.stats()["pending"] == 2
+        assert journal.stats()["apply_failures"] >= 1
+        assert backend.get_conversation('c1')['messages'] == []
+        assert "journal-00000001.jsonl" in segments(tmp_path / "journal")
+
+        for _ in range(100):
+            await asyncio.sleep(0.05)
+            if not journal.stats()["pending"]:
+                break
+        await journal.stop()
+
+    asyncio.run(run())
+    assert backend.failures == 0
+    assert len(backend.get_conversation('c1')['messages']) == 4
+    assert "journal-00000001.jsonl" not in segments(tmp_path / "journal")
+
+
+def test_entries_failing_at_shutdown_are_replayed(tmp_path):
+    backend = FlakyStorage(str(tmp_path / "test.db"))
+    journal = open_journal(tmp_path, backend, apply_interval=60)
+
+    async def run():
+        await journal.append_turns('c1', 'alice', 0, [turn(0), turn(1)], conversation=conversation())
+        backend.failures = 1
+        await journal.stop()
+
+    asyncio.run(run())
+    assert journal.stats()["pending"] == 1
+    assert backend.get_conversation('c1')['messages'] == []
+    journal.close()
+
+    reopened = WriteBehindStorage(SQLiteStorage(str(tmp_path / "test.db")), str(tmp_path / "journal"))
+    assert len(reopened.get_conversation('c1')['messages']) == 2
+    assert reopened.stats()["pending"] == 0
+
+
+def test_slow_apply_does_not_hold_up_fsyncs(tmp_path):
+    class SlowStorage(SQLiteStorage):
+        def append_messages(self, conversation_id, start, messages):
+            import time
+            time.sleep(0.5)
+            super().append_messages(conversation_id, start, messages)
+
+    journal = open_journal(tmp_path, SlowStorage(str(tmp_path / "test.db")), apply_interval=0.01)
+
+    async def run():
+        await journal.append_turns('c1', 'alice', 0, [turn(0)], conversation=conversation())
+        await asyncio.sleep(0.05)  # the applier is now busy with c1
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await journal.append_turns('c2', 'alice', 0, [turn(0)], conversation=conversation('c2'))
+        assert loop.time() - started < 0.25
+        await journal.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from bench.stub_llm import REPLY, make_server
+from empathy_ai.llm_client import AsyncLLMClient
+from empathy_ai.errors import LLMError
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+@pytest.fixture
+def stub():
+    """Starts bench/stub_llm.py on a free port; call with options such as `fail_first=2`."""
+    servers = []
+
+    def start(**options):
+        options = {"latency_ms": 5.0, "jitter_ms": 0.0, "chunk_delay_ms": 0.0} | options
+        server = make_server(port=0, **options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def base_url(server) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def requests_seen(server) -> int:
+    return server.RequestHandlerClass.stats["requests"]
+
+
+def run_client(server, call, **options):
+    async def run():
+        client = AsyncLLMClient(base_url(server), model="stub", backoff_base=0.01, **options)
+        try:
+            return await call(client), client.stats()
+        finally:
+            await client.aclose()
+
+    return asyncio.run(run())
+
+
+def test_retries_server_errors(stub):
+    server = stub(fail_first=2)
+    reply, stats = run_client(server, lambda client: client.chat(MESSAGES, max_tokens=10), max_retries=2)
+    assert reply == REPLY
+    assert stats["retries"] == 2
+    assert requests_seen(server) == 3
+
+
+def test_gives_up_after_max_retries(stub):
+    server = stub(fail_first=5)
+    with pytest.raises(LLMError):
+        run_client(server, lambda client: client.chat(MESSAGES, max_tokens=10), max_retries=1)
+    assert requests_seen(server) == 2
+
+
+def test_retries_timeouts(stub):
+    server = stub(slow_first=1, slow_ms=2000)
+    started = time.monotonic()
+    reply, stats = run_client(
+        server, lambda client: client.chat(MESSAGES, max_tokens=10), read_timeout=0.2, max_retries=1
+    )
+    assert reply == REPLY
+    assert stats["retries"] == 1
+    assert time.monotonic() - started < 1.5
+
+
+def test_streams_retry_before_the_first_chunk(stub):
+    server = stub(fail_first=1)
+
+    async def collect(client):
+        return "".join([chunk async for chunk in client.stream_chat(MESSAGES, max_tokens=10)])
+
+    reply, stats = run_client(server, collect, max_retries=1)
+    assert reply.strip() == REPLY
+    assert stats["retries"] == 1
+
+
+def test_hedge_wins_and_cancels_the_slow_request(stub):
+    server = stub(slow_first=1, slow_ms=3000)
+    cancelled = []
+
+    async def call(client):
+        post = client._post
+
+        async def tracked_post(payload):
+            try:
+                return await post(payload)
+            except asyncio.CancelledError:
+                cancelled.append(payload)
+                raise
+
+        client._post = tracked_post
+        started = time.monotonic()
+        reply = await client.chat(MESSAGES, max_tokens=10)
+        await asyncio.sleep(0)
+        return reply, time.monotonic() - started
+
+    (reply, elapsed), stats = run_client(
+        server, call, hedge=True, hedge_min_delay=0.1, max_hedge_ratio=1.0
+    )
+    assert reply == REPLY
+    assert elapsed < 1.0
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+    assert len(cancelled) == 1
+    assert requests_seen(server) == 2
+
+
+def test_fast_replies_are_not_hedged(stub):
+    server = stub()
+    _, stats = run_client(
+        server, lambda client: client.chat(MESSAGES, max_tokens=10), hedge=True, hedge_min_delay=0.5
+    )
+    assert stats["hedges"] == 0
+    assert requests_seen(server) == 1
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from bench.stub_llm import REPLY, make_server
+from empathy_ai.llm_client import AsyncLLMClient
+from empathy_ai.response_generator import ResponseGenerator
+from execution import BoundedExecutor
+from scheduler import FairScheduler
+
+KWARGS = dict(emotion="sadness", user_message="hi", recent_context=[], emotion_summary="",
+              embedding=None, conversation_summary="")
+
+
+class SlowInferenceClient:
+    """Shaped like huggingface_hub's InferenceClient, answering after `delay` seconds."""
+
+    def __init__(self, delay):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.delay = delay
+
+    def create(self, **kwargs):
+        time.sleep(self.delay)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=REPLY))])
+
+
+@pytest.fixture
+def llm(app_main, monkeypatch):
+    """One LLM slot and one LLM thread, with a 0.1s deadline."""
+    monkeypatch.setattr(app_main, "LLM_DEADLINE_SECONDS", 0.1)
+    monkeypatch.setattr(app_main, "llm_scheduler", FairScheduler("llm", max_concurrency=1))
+    monkeypatch.setattr(app_main, "llm_executor", BoundedExecutor("llm", 1, 0))
+
+    def use(generator):
+        monkeypatch.setattr(app_main, "response_generator", generator)
+        return generator
+
+    yield use
+    app_main.llm_executor.shutdown()
+
+
+@pytest.fixture
+def slow_stub():
+    server = make_server(port=0, latency_ms=400.0, jitter_ms=0.0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+    server.server_close()
+
+
+def test_late_async_reply_keeps_its_slot(app_main, llm, slow_stub):
+    async def run():
+        client = AsyncLLMClient(slow_stub, max_retries=0)
+        llm(ResponseGenerator(llm_client=client, sync_client=False))
+        try:
+            reply, late_reply = await app_main.generate_ai_response("alice", **KWARGS)
+            assert reply != REPLY and late_reply is not None
+            assert app_main.llm_scheduler.stats()["running"] == 1
+
+            # The late call still holds the only slot, so bob waits for it.
+            second = asyncio.create_task(app_main.generate_ai_response("bob", **KWARGS))
+            await asyncio.sleep(0.1)
+            assert not second.done()
+            assert await late_reply == REPLY
+            await second
+        finally:
+            await client.aclose()
+
+    asyncio.run(run())
+
+
+def test_discarded_sync_reply_frees_the_slot_when_its_thread_does(app_main, llm):
+    generator = ResponseGenerator(sync_client=False)
+    generator.api_client = SlowInferenceClient(delay=0.3)
+    llm(generator)
+
+    async def run():
+        _, late_reply = await app_main.generate_ai_response("alice", **KWARGS)
+        late_reply.cancel()
+        # The thread is still busy; without the slot the next call would be
+        # turned away by the LLM pool instead of waiting.
+        assert app_main.llm_scheduler.stats()["running"] == 1
+        reply, second_late = await app_main.generate_ai_response("bob", **KWARGS)
+        assert second_late is not None
+        assert generator.stats()["fallbacks"] == {"timeout": 2}
+        assert await second_late == REPLY
+
+    asyncio.run(run())
+
+
+def test_a_full_llm_pool_falls_back_to_a_template(app_main, llm):
+    generator = ResponseGenerator(sync_client=False)
+    generator.api_client = SlowInferenceClient(delay=0.0)
+    llm(generator)
+    busy = app_main.llm_executor.submit(time.sleep, 0.2)
+
+    async def run():
+        reply, late_reply = await app_main.generate_ai_response("alice", **KWARGS)
+        assert late_reply is None and reply != REPLY
+        assert generator.stats()["fallbacks"] == {"overloaded": 1}
+        assert app_main.llm_scheduler.stats()["running"] == 0
+
+    asyncio.run(run())
+    busy.result()
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+from execution import Overloaded
+from metrics import Histogram
+from scheduler import FairScheduler
+
+
+async def serve(scheduler, requests):
+    """
+    Queues `requests` ((user, weight) pairs) behind a held slot, then lets
+    them through one at a time and returns the users in the order served.
+    """
+    order = []
+    blocker = asyncio.Event()
+
+    async def request(user, weight):
+        async with scheduler.slot(user, weight):
+            order.append(user)
+            await asyncio.sleep(0)
+
+    async def hold():
+        async with scheduler.slot("blocker"):
+            await blocker.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    tasks = [asyncio.create_task(request(user, weight)) for user, weight in requests]
+    await asyncio.sleep(0)
+    blocker.set()
+    await asyncio.gather(holder, *tasks)
+    return order
+
+
+def test_a_burst_does_not_starve_other_users():
+    scheduler = FairScheduler("llm", max_concurrency=1, per_user_limit=1, per_user_queue=10)
+    order = asyncio.run(serve(scheduler, [("alice", 1.0)] * 5 + [("bob", 1.0)]))
+    assert order.index("bob") <= 1
+
+
+def test_weights_give_proportional_shares():
+    scheduler = FairScheduler("llm", max_concurrency=1, per_user_limit=1, per_user_queue=10)
+    order = asyncio.run(serve(scheduler, [("light", 1.0)] * 6 + [("heavy", 2.0)] * 6))
+    assert order[:6].count("heavy") == 4
+
+
+def test_per_user_limit_and_queue():
+    async def run():
+        scheduler = FairScheduler("llm", max_concurrency=4, per_user_limit=1, per_user_queue=1)
+        await scheduler.acquire("alice")
+        queued = asyncio.create_task(scheduler.acquire("alice"))
+        await asyncio.sleep(0)
+        # Free slots remain, but alice is at her own limit.
+        assert not queued.done()
+        with pytest.raises(Overloaded) as excinfo:
+            await scheduler.acquire("alice")
+        assert excinfo.value.status_code == 429
+        # Others are unaffected.
+        await scheduler.acquire("bob")
+
+        scheduler.release("alice")
+        await queued
+        assert scheduler.stats()["users"]["alice"]["rejected"] == 1
+
+    asyncio.run(run())
+
+
+def test_global_queue_limit():
+    async def run():
+        scheduler = FairScheduler("llm", max_concurrency=1, per_user_queue=5, max_queue=1)
+        await scheduler.acquire("alice")
+        waiting = asyncio.create_task(scheduler.acquire("bob"))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as excinfo:
+            await scheduler.acquire("carol")
+        assert excinfo.value.status_code == 503
+        waiting.cancel()
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiters_leave_no_trace():
+    async def run():
+        scheduler = FairScheduler("llm", max_concurrency=1)
+        await scheduler.acquire("alice")
+        waiting = asyncio.create_task(scheduler.acquire("bob"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert scheduler.stats()["queued"] == 0
+
+        scheduler.release("alice")
+        stats = scheduler.stats()
+        assert stats["running"] == 0
+        await asyncio.wait_for(scheduler.acquire("carol"), 1)
+
+    asyncio.run(run())
+
+
+def test_idle_users_are_forgotten():
+    async def run():
+        scheduler = FairScheduler("llm", max_concurrency=1, per_user_queue=2, max_queue=1)
+        async with scheduler.slot("alice"):
+            waiting = asyncio.create_task(scheduler.acquire("bob"))
+            await asyncio.sleep(0)
+            assert set(scheduler.stats()["users"]) == {"alice", "bob"}
+            with pytest.raises(Overloaded):
+                await scheduler.acquire("carol")
+            waiting.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiting
+            assert set(scheduler.stats()["users"]) == {"alice"}
+        assert scheduler.stats()["users"] == {}
+        assert scheduler._last_tag == {} and scheduler._queues == {} and scheduler._in_flight == {}
+
+    asyncio.run(run())
+
+
+def test_waits_are_observed():
+    async def run():
+        wait_seconds = Histogram("wait", "Waits.", buckets=(0.01, 1.0))
+        scheduler = FairScheduler("llm", max_concurrency=1, wait_seconds=wait_seconds)
+        await scheduler.acquire("alice")
+        waiting = asyncio.create_task(scheduler.acquire("bob"))
+        await asyncio.sleep(0.05)
+        stats = scheduler.stats()["users"]["bob"]
+        assert stats["queued"] == 1 and stats["in_flight"] == 0
+        scheduler.release("alice")
+        await waiting
+        assert scheduler.stats()["users"]["bob"]["max_wait_ms"] >= 50
+        scheduler.release("bob")
+        return dict((suffix + labels.get("le", ""), value) for suffix, labels, value in wait_seconds.samples())
+
+    samples = asyncio.run(run())
+    assert samples["_count"] == 2
+    # alice started at once; bob waited about 50ms.
+    assert samples["_bucket0.01"] == 1 and samples["_bucket1"] == 2
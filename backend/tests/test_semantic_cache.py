@@ -0,0 +1,61 @@
+import numpy as np
+
+from empathy_ai.response_generator import ResponseGenerator
+from empathy_ai.semantic_cache import SemanticResponseCache
+
+
+class BagOfWordsEncoder:
+    """A stand-in for a sentence-transformers model: one dimension per known word."""
+
+    VOCABULARY = ("hi", "hello", "how", "are", "you", "sad", "today")
+
+    def get_sentence_embedding_dimension(self):
+        return len(self.VOCABULARY)
+
+    def encode(self, text, normalize_embeddings=True, convert_to_numpy=True):
+        vector = np.array([text.split().count(word) for word in self.VOCABULARY], dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+
+def make_generator(max_context_turns=1):
+    cache = SemanticResponseCache(encoder=BagOfWordsEncoder(), threshold=0.9,
+                                  max_context_turns=max_context_turns)
+    return ResponseGenerator(semantic_cache=cache, sync_client=False)
+
+
+def test_similar_messages_reuse_a_reply():
+    generator = make_generator()
+    reply, embedding = generator.lookup_cached_response("joy", "hi how are you", conversation_turns=1)
+    assert reply is None
+    generator._cache_response("joy", embedding, "Doing great, thanks!")
+
+    assert generator.lookup_cached_response("joy", "hi how are you", 1)[0] == "Doing great, thanks!"
+    # Same words, other emotion: a separate partition.
+    assert generator.lookup_cached_response("sadness", "hi how are you", 1)[0] is None
+    assert generator.lookup_cached_response("joy", "sad today", 1)[0] is None
+
+
+def test_eligibility_goes_by_the_whole_conversation():
+    generator = make_generator(max_context_turns=3)
+    _, embedding = generator.lookup_cached_response("joy", "hi how are you", conversation_turns=1)
+    generator._cache_response("joy", embedding, "Doing great, thanks!")
+
+    assert generator.lookup_cached_response("joy", "hi how are you", conversation_turns=3)[0] is not None
+    # A long conversation is ineligible even if only a few of its turns fit
+    # in the prompt: the rest are in the summary the cached reply never saw.
+    reply, embedding = generator.lookup_cached_response("joy", "hi how are you", conversation_turns=40)
+    assert reply is None and embedding is None
+    assert generator.semantic_cache.stats()["ineligible"] == 1
+
+
+def test_contextual_replies_are_not_shared_across_conversations():
+    generator = make_generator()
+    # The third turn of one conversation: its reply was written with the
+    # earlier turns in the prompt, so it is neither served from nor stored in the cache.
+    reply, embedding = generator.lookup_cached_response("joy", "hi how are you", conversation_turns=3)
+    assert reply is None and embedding is None
+    generator._cache_response("joy", embedding, "Glad the interview went well!")
+
+    # A new conversation, perhaps another user's, sends the same message.
+    assert generator.lookup_cached_response("joy", "hi how are you", conversation_turns=1)[0] is None
+    assert generator.semantic_cache.stats()["stores"] == 0
@@ -0,0 +1,149 @@
+import sqlite3
+
+import pytest
+
+import migrate_tinydb
+from storage import SQLITE_MIGRATIONS, SQLiteStorage, open_storage
+
+
+def turns(start, count):
+    return [
+        {'role': 'user' if i % 2 == 0 else 'ai', 'content': f"message {i}"}
+        for i in range(start, start + count)
+    ]
+
+
+def new_conversation(storage, conversation_id='c1', username='alice', timestamp='2024-01-01T00:00:00'):
+    storage.create_conversation({
+        'id': conversation_id, 'username': username, 'title': 'Hello', 'timestamp': timestamp,
+    })
+
+
+@pytest.fixture(params=["sqlite", "tinydb"])
+def storage(request, tmp_path):
+    path = tmp_path / ("test.db" if request.param == "sqlite" else "test.json")
+    storage = open_storage(request.param, str(path))
+    storage.create_user({'username': 'alice', 'name': 'Alice', 'hashed_password': 'x'})
+    yield storage
+    storage.close()
+
+
+def test_append_is_idempotent(storage):
+    new_conversation(storage)
+    storage.append_messages('c1', 0, turns(0, 2))
+    storage.append_messages('c1', 0, turns(0, 2))
+    storage.append_messages('c1', 1, turns(1, 3))
+
+    conversation = storage.get_conversation('c1')
+    assert [m['content'] for m in conversation['messages']] == [f"message {i}" for i in range(4)]
+    assert conversation['message_count'] == 4
+
+
+def test_get_conversation_windows(storage):
+    new_conversation(storage)
+    storage.append_messages('c1', 0, turns(0, 10))
+
+    tail = storage.get_conversation('c1', tail=3)
+    assert tail['offset'] == 7
+    assert [m['content'] for m in tail['messages']] == ["message 7", "message 8", "message 9"]
+
+    after = storage.get_conversation('c1', after=7)
+    assert after['offset'] == 8
+    assert len(after['messages']) == 2
+
+    assert storage.get_conversation('missing') is None
+
+
+def test_meta_and_conversation_fields_round_trip(storage):
+    new_conversation(storage)
+    storage.append_messages('c1', 0, [{'role': 'user', 'content': 'hi', 'emotion': 'joy', 'scores': {'joy': 0.9}}])
+    storage.update_conversation('c1', {
+        'summary': 'Earlier: greetings.', 'summarized_through': 1, 'emotion_stats': {'turns': 1},
+    })
+
+    conversation = storage.get_conversation('c1')
+    assert conversation['messages'][0]['emotion'] == 'joy'
+    assert conversation['messages'][0]['scores'] == {'joy': 0.9}
+    assert conversation['summary'] == 'Earlier: greetings.'
+    assert conversation['summarized_through'] == 1
+    assert storage.get_conversation_summary('c1')['emotion_stats'] == {'turns': 1}
+
+
+def test_versions_change_with_every_append(storage):
+    before = storage.get_history_version('alice')
+    new_conversation(storage)
+    storage.append_messages('c1', 0, turns(0, 2))
+    version = storage.get_conversation_summary('c1')['version']
+
+    storage.append_messages('c1', 0, turns(0, 2))
+    assert storage.get_conversation_summary('c1')['version'] == version
+
+    storage.append_messages('c1', 2, turns(2, 2))
+    assert storage.get_conversation_summary('c1')['version'] > version
+    assert storage.get_history_version('alice') > before
+
+
+def test_sqlite_upgrades_an_old_schema(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(f"BEGIN; {SQLITE_MIGRATIONS[0]} PRAGMA user_version = 1; COMMIT;")
+    conn.execute("INSERT INTO users VALUES ('alice', 'Alice', 'x')")
+    conn.execute("INSERT INTO conversations VALUES ('c1', 'alice', 'Hello', '2024-01-01T00:00:00')")
+    conn.executemany("INSERT INTO messages VALUES ('c1', ?, 'user', ?)", [(0, 'hi'), (1, 'there')])
+    conn.commit()
+    conn.close()
+
+    storage = SQLiteStorage(path)
+    assert storage.conn.execute("PRAGMA user_version").fetchone()[0] == len(SQLITE_MIGRATIONS)
+    summary = storage.get_conversation_summary('c1')
+    assert summary['message_count'] == 2
+    assert summary['version'] == 2
+    assert summary['emotion_stats'] == {}
+    assert [m['content'] for m in storage.get_conversation('c1')['messages']] == ['hi', 'there']
+
+    # Opening an up-to-date database again runs nothing.
+    storage.close()
+    assert SQLiteStorage(path).get_user('alice')['name'] == 'Alice'
+
+
+def make_tinydb(path):
+    legacy = open_storage("tinydb", str(path))
+    legacy.create_user({'username': 'alice', 'name': 'Alice', 'hashed_password': 'x'})
+    new_conversation(legacy)
+    legacy.append_messages('c1', 0, turns(0, 3))
+    legacy.close()
+
+
+def test_migrate_tinydb_reports_skipped_records(tmp_path):
+    source, target = tmp_path / "users_db.json", str(tmp_path / "empathy_ai.db")
+    make_tinydb(source)
+
+    assert migrate_tinydb.migrate(str(source), target) == {
+        "users": 1, "users_skipped": 0, "conversations": 1, "conversations_skipped": 0, "messages": 3,
+    }
+    assert migrate_tinydb.migrate(str(source), target) == {
+        "users": 0, "users_skipped": 1, "conversations": 0, "conversations_skipped": 1, "messages": 0,
+    }
+    assert len(SQLiteStorage(target).get_conversation('c1')['messages']) == 3
+
+
+def test_unmigrated_users(tmp_path):
+    source, target = tmp_path / "users_db.json", str(tmp_path / "empathy_ai.db")
+    assert migrate_tinydb.unmigrated_users(str(source), target) == 0
+
+    make_tinydb(source)
+    assert migrate_tinydb.unmigrated_users(str(source), target) == 1
+
+    migrate_tinydb.migrate(str(source), target)
+    assert migrate_tinydb.unmigrated_users(str(source), target) == 0
+
+
+def test_llm_weight_round_trips(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "test.db"))
+    storage.create_user({'username': 'alice', 'name': 'Alice', 'hashed_password': 'x'})
+    storage.create_user({'username': 'bob', 'name': 'Bob', 'hashed_password': 'x', 'llm_weight': 3.0})
+    assert storage.get_user('alice')['llm_weight'] == 1.0
+    assert storage.get_user('bob')['llm_weight'] == 3.0
+
+    storage.update_user('alice', {'llm_weight': 2.0})
+    assert storage.get_user('alice')['llm_weight'] == 2.0
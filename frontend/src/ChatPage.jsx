@@ -1,9 +1,10 @@
 import { useState, useRef, useEffect } from "react";
 import { useNavigate } from "react-router-dom";
 import {
-  postChatMessage,
+  streamChatMessage,
   getCurrentUser,
   getHistory,
+  getHistoryChanges,
   getConversation,
 } from "./api";
 import { Send, Plus, Menu, X, LogOut } from "lucide-react";
@@ -15,6 +16,8 @@ const ChatPage = ({ removeToken }) => {
   const [isLoading, setIsLoading] = useState(false);
   const [user, setUser] = useState(null);
   const [history, setHistory] = useState([]);
+  const [historyCursor, setHistoryCursor] = useState(null);
+  const [historyVersion, setHistoryVersion] = useState(null);
   const [currentConversationId, setCurrentConversationId] = useState(null);
   const [isSidebarOpen, setIsSidebarOpen] = useState(false);
   const messagesEndRef = useRef(null);
@@ -28,6 +31,8 @@ const ChatPage = ({ removeToken }) => {
         setUser(userResponse.data);
         const historyResponse = await getHistory();
         setHistory(historyResponse.data);
+        setHistoryCursor(historyResponse.headers["x-next-cursor"] || null);
+        setHistoryVersion(historyResponse.headers["x-history-version"] || null);
       } catch (error) {
         console.error("Failed to fetch initial data:", error);
       }
@@ -54,6 +59,25 @@ const ChatPage = ({ removeToken }) => {
     }
   }, [currentConversationId]);
 
+  // Pulls in only the conversations that changed since the version we hold.
+  const refreshHistory = async () => {
+    if (historyVersion === null) {
+      const response = await getHistory();
+      setHistory(response.data);
+      setHistoryCursor(response.headers["x-next-cursor"] || null);
+      setHistoryVersion(response.headers["x-history-version"] || null);
+      return;
+    }
+    const response = await getHistoryChanges(historyVersion);
+    const changed = new Map(response.data.map((chat) => [chat.id, chat]));
+    setHistory((prev) =>
+      [...response.data, ...prev.filter((chat) => !changed.has(chat.id))].sort(
+        (a, b) => (a.timestamp < b.timestamp ? 1 : -1)
+      )
+    );
+    setHistoryVersion(response.headers["x-history-version"] || historyVersion);
+  };
+
   const getGreeting = () => {
     const hours = new Date().getHours();
     if (hours < 12) return "Good Morning";
@@ -92,20 +116,30 @@ const ChatPage = ({ removeToken }) => {
     setInput("");
     setIsLoading(true);
 
+    // Placeholder AI message that fills in as tokens arrive.
+    setMessages((prev) => [...prev, { role: "ai", content: "" }]);
+    const appendToLastMessage = (text) => {
+      setMessages((prev) => {
+        const updated = [...prev];
+        const last = updated[updated.length - 1];
+        updated[updated.length - 1] = { ...last, content: last.content + text };
+        return updated;
+      });
+    };
+
     try {
-      const response = await postChatMessage(
-        currentInput,
-        currentConversationId
-      );
-      const { ai_response, conversation_id } = response.data;
-      const aiMessage = { role: "ai", content: ai_response };
-
-      setMessages((prev) => [...prev, aiMessage]);
-
-      if (!currentConversationId) {
-        setCurrentConversationId(conversation_id);
-        const newHistoryResponse = await getHistory();
-        setHistory(newHistoryResponse.data);
+      let newConversationId = null;
+      await streamChatMessage(currentInput, currentConversationId, {
+        onMeta: ({ conversation_id }) => {
+          newConversationId = conversation_id;
+        },
+        onToken: ({ content }) => appendToLastMessage(content),
+        onError: ({ detail }) => appendToLastMessage(detail),
+      });
+
+      if (!currentConversationId && newConversationId) {
+        setCurrentConversationId(newConversationId);
+        await refreshHistory();
       }
     } catch (error) {
       console.error("Failed to send message:", error);
@@ -113,12 +147,23 @@ const ChatPage = ({ removeToken }) => {
         role: "ai",
         content: "Sorry, I encountered an error. Please try again.",
       };
-      setMessages((prev) => [...prev, errorMessage]);
+      // Replace the (possibly empty) streaming placeholder.
+      setMessages((prev) => [...prev.slice(0, -1), errorMessage]);
     } finally {
       setIsLoading(false);
     }
   };
 
+  const handleLoadMoreHistory = async () => {
+    try {
+      const response = await getHistory(historyCursor);
+      setHistory((prev) => [...prev, ...response.data]);
+      setHistoryCursor(response.headers["x-next-cursor"] || null);
+    } catch (error) {
+      console.error("Failed to fetch more history:", error);
+    }
+  };
+
   const handleLogout = () => {
     removeToken();
     navigate("/login");
@@ -151,6 +196,11 @@ const ChatPage = ({ removeToken }) => {
               {chat.title}
             </div>
           ))}
+          {historyCursor && (
+            <button className="load-more-button" onClick={handleLoadMoreHistory}>
+              Load more
+            </button>
+          )}
         </div>
         <div className="sidebar-footer">
           <div className="user-info">
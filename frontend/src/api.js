@@ -34,12 +34,87 @@ export const getCurrentUser = () => {
   return api.get("/users/me");
 };
 
-export const getHistory = () => {
-  return api.get("/history");
+// --- Conditional requests ---
+// Responses are kept alongside their ETag so unchanged data comes back as a
+// bodyless 304, and conversations are topped up with only their new messages.
+const acceptNotModified = (status) =>
+  (status >= 200 && status < 300) || status === 304;
+
+const historyCache = new Map();
+const conversationCache = new Map();
+
+// Returns one page of conversation summaries, newest first. The cursor for
+// the next page (if any) is in the `x-next-cursor` response header.
+export const getHistory = async (cursor) => {
+  const key = cursor || "";
+  const cached = historyCache.get(key);
+  const response = await api.get("/history", {
+    params: cursor ? { cursor } : {},
+    headers: cached ? { "If-None-Match": cached.etag } : {},
+    validateStatus: acceptNotModified,
+  });
+  if (response.status === 304) {
+    return { ...response, data: cached.data, headers: cached.headers };
+  }
+  if (response.headers.etag) {
+    historyCache.set(key, {
+      etag: response.headers.etag,
+      data: response.data,
+      headers: response.headers,
+    });
+  }
+  return response;
 };
 
-export const getConversation = (conversationId) => {
-  return api.get(`/history/${conversationId}`);
+// Returns the conversations created or changed since `sinceVersion`, as
+// reported in a previous response's `x-history-version` header. Every page is
+// fetched, so the caller can safely move on to the returned version. That is
+// the version from the first page: anything changed while later pages were
+// loading is simply fetched again next time.
+export const getHistoryChanges = async (sinceVersion) => {
+  const first = await api.get("/history", {
+    params: { since_version: sinceVersion },
+  });
+  const data = [...first.data];
+  let cursor = first.headers["x-next-cursor"];
+  while (cursor) {
+    const page = await api.get("/history", {
+      params: { since_version: sinceVersion, cursor },
+    });
+    data.push(...page.data);
+    cursor = page.headers["x-next-cursor"];
+  }
+  return { ...first, data };
+};
+
+export const getConversation = async (conversationId) => {
+  const cached = conversationCache.get(conversationId);
+  const response = await api.get(`/history/${conversationId}`, {
+    params: cached ? { after_message: cached.data.messages.length - 1 } : {},
+    headers: cached ? { "If-None-Match": cached.etag } : {},
+    validateStatus: acceptNotModified,
+  });
+  if (response.status === 304) {
+    return { ...response, data: cached.data };
+  }
+
+  let data = response.data;
+  if (cached) {
+    // Only the messages after the ones we hold were sent; `offset` says
+    // where they start.
+    data = {
+      ...data,
+      messages: [
+        ...cached.data.messages.slice(0, data.offset),
+        ...data.messages,
+      ],
+      offset: 0,
+    };
+  }
+  if (response.headers.etag) {
+    conversationCache.set(conversationId, { etag: response.headers.etag, data });
+  }
+  return { ...response, data };
 };
 
 export const postChatMessage = (message, conversationId) => {
@@ -49,4 +124,65 @@ export const postChatMessage = (message, conversationId) => {
   });
 };
 
+// Streams a chat turn from /chat/stream, calling the handlers as Server-Sent
+// Events arrive. axios can't expose a response body incrementally in the
+// browser, so this uses fetch with the same base URL and auth header.
+export const streamChatMessage = async (
+  message,
+  conversationId,
+  { onMeta, onToken, onDone, onError } = {}
+) => {
+  const headers = { "Content-Type": "application/json" };
+  const authorization = api.defaults.headers.common["Authorization"];
+  if (authorization) {
+    headers["Authorization"] = authorization;
+  }
+
+  const response = await fetch(`${API_URL}/chat/stream`, {
+    method: "POST",
+    headers,
+    body: JSON.stringify({
+      user_message: message,
+      conversation_id: conversationId,
+    }),
+  });
+  if (!response.ok) {
+    throw new Error(`Chat request failed with status ${response.status}`);
+  }
+
+  const handlers = { meta: onMeta, token: onToken, done: onDone, error: onError };
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  const dispatch = (rawEvent) => {
+    let event = "message";
+    const dataLines = [];
+    for (const line of rawEvent.split("\n")) {
+      if (line.startsWith("event:")) {
+        event = line.slice(6).trim();
+      } else if (line.startsWith("data:")) {
+        dataLines.push(line.slice(5).trim());
+      }
+    }
+    if (dataLines.length && handlers[event]) {
+      handlers[event](JSON.parse(dataLines.join("\n")));
+    }
+  };
+
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      dispatch(buffer.slice(0, boundary));
+      buffer = buffer.slice(boundary + 2);
+    }
+  }
+  if (buffer.trim()) {
+    dispatch(buffer);
+  }
+};
+
 export default api;
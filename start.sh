@@ -3,10 +3,16 @@
 # Get the directory of this script
 PROJECT_DIR="$(cd "$(dirname "$0")" && pwd)"
 
-# Start backend
+# Start backend: a single auto-reloading process, or with `./start.sh --prod`
+# (or WEB_WORKERS set) the pre-fork server, which turns the journal off.
 cd "$PROJECT_DIR/backend"
-echo "Starting backend (FastAPI)..."
-uvicorn main:app --reload &
+if [ "$1" = "--prod" ] || [ -n "$WEB_WORKERS" ]; then
+    echo "Starting backend (FastAPI, pre-fork workers, journal off)..."
+    python serve.py &
+else
+    echo "Starting backend (FastAPI, auto-reload)..."
+    uvicorn main:app --reload &
+fi
 BACKEND_PID=$!
 
 # Start frontend